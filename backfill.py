@@ -0,0 +1,190 @@
+"""
+Ingest historical mail that the scheduled jobs never looked at, e.g. after an
+outage or when onboarding a mailbox with years of history.
+
+Usage (from the repository root):
+    python backfill.py --since 2023-01-01 [--until 2024-01-01] [--mailbox NAME]
+        [--partition-hours 24] [--workers 4]
+    python backfill.py --cancel [--mailbox NAME]
+
+The range is split into after:/before: partitions that are processed in
+parallel, newest first. Each finished partition is recorded in SQLite, so
+re-running the same command resumes with the partitions still pending. The
+processed-email table is shared with the scheduler, so both can run at once.
+
+Retention keeps every processed id while a backfill makes progress. A
+backfill that stopped with partitions pending is warned about by the
+retention job; finish it by re-running the same command, or drop its
+pending partitions with --cancel.
+"""
+import argparse
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from config.settings import settings
+from config.logging_config import setup_logging
+from config.mailboxes import load_mailboxes, assigned_mailboxes
+from config.metrics import start_metrics_server
+from persistence.repository import Repository
+from processor.email_processor import EmailProcessor
+from storage.factory import StorageFactory
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_date(value: str) -> datetime:
+    # Naive UTC throughout, like the rest of the SQLite timestamps.
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def partition_range(start: datetime, end: datetime, hours: float) -> List[Tuple[datetime, datetime]]:
+    """
+    Split [start, end) into consecutive windows of `hours`, newest first.
+    """
+    if end <= start:
+        raise ValueError(f"Backfill range is empty: {start} - {end}")
+    step = timedelta(hours=hours)
+    partitions = []
+    cursor = start
+    while cursor < end:
+        partitions.append((cursor, min(cursor + step, end)))
+        cursor += step
+    partitions.reverse()
+    return partitions
+
+
+class Backfill:
+    def __init__(self, processors: List[EmailProcessor], repository: Repository,
+                 start: datetime, end: datetime, partition_hours: float, workers: int):
+        self.processors = processors
+        self.repository = repository
+        # Second precision keeps partition keys stable across runs.
+        self.partitions = partition_range(start.replace(microsecond=0), end.replace(microsecond=0),
+                                          partition_hours)
+        self.workers = workers
+        self.counts: Dict[Tuple[str, datetime], Dict[str, int]] = {}
+        self.total = 0
+        self.done = 0
+        self.started = time.monotonic()
+        self._finished = threading.Event()
+
+    def _process(self, processor: EmailProcessor, start_at: datetime, end_at: datetime):
+        account = processor.mailbox.name
+        counts = self.counts.setdefault((account, start_at), {})
+        logger.info(f"Backfilling {account} from {start_at} to {end_at}...")
+        processor.process_range(start_at, end_at, counts)
+        self.repository.complete_backfill_partition(
+            account, start_at, end_at, counts["processed"], counts["failed"]
+        )
+
+    def _report(self):
+        processed = sum(counts.get("processed", 0) for counts in list(self.counts.values()))
+        failed = sum(counts.get("failed", 0) for counts in list(self.counts.values()))
+        elapsed = time.monotonic() - self.started
+        rate = processed / elapsed if elapsed else 0.0
+        eta = ""
+        if 0 < self.done < self.total:
+            remaining = elapsed / self.done * (self.total - self.done)
+            eta = f", ETA {timedelta(seconds=int(remaining))}"
+        logger.info(
+            f"Backfill progress: {self.done}/{self.total} partitions, {processed} emails stored, "
+            f"{failed} failed, {rate:.1f} emails/s{eta}."
+        )
+
+    def _report_periodically(self):
+        while not self._finished.wait(settings.BACKFILL_PROGRESS_SECONDS):
+            self._report()
+
+    def run(self):
+        tasks = []
+        for processor in self.processors:
+            statuses = self.repository.get_backfill_partitions(processor.mailbox.name, self.partitions)
+            pending = [partition for partition in self.partitions if statuses.get(partition) != "done"]
+            skipped = len(self.partitions) - len(pending)
+            if skipped:
+                logger.info(f"Skipping {skipped} partitions of {processor.mailbox.name} finished earlier.")
+            tasks.extend((processor, start_at, end_at) for start_at, end_at in pending)
+
+        self.total = len(tasks)
+        logger.info(f"Backfilling {self.total} partitions on {self.workers} workers.")
+        reporter = threading.Thread(target=self._report_periodically, name="backfill-progress", daemon=True)
+        reporter.start()
+        failures = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="backfill") as pool:
+                futures = {pool.submit(self._process, *task): task for task in tasks}
+                for future in as_completed(futures):
+                    processor, start_at, end_at = futures[future]
+                    try:
+                        future.result()
+                    except Exception as e:
+                        # Left pending; the next run picks it up again.
+                        failures += 1
+                        logger.error(
+                            f"Backfill of {processor.mailbox.name} from {start_at} to {end_at} failed: {e}"
+                        )
+                    self.done += 1
+        finally:
+            self._finished.set()
+            self._report()
+        if failures:
+            logger.warning(f"{failures} partitions failed and remain pending; re-run to resume them.")
+
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Ingest emails from a past date range.")
+    parser.add_argument("--since", type=_parse_date, default=None,
+                        help="Start of the range (ISO date or datetime, UTC)")
+    parser.add_argument("--until", type=_parse_date, default=None,
+                        help="End of the range (default: now)")
+    parser.add_argument("--mailbox", action="append", default=None,
+                        help="Mailbox to backfill (repeatable; default: every mailbox of this shard)")
+    parser.add_argument("--partition-hours", type=float, default=settings.BACKFILL_PARTITION_HOURS)
+    parser.add_argument("--workers", type=int, default=settings.BACKFILL_WORKERS,
+                        help="Partitions processed at the same time")
+    parser.add_argument("--metrics-port", type=int, default=settings.METRICS_PORT + 1,
+                        help="Metrics port (default: METRICS_PORT + 1, so it can run next to main.py)")
+    parser.add_argument("--cancel", action="store_true",
+                        help="Drop the pending partitions of an earlier backfill instead of backfilling")
+    args = parser.parse_args()
+    if args.since is None and not args.cancel:
+        parser.error("the following arguments are required: --since")
+
+    mailboxes = assigned_mailboxes(load_mailboxes())
+    if args.mailbox:
+        unknown = set(args.mailbox) - {mailbox.name for mailbox in mailboxes}
+        if unknown:
+            parser.error(f"Unknown mailbox(es) for this shard: {', '.join(sorted(unknown))}")
+        mailboxes = [mailbox for mailbox in mailboxes if mailbox.name in args.mailbox]
+
+    if args.cancel:
+        repository = Repository()
+        for mailbox in mailboxes:
+            dropped = repository.cancel_backfill(mailbox.name)
+            logger.info(f"Dropped {dropped} pending backfill partitions of {mailbox.name}.")
+        return
+
+    start_metrics_server(args.metrics_port)
+    storage_service = StorageFactory.get_storage()
+    repository = Repository()
+    processors = [
+        EmailProcessor(storage_service=storage_service, repository=repository, mailbox=mailbox)
+        for mailbox in mailboxes
+    ]
+    Backfill(
+        processors, repository,
+        start=args.since, end=args.until or datetime.utcnow(),
+        partition_hours=args.partition_hours, workers=args.workers,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Per-message cost of the logging setup.
+
+Compares the old configuration (one synchronous JSON StreamHandler added per
+module that called setup_logging, six at the time) with the queued setup from
+config/logging_config.py, with and without the per-call-site rate limit.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_logging [--messages 200000]
+
+Reported per configuration: microseconds spent in the logging call on the
+calling thread, and microseconds per message until every record has been
+written (to /dev/null).
+"""
+import argparse
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from datetime import datetime
+
+from config.logging_config import JsonFormatter, RateLimitFilter, _QueueHandler, orjson
+
+LEGACY_HANDLERS = 6
+
+
+class LegacyJsonFormatter(logging.Formatter):
+    # The formatter as it was: stdlib json, encoded on the calling thread.
+    def format(self, record):
+        return json.dumps({
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "module": record.module,
+            "function": record.funcName,
+        })
+
+
+def _legacy(sink):
+    handlers = []
+    for _ in range(LEGACY_HANDLERS):
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(LegacyJsonFormatter())
+        handlers.append(handler)
+    return handlers, None
+
+
+def _queued(sink, per_second: float):
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(per_second))
+    return [queue_handler], logging.handlers.QueueListener(log_queue, handler)
+
+
+def measure(name: str, handlers, listener, messages: int):
+    root = logging.getLogger()
+    saved = root.handlers[:]
+    root.handlers = handlers
+    root.setLevel(logging.INFO)
+    logger = logging.getLogger("bench")
+    if listener is not None:
+        listener.start()
+    try:
+        start = time.perf_counter()
+        for n in range(messages):
+            logger.info("Processing email %s...", f"msg-{n:08d}")
+        caller = time.perf_counter() - start
+        if listener is not None:
+            listener.stop()
+        total = time.perf_counter() - start
+    finally:
+        root.handlers = saved
+    print(f"{name:<28} {caller / messages * 1e6:>10.2f} {total / messages * 1e6:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"JSON encoder: {'orjson' if orjson is not None else 'json'}; {args.messages} messages")
+    print(f"{'configuration':<28} {'caller us':>10} {'total us':>10}")
+    with open(os.devnull, "w") as sink:
+        measure(f"legacy ({LEGACY_HANDLERS} sync handlers)", *_legacy(sink), args.messages)
+        measure("queued", *_queued(sink, 0), args.messages)
+        measure("queued + rate limit 10/s", *_queued(sink, 10), args.messages)
+
+
+if __name__ == "__main__":
+    main()
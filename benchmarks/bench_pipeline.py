@@ -0,0 +1,154 @@
+"""
+Offline throughput benchmark for EmailProcessor.process_emails.
+
+Runs the real pipeline against FakeGmailService and the local or memory
+storage backend, so no credentials or network access are needed.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_pipeline [--emails 2000] [--size-kb 20]
+        [--download-latency 0.05] [--storage memory|local]
+        [--concurrency 1:1,4:4,8:8,16:16]
+
+Each DOWNLOAD:UPLOAD concurrency pair runs in its own subprocess so peak RSS
+is measured per configuration. Reported per run: emails/s, p50/p99 latency of
+each stage (source = listing + idempotency check, download, upload, commit)
+and peak RSS.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+STAGES = ("source", "download", "upload", "commit")
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_once(args) -> Dict:
+    import logging
+
+    from config.settings import settings
+    from email_service.fake import FakeGmailService
+    from persistence.repository import Repository
+    from processor.email_processor import EmailProcessor
+    from storage.local import LocalStorage
+    from storage.memory import MemoryStorage
+
+    logging.disable(logging.CRITICAL)
+    download_concurrency, upload_concurrency = (int(n) for n in args.run_one.split(":"))
+    settings.DOWNLOAD_CONCURRENCY = download_concurrency
+    settings.UPLOAD_CONCURRENCY = upload_concurrency
+    settings.SYNC_MODE = "window"
+
+    with tempfile.TemporaryDirectory() as workdir:
+        gmail = FakeGmailService(
+            message_count=args.emails,
+            message_size=args.size_kb * 1024,
+            list_latency=args.list_latency,
+            download_latency=args.download_latency,
+        )
+        storage = LocalStorage(root=os.path.join(workdir, "emails")) if args.storage == "local" else MemoryStorage()
+        repository = Repository(db_path=os.path.join(workdir, "metadata.db"))
+        processor = EmailProcessor(gmail_service=gmail, storage_service=storage, repository=repository)
+
+        samples: Dict[str, List[float]] = defaultdict(list)
+
+        mark_processed_many = repository.mark_processed_many
+
+        def timed_commit(*args, **kwargs):
+            started = time.perf_counter()
+            mark_processed_many(*args, **kwargs)
+            samples["commit"].append(time.perf_counter() - started)
+
+        repository.mark_processed_many = timed_commit
+
+        build_pipeline = processor._build_pipeline
+
+        def recording_pipeline():
+            pipeline = build_pipeline()
+            run = pipeline.run
+
+            def run_and_record(source):
+                for item in run(source):
+                    for stage, seconds in item.timings.items():
+                        samples[stage].append(seconds)
+                    yield item
+
+            pipeline.run = run_and_record
+            return pipeline
+
+        processor._build_pipeline = recording_pipeline
+
+        started = time.perf_counter()
+        processor.process_emails()
+        elapsed = time.perf_counter() - started
+
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+
+    return {
+        "concurrency": args.run_one,
+        "emails_per_second": args.emails / elapsed,
+        "latency": {
+            stage: {"p50": _percentile(samples[stage], 50), "p99": _percentile(samples[stage], 99)}
+            for stage in STAGES
+        },
+        "peak_rss_mb": peak_rss / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=2000)
+    parser.add_argument("--size-kb", type=int, default=20)
+    parser.add_argument("--list-latency", type=float, default=0.05, help="seconds per listing page")
+    parser.add_argument("--download-latency", type=float, default=0.05, help="seconds per download call")
+    parser.add_argument("--storage", choices=("memory", "local"), default="memory")
+    parser.add_argument("--concurrency", default="1:1,4:4,8:8,16:16",
+                        help="comma-separated DOWNLOAD:UPLOAD worker counts")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_once(args)))
+        return
+
+    header = f"{'d:u':<8}{'emails/s':>10}"
+    for stage in STAGES:
+        header += f"{stage + ' p50':>16}{stage + ' p99':>16}"
+    print(header + f"{'peak RSS MB':>14}")
+
+    forwarded = [
+        "--emails", str(args.emails), "--size-kb", str(args.size_kb),
+        "--list-latency", str(args.list_latency), "--download-latency", str(args.download_latency),
+        "--storage", args.storage,
+    ]
+    for pair in args.concurrency.split(","):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_pipeline", "--run-one", pair] + forwarded,
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        row = f"{result['concurrency']:<8}{result['emails_per_second']:>10.0f}"
+        for stage in STAGES:
+            latency = result["latency"][stage]
+            row += f"{latency['p50'] * 1000:>14.2f}ms{latency['p99'] * 1000:>14.2f}ms"
+        print(row + f"{result['peak_rss_mb']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
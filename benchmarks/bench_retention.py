@@ -0,0 +1,154 @@
+"""
+Lookup latency and file size of the metadata database before and after the
+retention job prunes it, and ingestion commit latency while it runs.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_retention [--rows 10000000] [--days 365]
+        [--keep-days 30] [--lookups 2000]
+
+processed_emails is filled with --rows ids spread evenly over the last
+--days days, then RetentionWorker prunes everything older than --keep-days.
+Reported before and after: database size on disk and p50/p99 latency of a
+filter_unprocessed() call for 100 ids (half of them processed), with the
+bloom filter disabled so every lookup reaches SQLite. During pruning a writer
+thread commits batches of 200 ids, as the pipeline would; its p50/p99/max
+commit latency shows how long pruning holds the write lock.
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from config.settings import settings
+from persistence.repository import Repository
+from processor.retention_worker import RetentionWorker
+
+LOOKUP_BATCH = 100
+WRITER_BATCH = 200
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _gmail_id(n: int) -> str:
+    return f"{n:016x}"
+
+
+def _disk_size(db_path: str) -> int:
+    return sum(os.path.getsize(path) for path in (db_path, db_path + "-wal") if os.path.exists(path))
+
+
+def populate(repository: Repository, rows: int, days: float, chunk: int = 100_000):
+    """
+    Insert `rows` processed ids, oldest first, through the raw driver (the
+    ORM would take most of the benchmark's time).
+    """
+    now = datetime.utcnow()
+    step = timedelta(days=days) / rows
+    connection = repository.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for offset in range(0, rows, chunk):
+            cursor.executemany(
+                "INSERT INTO processed_emails (gmail_id, processed_at, storage_key) VALUES (?, ?, ?)",
+                (
+                    (_gmail_id(n), (now - step * (rows - n)).isoformat(sep=" "), f"{_gmail_id(n)}.eml")
+                    for n in range(offset, min(offset + chunk, rows))
+                ),
+            )
+            connection.commit()
+    finally:
+        connection.close()
+
+
+def measure_lookups(repository: Repository, present: range, lookups: int) -> Dict[str, float]:
+    rng = random.Random(1)
+    samples = []
+    for _ in range(lookups):
+        ids = [_gmail_id(rng.choice(present)) for _ in range(LOOKUP_BATCH // 2)]
+        ids += [f"absent-{rng.getrandbits(48):012x}" for _ in range(LOOKUP_BATCH - len(ids))]
+        started = time.perf_counter()
+        repository.filter_unprocessed(ids)
+        samples.append(time.perf_counter() - started)
+    return {"p50": _percentile(samples, 50) * 1000, "p99": _percentile(samples, 99) * 1000}
+
+
+def prune_under_load(repository: Repository) -> Dict[str, float]:
+    stop = threading.Event()
+    commits: List[float] = []
+
+    def write():
+        n = 0
+        while not stop.is_set():
+            entries = [(f"live-{n + i}", f"live-{n + i}.eml") for i in range(WRITER_BATCH)]
+            n += WRITER_BATCH
+            started = time.perf_counter()
+            repository.mark_processed_many(entries)
+            commits.append(time.perf_counter() - started)
+            time.sleep(0.05)
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    started = time.perf_counter()
+    pruned = RetentionWorker(repository).run()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    writer.join()
+    return {
+        "pruned": pruned.get("processed_emails", 0),
+        "seconds": elapsed,
+        "commit_p50": _percentile(commits, 50) * 1000,
+        "commit_p99": _percentile(commits, 99) * 1000,
+        "commit_max": max(commits, default=0.0) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--days", type=float, default=365)
+    parser.add_argument("--keep-days", type=float, default=30)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    settings.PROCESSED_ID_CACHE_ENABLED = False
+    settings.RETENTION_DAYS = args.keep_days
+    settings.RETENTION_MIN_INTERVALS = 1
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "metadata.db")
+        repository = Repository(db_path=db_path)
+
+        started = time.perf_counter()
+        populate(repository, args.rows, args.days)
+        print(f"Inserted {args.rows} ids in {time.perf_counter() - started:.0f} s")
+
+        kept = int(args.rows * min(args.keep_days / args.days, 1.0))
+        before = measure_lookups(repository, range(args.rows), args.lookups)
+        before_size = _disk_size(db_path)
+
+        load = prune_under_load(repository)
+        after = measure_lookups(repository, range(args.rows - kept, args.rows), args.lookups)
+        after_size = _disk_size(db_path)
+
+        print(f"{'':<8}{'rows':>12}{'size MiB':>12}{'lookup p50 ms':>16}{'lookup p99 ms':>16}")
+        print(f"{'before':<8}{args.rows:>12}{before_size / 1024 ** 2:>12.1f}{before['p50']:>16.3f}{before['p99']:>16.3f}")
+        print(f"{'after':<8}{args.rows - load['pruned']:>12}{after_size / 1024 ** 2:>12.1f}"
+              f"{after['p50']:>16.3f}{after['p99']:>16.3f}")
+        print(f"Pruned {load['pruned']} ids and vacuumed in {load['seconds']:.0f} s; concurrent commits of "
+              f"{WRITER_BATCH} ids: p50 {load['commit_p50']:.1f} ms, p99 {load['commit_p99']:.1f} ms, "
+              f"max {load['commit_max']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Per-object uploads versus segment bundling (STORAGE_SEGMENTS_ENABLED).
+
+Runs process_emails over FakeGmailService into the memory backend with a
+simulated per-request latency on every PUT, which is what dominates small
+uploads to S3, Azure and GCS. Reported per mode: emails/s, PUTs made and
+average bytes per PUT.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_segments [--emails 5000] [--size-kb 10]
+        [--put-latency 0.03] [--segment-mb 16]
+"""
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from config.settings import settings
+from email_service.fake import FakeGmailService
+from persistence.repository import Repository
+from processor.email_processor import EmailProcessor
+from storage.memory import MemoryStorage
+from storage.segments import SegmentStorage
+
+
+class SlowMemoryStorage(MemoryStorage):
+    """MemoryStorage with a fixed round trip per PUT."""
+
+    def __init__(self, put_latency: float):
+        super().__init__()
+        self.put_latency = put_latency
+        self.puts = 0
+        self.bytes = 0
+        self._count_lock = threading.Lock()
+
+    def upload_email(self, data: bytes, filename: str) -> str:
+        time.sleep(self.put_latency)
+        with self._count_lock:
+            self.puts += 1
+            self.bytes += len(data)
+        return super().upload_email(data, filename)
+
+
+def run(args, segments: bool) -> None:
+    backend = SlowMemoryStorage(args.put_latency)
+    storage = SegmentStorage(backend) if segments else backend
+    with tempfile.TemporaryDirectory() as workdir:
+        gmail = FakeGmailService(message_count=args.emails, message_size=args.size_kb * 1024)
+        repository = Repository(db_path=os.path.join(workdir, "metadata.db"))
+        processor = EmailProcessor(gmail_service=gmail, storage_service=storage, repository=repository)
+        started = time.perf_counter()
+        processor.process_emails()
+        elapsed = time.perf_counter() - started
+    name = f"segments ({args.segment_mb} MB)" if segments else "one object per email"
+    print(f"{name:<24} {args.emails / elapsed:>10.0f} {backend.puts:>8} {backend.bytes / max(backend.puts, 1) / 1024:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--emails", type=int, default=5000)
+    parser.add_argument("--size-kb", type=int, default=10)
+    parser.add_argument("--put-latency", type=float, default=0.03, help="seconds per PUT")
+    parser.add_argument("--segment-mb", type=int, default=16)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    settings.SYNC_MODE = "window"
+    settings.WORK_QUEUE_ENABLED = False
+    settings.STORAGE_SEGMENT_MAX_MB = args.segment_mb
+
+    print(f"{args.emails} emails of {args.size_kb} KB, {args.put_latency * 1000:.0f} ms per PUT, "
+          f"{settings.UPLOAD_CONCURRENCY} upload workers")
+    print(f"{'mode':<24} {'emails/s':>10} {'PUTs':>8} {'KB per PUT':>12}")
+    run(args, segments=False)
+    run(args, segments=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Commits per second against the metadata database, per SQLite engine profile.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_sqlite_commits [--commits 2000] [--writers 4] [--batch 200]
+
+Three workloads are measured for each profile:
+    single:     one mark_processed() commit per email from one thread
+    concurrent: the same, from --writers threads sharing one Repository
+    batched:    mark_processed_many() with --batch emails per commit
+"""
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Tuple
+
+from persistence.engine import PROFILES
+from persistence.repository import Repository
+
+
+def _fresh_repository(workdir: str, name: str, profile: str) -> Repository:
+    return Repository(db_path=os.path.join(workdir, f"{name}.db"), profile=profile)
+
+
+def bench_single(repository: Repository, commits: int) -> float:
+    start = time.perf_counter()
+    for n in range(commits):
+        repository.mark_processed(f"single-{n}", f"mem://single-{n}.eml")
+    return commits / (time.perf_counter() - start)
+
+
+def bench_concurrent(repository: Repository, commits: int, writers: int) -> Tuple[float, int]:
+    errors = []
+    per_writer = commits // writers
+
+    def write(worker: int):
+        for n in range(per_writer):
+            gmail_id = f"concurrent-{worker}-{n}"
+            try:
+                repository.mark_processed(gmail_id, f"mem://{gmail_id}.eml")
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return (per_writer * writers - len(errors)) / elapsed, len(errors)
+
+
+def bench_batched(repository: Repository, commits: int, batch: int) -> float:
+    entries = [(f"batched-{n}", f"mem://batched-{n}.eml") for n in range(commits * batch)]
+    start = time.perf_counter()
+    for offset in range(0, len(entries), batch):
+        repository.mark_processed_many(entries[offset:offset + batch])
+    return commits / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commits", type=int, default=2000)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=200)
+    args = parser.parse_args()
+
+    # Keep per-commit log lines out of the measurement.
+    logging.disable(logging.ERROR)
+
+    print(f"{'profile':<10}{'single c/s':>14}{'concurrent c/s':>18}{'locked errors':>16}{'batched c/s':>14}{'batched emails/s':>20}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for profile in PROFILES:
+            single = bench_single(_fresh_repository(workdir, f"{profile}-single", profile), args.commits)
+            concurrent, errors = bench_concurrent(
+                _fresh_repository(workdir, f"{profile}-concurrent", profile), args.commits, args.writers
+            )
+            batched = bench_batched(
+                _fresh_repository(workdir, f"{profile}-batched", profile), max(args.commits // 10, 1), args.batch
+            )
+            print(f"{profile:<10}{single:>14.0f}{concurrent:>18.0f}{errors:>16}{batched:>14.0f}{batched * args.batch:>20.0f}")
+
+
+if __name__ == "__main__":
+    main()
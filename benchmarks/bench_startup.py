@@ -0,0 +1,67 @@
+"""
+Startup cost of the service: import time, modules loaded and RSS.
+
+Each measurement runs in a fresh interpreter that imports the scheduler (the
+same import graph as main.py) and creates the configured storage backend.
+Providers that need credentials or network access are only imported, not
+instantiated, so the script runs anywhere.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup [--providers memory,local,aws,azure,gcp] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs in the child interpreter.
+CHILD = r"""
+import json, resource, sys, time
+start = time.perf_counter()
+import scheduler.job_runner
+from storage.factory import StorageFactory
+imported = time.perf_counter() - start
+provider = sys.argv[1]
+if provider in ("memory", "local"):
+    StorageFactory.get_storage()
+else:
+    StorageFactory.backend_class(provider)
+total = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    rss //= 1024
+print(json.dumps({"import": imported, "total": total, "modules": len(sys.modules), "rss_kb": rss}))
+"""
+
+
+def run_once(provider: str, workdir: str) -> dict:
+    env = dict(os.environ, STORAGE_PROVIDER=provider, LOCAL_STORAGE_PATH=os.path.join(workdir, "emails"))
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, provider], env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    import tempfile
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--providers", default="memory,local,aws,azure,gcp")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'provider':<10} {'import ms':>10} {'startup ms':>11} {'modules':>8} {'RSS MB':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for provider in args.providers.split(","):
+            runs = [run_once(provider, workdir) for _ in range(args.repeat)]
+            print(
+                f"{provider:<10} {statistics.median(r['import'] for r in runs) * 1000:>10.0f} "
+                f"{statistics.median(r['total'] for r in runs) * 1000:>11.0f} "
+                f"{runs[-1]['modules']:>8} {statistics.median(r['rss_kb'] for r in runs) / 1024:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,27 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 import json
+import threading
+import time
 from datetime import datetime
 
+from config.settings import settings
+
+try:
+    import orjson
+except ImportError:  # optional, several times faster than json
+    orjson = None
+
+
+def _dumps(log_record: dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(log_record, default=str).decode("utf-8")
+    return json.dumps(log_record, default=str)
+
+
 class JsonFormatter(logging.Formatter):
     def format(self, record):
         log_record = {
@@ -12,16 +31,94 @@ class JsonFormatter(logging.Formatter):
             "module": record.module,
             "function": record.funcName,
         }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            log_record["suppressed"] = suppressed
         if record.exc_info:
             log_record["exception"] = self.formatException(record.exc_info)
-        return json.dumps(log_record)
+        elif record.exc_text:
+            log_record["exception"] = record.exc_text
+        return _dumps(log_record)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `per_second` INFO (and lower) records per call site
+    and second; warnings and errors always pass. The next record let through
+    from a throttled call site carries the number dropped as `suppressed`.
+    """
+
+    def __init__(self, per_second: float):
+        super().__init__()
+        self.per_second = per_second
+        # (pathname, lineno) -> [window start, records in window, suppressed]
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or self.per_second <= 0:
+            return True
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= 1.0:
+                suppressed = site[2] if site else 0
+                self._sites[key] = [now, 1, 0]
+            elif site[1] < self.per_second:
+                site[1] += 1
+                suppressed, site[2] = site[2], 0
+            else:
+                site[2] += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only render the message on the caller's thread (its args may change
+        # later); JSON encoding and the write happen on the listener thread.
+        message = record.getMessage()
+        exc_text = None
+        if record.exc_info:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        return record
+
+
+_listener = None
+_setup_lock = threading.Lock()
+
 
 def setup_logging():
+    """
+    Route the root logger through a queue to a background thread that
+    JSON-encodes records and writes them to stdout. Idempotent: later calls
+    return the already configured root logger.
+    """
+    global _listener
     logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-    
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(JsonFormatter())
-    logger.addHandler(handler)
-    
+    with _setup_lock:
+        if _listener is not None:
+            return logger
+        logger.setLevel(settings.LOG_LEVEL)
+
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = _QueueHandler(log_queue)
+        queue_handler.addFilter(RateLimitFilter(settings.LOG_RATE_LIMIT_PER_SECOND))
+        logger.addHandler(queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, handler)
+        _listener.start()
+        # Drain whatever is still queued when the process exits.
+        atexit.register(_listener.stop)
     return logger
@@ -0,0 +1,68 @@
+import json
+import os
+import zlib
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from config.settings import settings
+
+DEFAULT_MAILBOX = "default"
+
+
+class Mailbox(BaseModel):
+    """
+    One Gmail account to ingest. `name` keys its sync checkpoint and prefixes
+    its objects in storage, so it must be unique and stable.
+    """
+    name: str
+    token_file: str = "token.json"
+    credentials_file: str = "credentials.json"
+    # Caps messages handled per scheduled run so one busy mailbox cannot
+    # monopolise the worker pool; the rest is picked up on the next run.
+    max_messages_per_run: Optional[int] = None
+    # Gmail quota units per second for this account; defaults to
+    # GMAIL_QUOTA_UNITS_PER_SECOND.
+    quota_units_per_second: Optional[float] = None
+    enabled: bool = True
+
+
+def load_mailboxes(path: Optional[str] = None) -> List[Mailbox]:
+    """
+    Load the mailbox registry from MAILBOXES_FILE, a JSON list of mailbox
+    objects. Without a registry the service runs the single legacy account
+    backed by token.json.
+    """
+    path = path or settings.MAILBOXES_FILE
+    if not path:
+        return [Mailbox(name=DEFAULT_MAILBOX)]
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Mailbox registry {path} not found.")
+
+    with open(path) as registry:
+        mailboxes = [Mailbox(**entry) for entry in json.load(registry)]
+
+    names = [mailbox.name for mailbox in mailboxes]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate mailbox names in {path}: {', '.join(sorted(duplicates))}")
+    return [mailbox for mailbox in mailboxes if mailbox.enabled]
+
+
+def shard_of(name: str, shard_count: int) -> int:
+    # crc32 rather than hash(): it must agree across processes and restarts.
+    return zlib.crc32(name.encode("utf-8")) % shard_count
+
+
+def assigned_mailboxes(mailboxes: List[Mailbox], shard_index: Optional[int] = None,
+                       shard_count: Optional[int] = None) -> List[Mailbox]:
+    """
+    Return the mailboxes owned by this replica. Every replica started with the
+    same registry and SHARD_COUNT (and its own SHARD_INDEX) gets a disjoint
+    subset, so no account is processed by two replicas.
+    """
+    shard_index = settings.SHARD_INDEX if shard_index is None else shard_index
+    shard_count = settings.SHARD_COUNT if shard_count is None else shard_count
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise ValueError(f"Invalid shard {shard_index} of {shard_count}")
+    return [mailbox for mailbox in mailboxes if shard_of(mailbox.name, shard_count) == shard_index]
@@ -0,0 +1,158 @@
+"""
+Prometheus metrics shared by the whole service.
+
+Metrics are always collected (updating one is a few dict lookups); the HTTP
+endpoint serving them is started by `start_metrics_server` when
+METRICS_ENABLED is set.
+"""
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Spans a cached SQLite commit (~1 ms) to a large multipart upload.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Outcomes: listed, skipped (already processed or empty), downloaded,
+# deduplicated, uploaded, processed (committed) and failed.
+MESSAGES = Counter(
+    "email_ingestion_messages_total",
+    "Messages handled by the pipeline, by outcome.",
+    ["mailbox", "outcome"],
+)
+BYTES = Counter(
+    "email_ingestion_bytes_total",
+    "Email bytes transferred, by direction and provider.",
+    ["direction", "provider"],
+)
+# operation is list, download, upload or commit; provider is gmail, the
+# storage provider (aws, azure, gcp, local, memory) or sqlite.
+LATENCY = Histogram(
+    "email_ingestion_operation_seconds",
+    "Latency of Gmail, storage and database operations.",
+    ["operation", "provider"],
+    buckets=LATENCY_BUCKETS,
+)
+BACKLOG = Gauge(
+    "email_ingestion_backlog_messages",
+    "Messages accepted into the pipeline and not finished yet.",
+    ["mailbox"],
+)
+WORK_QUEUE = Gauge(
+    "email_ingestion_work_queue_messages",
+    "Entries in the durable work queue, by state.",
+    ["mailbox", "state"],
+)
+RETRY_BACKLOG = Gauge(
+    "email_ingestion_retry_backlog_messages",
+    "Failed messages still eligible for a retry.",
+)
+PRUNED = Counter(
+    "email_ingestion_pruned_rows_total",
+    "Rows deleted by the retention job, by table.",
+    ["table"],
+)
+DATABASE_BYTES = Gauge(
+    "email_ingestion_database_bytes",
+    "Size of the metadata database, by kind (used or free pages).",
+    ["kind"],
+)
+LAST_SUCCESS = Gauge(
+    "email_ingestion_last_success_timestamp_seconds",
+    "Unix time of the last run that finished without a critical error.",
+    ["job", "mailbox"],
+)
+
+_server_started = False
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None):
+    """
+    Serve /metrics on METRICS_HOST and `port` (METRICS_PORT by default) from
+    a daemon thread. Safe to call more than once.
+    """
+    global _server_started
+    if not settings.METRICS_ENABLED:
+        return
+    port = port or settings.METRICS_PORT
+    with _server_lock:
+        if _server_started:
+            return
+        start_http_server(port, addr=settings.METRICS_HOST)
+        _server_started = True
+    logger.info(f"Serving metrics on http://{settings.METRICS_HOST}:{port}/metrics")
+
+
+@contextmanager
+def timed(operation: str, provider: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        LATENCY.labels(operation, provider).observe(time.perf_counter() - start)
+
+
+_upload_depth = threading.local()
+
+
+def _size_of(payload) -> int:
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return len(payload)
+    if hasattr(payload, "getbuffer"):
+        return payload.getbuffer().nbytes
+    return 0
+
+
+def _counted(chunks, counter):
+    for chunk in chunks:
+        counter[0] += len(chunk)
+        yield chunk
+
+
+def instrument_upload(method):
+    """
+    Decorate a storage backend's upload_email/upload_stream so each upload
+    records its latency and size under the backend's `provider`. Only the
+    outermost call is recorded when one upload method delegates to another.
+    """
+    @functools.wraps(method)
+    def wrapper(self, payload, filename, *args, **kwargs):
+        depth = getattr(_upload_depth, "value", 0)
+        if depth:
+            return method(self, payload, filename, *args, **kwargs)
+
+        size = [_size_of(payload)]
+        if not size[0] and not hasattr(payload, "read") and not isinstance(payload, (bytes, bytearray)):
+            # A chunk iterator: count bytes as the backend consumes them.
+            payload = _counted(payload, size)
+        _upload_depth.value = depth + 1
+        try:
+            with timed("upload", self.provider):
+                result = method(self, payload, filename, *args, **kwargs)
+        finally:
+            _upload_depth.value = depth
+        BYTES.labels("upload", self.provider).inc(size[0])
+        return result
+    return wrapper
+
+
+def instrument_async_upload(method):
+    """
+    Async counterpart of `instrument_upload`, for an async backend's `_upload`.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, data: bytes, filename: str):
+        with timed("upload", self.provider):
+            result = await method(self, data, filename)
+        BYTES.labels("upload", self.provider).inc(len(data))
+        return result
+    return wrapper
@@ -6,17 +6,174 @@ class Settings(BaseSettings):
     EMAIL_PROVIDER: str = "gmail"
     
     # Storage Selection
-    # Options: "aws", "azure", "gcp"
+    # Options: "aws", "azure", "gcp", "local", "memory", or several of them
+    # comma-separated (e.g. "aws,gcp") to store every email in each; the
+    # first one is the primary.
     STORAGE_PROVIDER: str = "gcp" 
     
     SCHEDULE_INTERVAL_MINUTES: int = 15
+
+    # Mailboxes
+    # JSON list of mailboxes (name, token_file, credentials_file,
+    # max_messages_per_run, quota_units_per_second). Unset = single account
+    # from token.json.
+    MAILBOXES_FILE: Optional[str] = None
+    # Mailboxes processed at the same time by this replica
+    MAILBOX_WORKERS: int = 4
+    # Replicas sharing one registry each take the mailboxes whose name hashes
+    # to their SHARD_INDEX (0-based) out of SHARD_COUNT.
+    SHARD_INDEX: int = 0
+    SHARD_COUNT: int = 1
+
+    # Gmail sync
+    # Options: "history" (incremental via users.history.list, falling back to a
+    # time-window scan when no checkpoint exists) or "window" (always re-scan the
+    # last SCHEDULE_INTERVAL_MINUTES).
+    SYNC_MODE: str = "history"
+    GMAIL_PAGE_SIZE: int = 500
+    # Messages downloaded per HTTP batch call (Gmail allows up to 100, recommends <= 50;
+    # larger values are capped at 100)
+    GMAIL_BATCH_SIZE: int = 50
+    # How long a download worker waits for a batch to fill before sending it
+    GMAIL_BATCH_WAIT_SECONDS: float = 0.2
+    # Per-mailbox quota budget (Gmail allows 250 units/s per user; messages.get
+    # and messages.list cost 5 each). The rate halves on 429/rateLimitExceeded
+    # and recovers gradually.
+    GMAIL_QUOTA_UNITS_PER_SECOND: float = 250
+    GMAIL_RATE_LIMIT_RETRIES: int = 5
+
+    # Push mode
+    # Sync a mailbox seconds after Gmail announces a change (users.watch ->
+    # Pub/Sub) instead of on the interval; interval polling takes over for
+    # mailboxes whose watch has expired or while the subscription is down.
+    PUSH_ENABLED: bool = False
+    # Options: "pubsub" (pull subscription) or "local" (in-process stand-in for tests)
+    PUSH_SOURCE: str = "pubsub"
+    # projects/<project>/topics/<topic>; Gmail needs publish rights on it
+    PUSH_TOPIC: Optional[str] = None
+    # projects/<project>/subscriptions/<subscription>, attached to PUSH_TOPIC
+    PUSH_SUBSCRIPTION: Optional[str] = None
+    # Notifications arriving within this window trigger a single sync
+    PUSH_DEBOUNCE_SECONDS: float = 2.0
+    # Gmail drops watches after 7 days and recommends renewing daily
+    PUSH_WATCH_RENEW_HOURS: float = 24
+    # Poll anyway at this interval as a safety net while push is active
+    PUSH_SAFETY_POLL_MINUTES: int = 60
+
+    # Processing pipeline
+    # Worker threads per stage; queues between stages hold at most PIPELINE_QUEUE_SIZE items.
+    DOWNLOAD_CONCURRENCY: int = 8
+    UPLOAD_CONCURRENCY: int = 8
+    PIPELINE_QUEUE_SIZE: int = 100
+    # Processed/failed outcomes are written to SQLite in one transaction per batch
+    COMMIT_BATCH_SIZE: int = 200
+    COMMIT_INTERVAL_SECONDS: float = 5.0
+    # Extract sender, recipients, subject, date and attachment names of every
+    # processed email into SQLite (email_metadata), searchable through the
+    # FTS5 index email_search (Repository.search_emails, search.py).
+    METADATA_ENABLED: bool = False
+    METADATA_WORKERS: int = 2
+
+    # Work queue
+    # Listed messages are first recorded in SQLite (work_queue) and then claimed
+    # in batches under a lease, so a run that dies midway is resumed by the next
+    # one and several processes can drain the same database.
+    WORK_QUEUE_ENABLED: bool = True
+    WORK_QUEUE_CLAIM_SIZE: int = 100
+    # A claim not finished within this time is handed to another worker
+    WORK_QUEUE_LEASE_SECONDS: float = 900.0
+    # Messages claimed this often without finishing (e.g. crashing the worker)
+    # are moved to failed_emails instead
+    WORK_QUEUE_MAX_CLAIMS: int = 5
+    # Committed entries are kept this long for inspection, then purged
+    WORK_QUEUE_RETENTION_MINUTES: int = 60
+
+    # Dead-letter retries
+    # A separate job re-processes failed emails once their backoff has elapsed
+    # (RETRY_BASE_DELAY_SECONDS doubled per attempt, capped at RETRY_MAX_DELAY_SECONDS).
+    # Emails that failed RETRY_MAX_ATTEMPTS times stay in failed_emails untouched.
+    RETRY_ENABLED: bool = True
+    RETRY_INTERVAL_MINUTES: int = 5
+    RETRY_BATCH_SIZE: int = 200
+    RETRY_MAX_PER_RUN: int = 5000
+    RETRY_MAX_ATTEMPTS: int = 8
+    RETRY_BASE_DELAY_SECONDS: float = 60.0
+    RETRY_MAX_DELAY_SECONDS: float = 21600.0
+    # Pipeline workers used by the retry job, independent of the ingestion pipeline
+    RETRY_DOWNLOAD_CONCURRENCY: int = 2
+    RETRY_UPLOAD_CONCURRENCY: int = 4
+
+    # Retention
+    # Processed ids only guard against messages a fetch can still list again.
+    # A background job deletes older processed_emails rows (with their
+    # stored_copies, and failed emails that used up their retries) in small
+    # batches, then hands the freed pages back with incremental vacuum.
+    RETENTION_ENABLED: bool = False
+    RETENTION_INTERVAL_MINUTES: int = 60
+    # Ids are kept RETENTION_DAYS, and at least RETENTION_MIN_INTERVALS times
+    # SCHEDULE_INTERVAL_MINUTES before the oldest history checkpoint, so a
+    # mailbox whose sync is behind never re-lists pruned messages.
+    RETENTION_DAYS: float = 30.0
+    RETENTION_MIN_INTERVALS: int = 96
+    RETENTION_FAILED_DAYS: float = 90.0
+    # Rows deleted per transaction, and the pause between transactions that
+    # lets ingestion commits through
+    RETENTION_BATCH_SIZE: int = 5000
+    RETENTION_BATCH_PAUSE_SECONDS: float = 0.05
+    # Longest an incremental vacuum transaction holds the write lock; moving a
+    # page costs ~1 ms on a large database, so steps are bounded by time
+    RETENTION_VACUUM_STEP_SECONDS: float = 0.05
+
+    # Backfill (backfill.py)
+    # Width of each after:/before: partition and how many run at once
+    BACKFILL_PARTITION_HOURS: float = 24
+    BACKFILL_WORKERS: int = 4
+    BACKFILL_PROGRESS_SECONDS: float = 30.0
     
+    # Uploads
+    # Emails larger than the threshold are sent in chunks (S3 multipart, Azure
+    # staged blocks, GCS resumable); peak memory is about chunk size x concurrency.
+    UPLOAD_CHUNK_SIZE_MB: int = 8
+    UPLOAD_MULTIPART_THRESHOLD_MB: int = 8
+    UPLOAD_MAX_CONCURRENCY: int = 4
+    # Compress each email before upload. Options: "none", "gzip", "zstd".
+    # Level defaults to the codec's own default (gzip 6, zstd 3).
+    STORAGE_COMPRESSION: str = "none"
+    STORAGE_COMPRESSION_LEVEL: Optional[int] = None
+    # Store identical emails once, named by SHA-256, reusing earlier uploads
+    STORAGE_DEDUPE_ENABLED: bool = False
+    # HTTP connections kept per storage client (boto3 and requests default to 10)
+    STORAGE_MAX_POOL_CONNECTIONS: int = 50
+    # Upload through the asyncio backends (aiobotocore, azure.storage.blob.aio,
+    # thread-offloaded GCS) with up to STORAGE_ASYNC_CONCURRENCY uploads in flight.
+    STORAGE_ASYNC_ENABLED: bool = False
+    STORAGE_ASYNC_CONCURRENCY: int = 32
+    # When to check that the bucket/container exists (creating it if not):
+    # "lazy" (first upload), "startup" (when the backend is created) or "off".
+    STORAGE_CONTAINER_CHECK: str = "lazy"
+    # With several providers, emails that some destinations failed to take are
+    # kept here until a retry has stored them everywhere ("" disables the spool;
+    # retries then download them again).
+    STORAGE_SPOOL_PATH: str = "data/spool"
+    # Bundle emails into segment objects (one PUT per segment) indexed in
+    # SQLite; a segment is uploaded once it reaches either bound. Emails above
+    # STORAGE_SEGMENT_MAX_EMAIL_KB are still stored as objects of their own.
+    STORAGE_SEGMENTS_ENABLED: bool = False
+    STORAGE_SEGMENT_MAX_MB: int = 64
+    STORAGE_SEGMENT_MAX_SECONDS: float = 60.0
+    STORAGE_SEGMENT_MAX_EMAIL_KB: int = 1024
+
     # GCP - Primary
     # Defaults to local dummy file if not set
     GOOGLE_APPLICATION_CREDENTIALS: Optional[str] = "gcp_credentials.json"
     GCP_BUCKET_NAME: str = "email-ingestion-bucket"
     GCP_PROJECT_ID: Optional[str] = None # Optional, client can infer from creds
     
+    # Local filesystem - Optional (development, benchmarks)
+    LOCAL_STORAGE_PATH: str = "data/emails"
+    # Emails written between fsyncs
+    LOCAL_STORAGE_FSYNC_BATCH: int = 64
+
     # AWS - Optional
     AWS_ACCESS_KEY_ID: Optional[str] = None
     AWS_SECRET_ACCESS_KEY: Optional[str] = None
@@ -27,8 +184,42 @@ class Settings(BaseSettings):
     AZURE_STORAGE_CONNECTION_STRING: Optional[str] = None
     AZURE_CONTAINER_NAME: Optional[str] = "email-ingestion-container"
     
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    # INFO lines allowed per call site per second (e.g. "Processing email ..."
+    # during a large sync); the rest are counted and dropped. 0 disables.
+    LOG_RATE_LIMIT_PER_SECOND: float = 10
+
+    # Metrics
+    # Prometheus /metrics endpoint, served by main.py and backfill.py
+    METRICS_ENABLED: bool = True
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 8000
+
     # SQLite
     DB_PATH: str = "metadata.db"
+    # Options: "tuned" (the pragmas below) or "default" (SQLite's stock settings)
+    SQLITE_PROFILE: str = "tuned"
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 268435456  # 256 MiB
+    SQLITE_CACHE_SIZE: int = -65536  # negative = KiB, i.e. 64 MiB
+    # Only takes effect on new databases; `python retention.py --vacuum`
+    # converts an existing one (a full VACUUM, run while ingestion is stopped).
+    SQLITE_AUTO_VACUUM: str = "INCREMENTAL"
+    # In-memory bloom filter of processed ids; answers most "not processed"
+    # lookups without touching SQLite. ~1.2 MB per million ids at 1% error rate.
+    PROCESSED_ID_CACHE_ENABLED: bool = True
+    PROCESSED_ID_CACHE_CAPACITY: int = 10_000_000
+    PROCESSED_ID_CACHE_ERROR_RATE: float = 0.01
+    # How often the cache picks up ids committed by other processes sharing the
+    # database (e.g. backfill.py next to the scheduler); 0 disables.
+    PROCESSED_ID_CACHE_REFRESH_SECONDS: float = 5.0
+    # Connection pool shared by pipeline and scheduler threads
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
     
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
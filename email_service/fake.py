@@ -0,0 +1,100 @@
+import random
+import time
+from datetime import datetime
+from email.utils import formatdate
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Gmail's default page size for messages.list.
+PAGE_SIZE = 100
+
+
+class FakeGmailService:
+    """
+    Stand-in for GmailService that serves synthetic RFC822 messages, for
+    benchmarks and load tests that must not touch a real mailbox.
+
+    Messages are generated on demand (nothing is held in memory) with bodies of
+    `message_size` bytes. Latencies are simulated with sleeps: `list_latency`
+    per result page and `download_latency` per download call (batched or not),
+    so concurrency settings show their real effect.
+    """
+
+    def __init__(self, message_count: int = 1000, message_size: int = 20 * 1024,
+                 list_latency: float = 0.0, download_latency: float = 0.0,
+                 id_prefix: str = "fake", seed: int = 0):
+        self.message_count = message_count
+        self.message_size = message_size
+        self.list_latency = list_latency
+        self.download_latency = download_latency
+        self.id_prefix = id_prefix
+        self.seed = seed
+        self._date = formatdate(localtime=False)
+        self._body = self._build_body(message_size, seed)
+
+    @staticmethod
+    def _build_body(size: int, seed: int) -> bytes:
+        rng = random.Random(seed)
+        words = (b"lorem", b"ipsum", b"dolor", b"sit", b"amet", b"consectetur", b"adipiscing", b"elit")
+        lines = []
+        length = 0
+        while length < size:
+            line = b" ".join(rng.choice(words) for _ in range(12)) + b"\r\n"
+            lines.append(line)
+            length += len(line)
+        return b"".join(lines)[:size]
+
+    def _message_ids(self) -> Iterator[Dict[str, Any]]:
+        for offset in range(0, self.message_count, PAGE_SIZE):
+            if self.list_latency:
+                time.sleep(self.list_latency)
+            for n in range(offset, min(offset + PAGE_SIZE, self.message_count)):
+                yield {'id': f"{self.id_prefix}-{n:08d}", 'threadId': f"{self.id_prefix}-{n:08d}"}
+
+    def _render(self, msg_id: str) -> bytes:
+        # Headers vary per message; the body is built once, so serving a
+        # message costs almost no CPU and the simulated latency dominates.
+        rng = random.Random(f"{self.seed}-{msg_id}")
+        headers = (
+            f"From: sender{rng.randrange(1000)}@example.com\r\n"
+            f"To: inbox@example.com\r\n"
+            f"Subject: Synthetic message {msg_id}\r\n"
+            f"Date: {self._date}\r\n"
+            f"Message-ID: <{msg_id}@example.com>\r\n"
+            f"MIME-Version: 1.0\r\n"
+            f"Content-Type: text/plain; charset=\"utf-8\"\r\n"
+            f"\r\n"
+        )
+        return headers.encode("ascii") + self._body
+
+    def fetch_emails(self, minutes: int = 15) -> Iterator[Dict[str, Any]]:
+        return self._message_ids()
+
+    def fetch_range(self, start: datetime, end: datetime) -> Iterator[Dict[str, Any]]:
+        # Synthetic messages carry no dates; every range lists the whole mailbox.
+        return self._message_ids()
+
+    def get_history_id(self) -> str:
+        return "1"
+
+    def get_email_address(self) -> str:
+        return f"{self.id_prefix}@example.com"
+
+    def watch(self, topic_name: str) -> Dict[str, Any]:
+        # Gmail watches last seven days.
+        return {'historyId': "1", 'expiration': str(int((time.time() + 7 * 24 * 3600) * 1000))}
+
+    def stop_watch(self):
+        pass
+
+    def fetch_history(self, start_history_id: str) -> Iterator[Dict[str, Any]]:
+        return self._message_ids()
+
+    def download_email_content(self, msg_id: str) -> Optional[bytes]:
+        if self.download_latency:
+            time.sleep(self.download_latency)
+        return self._render(msg_id)
+
+    def download_emails_batch(self, msg_ids: List[str]) -> Tuple[Dict[str, bytes], Dict[str, str]]:
+        if self.download_latency:
+            time.sleep(self.download_latency)
+        return {msg_id: self._render(msg_id) for msg_id in msg_ids}, {}
@@ -1,34 +1,91 @@
 import os.path
 import base64
 import email
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+import json
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+import google_auth_httplib2
+import httplib2
 
-from config.logging_config import setup_logging
+from config.mailboxes import Mailbox, DEFAULT_MAILBOX
+from config.metrics import BYTES, timed
 from config.settings import settings
+from email_service.rate_limiter import QuotaRateLimiter, cost_of
 
-logger = setup_logging()
+logger = logging.getLogger(__name__)
 
 # If modifying these scopes, delete the file token.json.
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
+# Hard limit on sub-requests per Gmail batch call.
+MAX_BATCH_SIZE = 100
+
+# Operation each API method is reported under in the latency metrics.
+METRIC_OPERATIONS = {'messages.list': 'list', 'history.list': 'list', 'messages.get': 'download'}
+
+
+class HistoryExpiredError(Exception):
+    """The stored historyId is older than the history Gmail retains."""
+
+
+class RateLimitExceededError(Exception):
+    """Gmail kept rejecting a call for exceeding quota after all retries."""
+
+
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+
+def _is_rate_limited(error: HttpError) -> bool:
+    status = error.resp.status
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+    try:
+        details = json.loads(error.content.decode('utf-8'))['error']['errors']
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return False
+    return any(detail.get('reason') in RATE_LIMIT_REASONS for detail in details)
+
+
+def _retry_after(error: HttpError) -> Optional[float]:
+    value = error.resp.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        # HTTP-date form; let the limiter pick its own backoff.
+        return None
+
+
 class GmailService:
-    def __init__(self):
+    def __init__(self, mailbox: Optional[Mailbox] = None):
+        self.mailbox = mailbox or Mailbox(name=DEFAULT_MAILBOX)
         self.creds = None
         self.service = None
+        # httplib2 connections are not thread-safe; each worker thread gets its own.
+        self._local = threading.local()
+        # Gmail enforces quota per user, so all threads of a mailbox share one limiter.
+        self.rate_limiter = QuotaRateLimiter(
+            self.mailbox.quota_units_per_second or settings.GMAIL_QUOTA_UNITS_PER_SECOND
+        )
         self.authenticate()
 
     def authenticate(self):
         """Shows basic usage of the Gmail API.
         Lists the user's Gmail labels.
         """
-        if os.path.exists('token.json'):
-            self.creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+        token_file = self.mailbox.token_file
+        credentials_file = self.mailbox.credentials_file
+
+        if os.path.exists(token_file):
+            self.creds = Credentials.from_authorized_user_file(token_file, SCOPES)
         
         # If there are no (valid) credentials available, let the user log in.
         if not self.creds or not self.creds.valid:
@@ -36,20 +93,20 @@ class GmailService:
                 try:
                     self.creds.refresh(Request())
                 except Exception as e:
-                    logger.error(f"Error refreshing token: {e}")
+                    logger.error(f"Error refreshing token for {self.mailbox.name}: {e}")
                     self.creds = None
 
             if not self.creds:
-                if os.path.exists('credentials.json'):
+                if os.path.exists(credentials_file):
                     flow = InstalledAppFlow.from_client_secrets_file(
-                        'credentials.json', SCOPES)
+                        credentials_file, SCOPES)
                     self.creds = flow.run_local_server(port=0)
                     # Save the credentials for the next run
-                    with open('token.json', 'w') as token:
+                    with open(token_file, 'w') as token:
                         token.write(self.creds.to_json())
                 else:
-                    logger.error("credentials.json not found. Cannot authenticate.")
-                    raise FileNotFoundError("credentials.json not found.")
+                    logger.error(f"{credentials_file} not found. Cannot authenticate {self.mailbox.name}.")
+                    raise FileNotFoundError(f"{credentials_file} not found.")
 
         try:
             self.service = build('gmail', 'v1', credentials=self.creds)
@@ -57,35 +114,226 @@ class GmailService:
             logger.error(f"An error occurred: {error}")
             raise
 
-    def fetch_emails(self, minutes: int = 15) -> List[Dict[str, Any]]:
+    def _http(self) -> google_auth_httplib2.AuthorizedHttp:
+        """
+        Return an authorized HTTP transport owned by the calling thread.
+        """
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(self.creds, http=httplib2.Http())
+            self._local.http = http
+        return http
+
+    def _execute(self, request, method: str) -> Dict[str, Any]:
+        """
+        Execute a Gmail API request within the mailbox's quota, backing off and
+        retrying when Gmail reports a rate limit.
+        """
+        for _ in range(settings.GMAIL_RATE_LIMIT_RETRIES + 1):
+            self.rate_limiter.acquire(cost_of(method))
+            try:
+                with timed(METRIC_OPERATIONS.get(method, method), 'gmail'):
+                    response = request.execute(http=self._http())
+            except HttpError as error:
+                if not _is_rate_limited(error):
+                    raise
+                self.rate_limiter.on_rate_limited(_retry_after(error))
+                continue
+            self.rate_limiter.on_success()
+            return response
+        raise RateLimitExceededError(
+            f"Gmail {method} still rate limited after {settings.GMAIL_RATE_LIMIT_RETRIES} retries"
+        )
+
+    def _iter_pages(self, request_fn, method: str) -> Iterator[Dict[str, Any]]:
+        """
+        Execute a paginated list call, following `nextPageToken` until exhausted.
+        `request_fn(page_token)` must build the request for a given page.
+        """
+        page_token = None
+        while True:
+            results = self._execute(request_fn(page_token), method)
+            yield results
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+    def fetch_emails(self, minutes: int = 15) -> Iterator[Dict[str, Any]]:
         """
-        Fetch emails from the last `minutes`.
+        Stream emails from the last `minutes`, following every result page.
         """
+        # Calculate timestamp for query
+        cutoff = datetime.now() - timedelta(minutes=minutes)
+        timestamp = int(cutoff.timestamp())
+        return self._list_messages(f"after:{timestamp}")
+
+    def fetch_range(self, start: datetime, end: datetime) -> Iterator[Dict[str, Any]]:
+        """
+        Stream emails received between `start` and `end` (naive UTC), for backfills.
+        """
+        # after:/before: take epoch seconds. Naive datetimes would be read as
+        # local time by timestamp(), shifting the window by the host's offset.
+        after = int(start.replace(tzinfo=timezone.utc).timestamp())
+        before = int(end.replace(tzinfo=timezone.utc).timestamp())
+        # Widen by a second so messages on a partition boundary are listed by
+        # both sides rather than neither; the idempotency check drops the duplicate.
+        return self._list_messages(f"after:{after - 1} before:{before}")
+
+    def _list_messages(self, query: str) -> Iterator[Dict[str, Any]]:
+        logger.info(f"Fetching emails with query: {query}")
+
+        count = 0
         try:
-            # Calculate timestamp for query
-            cutoff = datetime.now() - timedelta(minutes=minutes)
-            timestamp = int(cutoff.timestamp())
-            query = f"after:{timestamp}"
-            
-            logger.info(f"Fetching emails with query: {query}")
-            
-            results = self.service.users().messages().list(userId='me', q=query).execute()
-            messages = results.get('messages', [])
-            
-            logger.info(f"Found {len(messages)} emails.")
-            return messages
+            for page in self._iter_pages(lambda token: self.service.users().messages().list(
+                userId='me', q=query, pageToken=token, maxResults=settings.GMAIL_PAGE_SIZE
+            ), 'messages.list'):
+                messages = page.get('messages', [])
+                count += len(messages)
+                yield from messages
         except HttpError as error:
             logger.error(f"An error occurred fetching emails: {error}")
-            return []
+            raise
+
+        logger.info(f"Found {count} emails.")
+
+    def get_history_id(self) -> str:
+        """
+        Return the mailbox's current historyId, used as the next sync checkpoint.
+        """
+        profile = self._execute(self.service.users().getProfile(userId='me'), 'getProfile')
+        return str(profile['historyId'])
+
+    def get_email_address(self) -> str:
+        """
+        Return the mailbox's address, as used in push notifications.
+        """
+        profile = self._execute(self.service.users().getProfile(userId='me'), 'getProfile')
+        return profile['emailAddress']
+
+    def watch(self, topic_name: str) -> Dict[str, Any]:
+        """
+        Ask Gmail to publish a notification to the Pub/Sub `topic_name` for
+        every change to the mailbox. Returns the response, with `historyId`
+        and `expiration` (epoch milliseconds). Gmail expires watches after
+        seven days, so this must be renewed; renewing is harmless.
+        """
+        # No label filter: ingestion covers the whole mailbox, like fetch_history.
+        response = self._execute(
+            self.service.users().watch(userId='me', body={'topicName': topic_name}), 'watch'
+        )
+        logger.info(f"Watching {self.mailbox.name} until {response.get('expiration')}")
+        return response
+
+    def stop_watch(self):
+        self._execute(self.service.users().stop(userId='me'), 'stop')
+
+    def fetch_history(self, start_history_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream messages added to the mailbox since `start_history_id`.
+
+        Raises HistoryExpiredError when Gmail no longer holds history that far
+        back; callers should fall back to a time-window scan.
+        """
+        logger.info(f"Fetching mailbox history since {start_history_id}")
+
+        count = 0
+        try:
+            for page in self._iter_pages(lambda token: self.service.users().history().list(
+                userId='me', startHistoryId=start_history_id, historyTypes=['messageAdded'],
+                pageToken=token, maxResults=settings.GMAIL_PAGE_SIZE
+            ), 'history.list'):
+                for record in page.get('history', []):
+                    for added in record.get('messagesAdded', []):
+                        count += 1
+                        yield added['message']
+        except HttpError as error:
+            if error.resp.status == 404:
+                raise HistoryExpiredError(
+                    f"History checkpoint {start_history_id} is no longer available"
+                ) from error
+            logger.error(f"An error occurred fetching history: {error}")
+            raise
+
+        logger.info(f"Found {count} new emails in history.")
 
     def download_email_content(self, msg_id: str) -> Optional[bytes]:
         """
         Download the raw email content (RFC822).
+        Safe to call concurrently from multiple threads.
+        Raises RateLimitExceededError rather than returning None when the
+        mailbox stays over quota.
         """
         try:
-            message = self.service.users().messages().get(userId='me', id=msg_id, format='raw').execute()
-            msg_str = base64.urlsafe_b64decode(message['raw'].encode('ASCII'))
+            message = self._execute(
+                self.service.users().messages().get(userId='me', id=msg_id, format='raw'), 'messages.get'
+            )
+            msg_str = base64.urlsafe_b64decode(message['raw'])
+            BYTES.labels('download', 'gmail').inc(len(msg_str))
             return msg_str
         except HttpError as error:
             logger.error(f"An error occurred downloading email {msg_id}: {error}")
             return None
+
+    def download_emails_batch(self, msg_ids: List[str]) -> Tuple[Dict[str, bytes], Dict[str, str]]:
+        """
+        Download the raw content (RFC822) of several emails in one HTTP batch call.
+        Safe to call concurrently from multiple threads.
+
+        Returns a tuple of (contents, errors): raw bytes keyed by message id for
+        every message that succeeded, and an error message keyed by message id
+        for every message that failed. A failing message does not affect the
+        rest of the batch.
+        """
+        msg_ids = list(dict.fromkeys(msg_ids))
+        if len(msg_ids) > MAX_BATCH_SIZE:
+            raise ValueError(f"Gmail batches are limited to {MAX_BATCH_SIZE} requests, got {len(msg_ids)}")
+
+        contents: Dict[str, bytes] = {}
+        errors: Dict[str, str] = {}
+
+        # Sub-requests rejected for quota are retried in a smaller follow-up batch.
+        pending = msg_ids
+        for _ in range(settings.GMAIL_RATE_LIMIT_RETRIES + 1):
+            if not pending:
+                break
+            limited: List[str] = []
+            retry_after: List[Optional[float]] = []
+
+            def callback(request_id, response, exception):
+                if exception is not None:
+                    if isinstance(exception, HttpError) and _is_rate_limited(exception):
+                        limited.append(request_id)
+                        retry_after.append(_retry_after(exception))
+                        return
+                    logger.error(f"An error occurred downloading email {request_id}: {exception}")
+                    errors[request_id] = str(exception)
+                    return
+                try:
+                    contents[request_id] = base64.urlsafe_b64decode(response['raw'])
+                    BYTES.labels('download', 'gmail').inc(len(contents[request_id]))
+                except (KeyError, ValueError) as e:
+                    errors[request_id] = f"Malformed raw content: {e}"
+
+            # Each sub-request is charged as an individual messages.get.
+            self.rate_limiter.acquire(cost_of('messages.get') * len(pending))
+            batch = self.service.new_batch_http_request(callback=callback)
+            for msg_id in pending:
+                batch.add(
+                    self.service.users().messages().get(userId='me', id=msg_id, format='raw'),
+                    request_id=msg_id,
+                )
+            with timed('download', 'gmail'):
+                batch.execute(http=self._http())
+
+            if limited:
+                hints = [value for value in retry_after if value is not None]
+                self.rate_limiter.on_rate_limited(max(hints) if hints else None)
+            else:
+                self.rate_limiter.on_success()
+            pending = limited
+
+        for msg_id in pending:
+            errors[msg_id] = (
+                f"Gmail messages.get still rate limited after {settings.GMAIL_RATE_LIMIT_RETRIES} retries"
+            )
+        return contents, errors
@@ -0,0 +1,108 @@
+import json
+import logging
+import queue
+from abc import ABC, abstractmethod
+from typing import List, NamedTuple, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Notification(NamedTuple):
+    """A Gmail push notification: something changed in this mailbox."""
+    email_address: str
+    history_id: str
+
+
+class NotificationSource(ABC):
+    @abstractmethod
+    def pull(self, timeout: float) -> List[Notification]:
+        """
+        Wait up to `timeout` seconds for notifications and return those
+        received (possibly none). Returned notifications are acknowledged.
+        """
+
+    def close(self):
+        pass
+
+
+class PubSubNotificationSource(NotificationSource):
+    """
+    Synchronous pull from the Pub/Sub subscription attached to the topic
+    Gmail publishes to (see GmailService.watch).
+    """
+
+    def __init__(self, subscription: Optional[str] = None, max_messages: int = 100):
+        try:
+            from google.cloud import pubsub_v1
+        except ImportError as e:
+            raise RuntimeError("PUSH_SOURCE=pubsub requires the 'google-cloud-pubsub' package") from e
+        self.subscription = subscription or settings.PUSH_SUBSCRIPTION
+        if not self.subscription:
+            raise ValueError("PUSH_SUBSCRIPTION must be set to pull Gmail notifications from Pub/Sub.")
+        self.max_messages = max_messages
+        self.subscriber = pubsub_v1.SubscriberClient()
+
+    def pull(self, timeout: float) -> List[Notification]:
+        from google.api_core.exceptions import DeadlineExceeded
+
+        try:
+            response = self.subscriber.pull(
+                request={"subscription": self.subscription, "max_messages": self.max_messages},
+                timeout=timeout,
+            )
+        except DeadlineExceeded:
+            return []
+
+        notifications = []
+        for received in response.received_messages:
+            try:
+                payload = json.loads(received.message.data.decode("utf-8"))
+                notifications.append(Notification(payload["emailAddress"], str(payload["historyId"])))
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Ignoring malformed Gmail notification {received.message.message_id}: {e}")
+        if response.received_messages:
+            # A notification only means "sync now"; redelivery after a crash
+            # is unnecessary because the polling fallback catches up anyway.
+            self.subscriber.acknowledge(request={
+                "subscription": self.subscription,
+                "ack_ids": [received.ack_id for received in response.received_messages],
+            })
+        return notifications
+
+    def close(self):
+        self.subscriber.close()
+
+
+class LocalNotificationSource(NotificationSource):
+    """
+    In-process stand-in for Pub/Sub, for tests and local development:
+    call `publish` to simulate Gmail announcing a change.
+    """
+
+    def __init__(self):
+        self._queue: "queue.Queue[Notification]" = queue.Queue()
+
+    def publish(self, email_address: str, history_id: str = "0"):
+        self._queue.put(Notification(email_address, history_id))
+
+    def pull(self, timeout: float) -> List[Notification]:
+        try:
+            notifications = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                notifications.append(self._queue.get_nowait())
+            except queue.Empty:
+                return notifications
+
+
+def get_notification_source() -> NotificationSource:
+    source = settings.PUSH_SOURCE.lower()
+    if source == "pubsub":
+        return PubSubNotificationSource()
+    if source == "local":
+        return LocalNotificationSource()
+    raise ValueError(f"Unknown push source: {source}. Valid options are 'pubsub', 'local'.")
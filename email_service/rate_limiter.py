@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Gmail API quota units charged per call.
+# https://developers.google.com/gmail/api/reference/quota
+METHOD_COSTS = {
+    "getProfile": 1,
+    "history.list": 2,
+    "messages.list": 5,
+    "messages.get": 5,
+    "watch": 100,
+    "stop": 50,
+}
+DEFAULT_COST = 5
+
+# On a rate-limit response the rate is halved, but never below this share of the maximum.
+MIN_RATE_FRACTION = 0.05
+# Each success recovers this share of the maximum rate (additive increase).
+RECOVERY_FRACTION = 0.01
+# Backoff used when the server does not send Retry-After, doubled per consecutive hit.
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 64.0
+
+
+def cost_of(method: str) -> int:
+    return METHOD_COSTS.get(method, DEFAULT_COST)
+
+
+class QuotaRateLimiter:
+    """
+    Thread-safe token bucket denominated in Gmail quota units.
+
+    Callers `acquire()` the cost of a call before making it. The refill rate
+    adapts AIMD-style: it is halved (and all callers pause for Retry-After)
+    whenever Gmail answers with a rate-limit error, then creeps back towards
+    `max_rate` with every successful call. One limiter should be shared by all
+    threads calling the same mailbox, since Gmail enforces quota per user.
+    """
+
+    def __init__(self, max_rate: float, burst: Optional[float] = None):
+        if max_rate <= 0:
+            raise ValueError(f"Rate limit must be positive, got {max_rate}")
+        self.max_rate = max_rate
+        self.rate = max_rate
+        # One second's worth of quota by default, as Gmail averages per second.
+        self.capacity = burst or max_rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._consecutive_limits = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, units: float):
+        """
+        Block until `units` quota units are available, then consume them.
+        Requests larger than the bucket wait for a full bucket and go into debt.
+        """
+        needed = min(units, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= needed:
+                    self._tokens -= units
+                    return
+                wait = max(self._paused_until - now, (needed - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self._consecutive_limits = 0
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_FRACTION)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> float:
+        """
+        Slow down after a 429 / rateLimitExceeded. Returns the pause applied.
+        """
+        with self._lock:
+            self._consecutive_limits += 1
+            self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate / 2)
+            if retry_after is None:
+                retry_after = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** (self._consecutive_limits - 1))
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + retry_after)
+            # Drop the burst allowance so traffic resumes at the reduced rate.
+            self._tokens = 0.0
+            self._updated = now
+            logger.warning(
+                f"Gmail rate limit hit; pausing {retry_after:.1f}s and reducing rate to {self.rate:.0f} units/s."
+            )
+            return retry_after
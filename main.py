@@ -1,9 +1,11 @@
 from config.logging_config import setup_logging
+from config.metrics import start_metrics_server
 from scheduler.job_runner import JobRunner
 
 def main():
     logger = setup_logging()
     logger.info("Initializing Email Ingestion Service...")
+    start_metrics_server()
     
     runner = JobRunner()
     runner.start()
@@ -0,0 +1,159 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from typing import Callable, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Fixed-size bloom filter over strings.
+
+    Memory is set once from `capacity` and `error_rate` (about 1.2 MB per
+    million entries at 1%) and never grows; inserting more than `capacity`
+    entries only raises the false-positive rate.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        if capacity < 1:
+            raise ValueError(f"Bloom filter capacity must be positive, got {capacity}")
+        if not 0 < error_rate < 1:
+            raise ValueError(f"Bloom filter error rate must be between 0 and 1, got {error_rate}")
+        self.capacity = capacity
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        # Kirsch-Mitzenmacher double hashing: k positions from one 128-bit digest.
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.bits)
+
+
+class ProcessedIdCache:
+    """
+    In-process membership layer in front of the processed_emails table.
+
+    A negative answer from `might_contain` is definitive and needs no SQLite
+    round trip; a positive answer must be confirmed with an indexed lookup.
+    The filter is filled from `load_rows` on first use (or in the background
+    via `start_warming`); lookups made while it is loading wait for it.
+
+    `load_rows(after_rowid)` yields (rowid, id) pairs in rowid order; ids are
+    whatever keys the caller passes to `might_contain` and `add_many` (the
+    repository scopes Gmail ids by account).
+    Every `refresh_interval` seconds the cache loads the rows added since the
+    last load, so ids committed by other processes sharing the database (a
+    backfill next to the scheduler, say) stop reading as unprocessed.
+    """
+
+    def __init__(self, load_rows: Callable[[int], Iterable[Tuple[int, str]]], capacity: int,
+                 error_rate: float, refresh_interval: Optional[float] = None):
+        self._load_rows = load_rows
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._refresh_interval = refresh_interval
+        self._filter = None
+        self._lock = threading.Lock()
+        self._warned_full = False
+        self._last_rowid = 0
+        self._refreshed = time.monotonic()
+
+    def _ensure_warm(self) -> BloomFilter:
+        bloom = self._filter
+        if bloom is not None:
+            return bloom
+        with self._lock:
+            if self._filter is None:
+                bloom = BloomFilter(self._capacity, self._error_rate)
+                self._load_into(bloom)
+                self._filter = bloom
+                logger.info(
+                    f"Loaded {bloom.count} processed ids into a {bloom.size_bytes // 1024} KiB bloom filter."
+                )
+                self._check_capacity(bloom)
+            return self._filter
+
+    def _load_into(self, bloom: BloomFilter):
+        # Caller holds the lock.
+        for rowid, gmail_id in self._load_rows(self._last_rowid):
+            bloom.add(gmail_id)
+            self._last_rowid = rowid
+        self._refreshed = time.monotonic()
+
+    def _maybe_refresh(self, bloom: BloomFilter):
+        if not self._refresh_interval or time.monotonic() - self._refreshed < self._refresh_interval:
+            return
+        # Whoever gets the lock refreshes; everyone else keeps the current view.
+        if self._lock.acquire(blocking=False):
+            try:
+                self._load_into(bloom)
+                self._check_capacity(bloom)
+            finally:
+                self._lock.release()
+
+    def _check_capacity(self, bloom: BloomFilter):
+        if bloom.count > bloom.capacity and not self._warned_full:
+            self._warned_full = True
+            logger.warning(
+                f"Processed id cache holds {bloom.count} ids, above its capacity of {bloom.capacity}; "
+                f"false positives (extra SQLite lookups) will increase. Raise PROCESSED_ID_CACHE_CAPACITY."
+            )
+
+    def start_warming(self):
+        """
+        Load the filter on a background thread so the first run does not pay for it.
+        """
+        threading.Thread(target=self._ensure_warm, name="processed-id-cache-warm", daemon=True).start()
+
+    def rebuild(self):
+        """
+        Replace the filter with one loaded from the rows still in the table,
+        after retention deleted some. Lookups keep using the current filter
+        while the new one loads.
+        """
+        bloom = BloomFilter(self._capacity, self._error_rate)
+        last_rowid = 0
+        for rowid, gmail_id in self._load_rows(0):
+            bloom.add(gmail_id)
+            last_rowid = rowid
+        with self._lock:
+            # Rows committed while loading are picked up here; ids added
+            # through add_many meanwhile are in those rows too.
+            self._last_rowid = last_rowid
+            self._load_into(bloom)
+            self._filter = bloom
+            self._warned_full = False
+        logger.info(f"Rebuilt the processed id cache with {bloom.count} ids.")
+
+    def might_contain(self, gmail_id: str) -> bool:
+        bloom = self._ensure_warm()
+        self._maybe_refresh(bloom)
+        return gmail_id in bloom
+
+    def add_many(self, gmail_ids: Iterable[str]):
+        bloom = self._ensure_warm()
+        # Bit updates are read-modify-write; serialize them so none are lost.
+        with self._lock:
+            for gmail_id in gmail_ids:
+                bloom.add(gmail_id)
+            self._check_capacity(bloom)
@@ -0,0 +1,184 @@
+import logging
+from typing import Set, Tuple
+
+from sqlalchemy import Integer, Table, UniqueConstraint, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+
+from config.mailboxes import load_mailboxes
+from persistence.models import Base
+
+logger = logging.getLogger(__name__)
+
+
+def _processed_accounts(connection: Connection):
+    """
+    Attribute processed emails recorded before processed_emails had an
+    account column: the account their metadata was saved under, else the
+    configured mailbox whose "{mailbox}/" prefix their storage key carries
+    (see EmailProcessor._filename), else the default mailbox.
+    """
+    connection.execute(text(
+        "UPDATE processed_emails SET account = COALESCE("
+        "(SELECT account FROM email_metadata AS m WHERE m.gmail_id = processed_emails.gmail_id), account)"
+    ))
+    mailboxes = {mailbox.name for mailbox in load_mailboxes()}
+    updates = []
+    for rowid, gmail_id, storage_key in connection.execute(text(
+        "SELECT rowid, gmail_id, storage_key FROM processed_emails WHERE account = 'default'"
+    )):
+        position = storage_key.find(f"/{gmail_id}.eml")
+        if position < 0:
+            continue
+        prefix = storage_key[:position].rpartition("/")[2]
+        if prefix in mailboxes:
+            updates.append({"account": prefix, "row": rowid})
+    if updates:
+        connection.execute(text("UPDATE processed_emails SET account = :account WHERE rowid = :row"), updates)
+
+
+# Populate a column right after it has been added to an existing table: a
+# statement, or a function of the connection. Run in this order, once every
+# missing column exists.
+BACKFILLS = {
+    ("failed_emails", "next_attempt_at"):
+        "UPDATE failed_emails SET next_attempt_at = last_attempt WHERE next_attempt_at IS NULL",
+    ("processed_emails", "account"): _processed_accounts,
+    # Before the account column, gmail_id was unique across these tables.
+    ("stored_copies", "account"):
+        "UPDATE stored_copies SET account = COALESCE("
+        "(SELECT account FROM processed_emails AS p WHERE p.gmail_id = stored_copies.gmail_id), "
+        "(SELECT account FROM failed_emails AS f WHERE f.gmail_id = stored_copies.gmail_id), 'default')",
+    ("segment_index", "account"):
+        "UPDATE segment_index SET account = COALESCE("
+        "(SELECT account FROM processed_emails AS p WHERE p.gmail_id = segment_index.gmail_id), 'default')",
+}
+
+
+def _keys(table: Table) -> Set[Tuple[str, ...]]:
+    # Primary key and unique constraints, as column name tuples.
+    keys = {tuple(column.name for column in table.primary_key.columns)}
+    keys.update(
+        tuple(column.name for column in constraint.columns)
+        for constraint in table.constraints if isinstance(constraint, UniqueConstraint)
+    )
+    return keys
+
+
+def _existing_keys(inspector, name: str) -> Set[Tuple[str, ...]]:
+    keys = {tuple(inspector.get_pk_constraint(name)["constrained_columns"])}
+    keys.update(tuple(constraint["column_names"]) for constraint in inspector.get_unique_constraints(name))
+    return keys
+
+
+def _rebuild(connection: Connection, inspector, table: Table):
+    """
+    Recreate `table` with its current keys, which SQLite cannot alter in
+    place, keeping every row (and rowid, which the FTS index refers to).
+    Indexes are recreated with the table; triggers go with the old one.
+    """
+    old = f"{table.name}__old"
+    columns = ", ".join(f'"{column.name}"' for column in table.columns)
+    primary_key = list(table.primary_key.columns)
+    if not (len(primary_key) == 1 and isinstance(primary_key[0].type, Integer)):
+        # Otherwise the primary key already is the rowid.
+        columns = f"rowid, {columns}"
+    for index in inspector.get_indexes(table.name):
+        connection.execute(text(f'DROP INDEX "{index["name"]}"'))
+    connection.execute(text(f'ALTER TABLE "{table.name}" RENAME TO "{old}"'))
+    table.create(connection)
+    connection.execute(text(
+        f'INSERT INTO "{table.name}" ({columns}) SELECT {columns} FROM "{old}"'
+    ))
+    connection.execute(text(f'DROP TABLE "{old}"'))
+    logger.info(f"Rebuilt {table.name} with keys {sorted(_keys(table))}")
+
+
+def upgrade_schema(engine: Engine):
+    """
+    Bring an existing metadata database up to the current models.
+
+    `create_all` only creates missing tables; this adds columns and indexes
+    that were introduced after a table was first created, and rebuilds
+    tables whose primary key or unique constraints changed (SQLite's ALTER
+    TABLE cannot change those).
+    """
+    inspector = inspect(engine)
+    added = set()
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(dialect=engine.dialect)}'
+                if column.server_default is not None:
+                    # SQLite only accepts NOT NULL on added columns that have a default.
+                    ddl += f" DEFAULT '{column.server_default.arg}'"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                connection.execute(text(ddl))
+                added.add((table.name, column.name))
+                logger.info(f"Added column {table.name}.{column.name}")
+
+        for key, backfill in BACKFILLS.items():
+            if key not in added:
+                continue
+            if callable(backfill):
+                backfill(connection)
+            else:
+                connection.execute(text(backfill))
+
+        # Sees the columns added above.
+        inspector = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            if _existing_keys(inspector, table.name) != _keys(table):
+                _rebuild(connection, inspector, table)
+                continue
+            for index in table.indexes:
+                # Idempotent; also covers indexes on columns added above.
+                index.create(connection, checkfirst=True)
+
+
+# Full-text index over email_metadata. The FTS5 table stores no text of its
+# own (external content); triggers keep it in step with email_metadata.
+SEARCH_INDEX_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS email_search USING fts5(
+        sender, recipients, subject, attachments,
+        content='email_metadata', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS email_metadata_ai AFTER INSERT ON email_metadata BEGIN
+        INSERT INTO email_search(rowid, sender, recipients, subject, attachments)
+        VALUES (new.id, new.sender, new.recipients, new.subject, new.attachments);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS email_metadata_ad AFTER DELETE ON email_metadata BEGIN
+        INSERT INTO email_search(email_search, rowid, sender, recipients, subject, attachments)
+        VALUES ('delete', old.id, old.sender, old.recipients, old.subject, old.attachments);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS email_metadata_au AFTER UPDATE ON email_metadata BEGIN
+        INSERT INTO email_search(email_search, rowid, sender, recipients, subject, attachments)
+        VALUES ('delete', old.id, old.sender, old.recipients, old.subject, old.attachments);
+        INSERT INTO email_search(rowid, sender, recipients, subject, attachments)
+        VALUES (new.id, new.sender, new.recipients, new.subject, new.attachments);
+    END""",
+)
+
+
+def create_search_index(engine: Engine) -> bool:
+    """
+    Create the email_search FTS5 index and its triggers if missing. Returns
+    False when this SQLite build has no FTS5; metadata is then still
+    recorded, just not full-text searchable.
+    """
+    try:
+        with engine.begin() as connection:
+            for statement in SEARCH_INDEX_DDL:
+                connection.execute(text(statement))
+    except OperationalError as e:
+        logger.warning(f"Full-text search is unavailable, SQLite lacks FTS5: {e}")
+        return False
+    return True
@@ -1,22 +1,152 @@
 from datetime import datetime
-from sqlalchemy import String, Integer, DateTime, Text
+from typing import Optional
+from sqlalchemy import String, Integer, DateTime, Text, Index, PrimaryKeyConstraint, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 class Base(DeclarativeBase):
     pass
 
+# Gmail message ids are only unique within a mailbox, so every table about
+# messages is keyed on (account, gmail_id).
+
 class ProcessedEmail(Base):
     __tablename__ = "processed_emails"
 
+    account: Mapped[str] = mapped_column(String, primary_key=True, default="default", server_default="default")
     gmail_id: Mapped[str] = mapped_column(String, primary_key=True)
-    processed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Indexed for retention, which prunes the oldest rows.
+    processed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
     storage_key: Mapped[str] = mapped_column(String, nullable=False)
+    # SHA-256 of the raw message, set when content deduplication is enabled.
+    content_hash: Mapped[Optional[str]] = mapped_column(String, nullable=True, index=True)
+
+class EmailMetadata(Base):
+    """
+    Searchable headers of a processed email (METADATA_ENABLED), mirrored into
+    the email_search FTS5 index by triggers (see persistence/migrations.py).
+    """
+    __tablename__ = "email_metadata"
+
+    # INTEGER PRIMARY KEY aliases the rowid, which keeps it stable across
+    # VACUUM; the FTS index refers to rows by it.
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    gmail_id: Mapped[str] = mapped_column(String, nullable=False)
+    account: Mapped[str] = mapped_column(String, nullable=False)
+    sender: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    recipients: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    subject: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True, index=True)
+    message_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Newline-separated file names
+    attachments: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("account", "gmail_id", name="uq_email_metadata_account_gmail_id"),
+    )
+
+class StoredCopy(Base):
+    """
+    One destination holding a copy of an email, when several storage
+    providers are configured. Lets a retry upload only to the destinations
+    that are missing it.
+    """
+    __tablename__ = "stored_copies"
+
+    account: Mapped[str] = mapped_column(String, primary_key=True, default="default", server_default="default")
+    gmail_id: Mapped[str] = mapped_column(String, primary_key=True)
+    destination: Mapped[str] = mapped_column(String, primary_key=True)
+    storage_key: Mapped[str] = mapped_column(String, nullable=False)
+    stored_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+class Segment(Base):
+    """
+    A segment object bundling many emails (STORAGE_SEGMENTS_ENABLED).
+    """
+    __tablename__ = "segments"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    storage_key: Mapped[str] = mapped_column(String, nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    message_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class SegmentIndex(Base):
+    """
+    Where an email bundled into a segment lives: its byte range in the segment.
+    """
+    __tablename__ = "segment_index"
+
+    account: Mapped[str] = mapped_column(String, primary_key=True, default="default", server_default="default")
+    gmail_id: Mapped[str] = mapped_column(String, primary_key=True)
+    segment: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    offset: Mapped[int] = mapped_column(Integer, nullable=False)
+    length: Mapped[int] = mapped_column(Integer, nullable=False)
 
 class FailedEmail(Base):
     __tablename__ = "failed_emails"
 
-    gmail_id: Mapped[str] = mapped_column(String, primary_key=True)
+    gmail_id: Mapped[str] = mapped_column(String, nullable=False)
     error_message: Mapped[str] = mapped_column(Text, nullable=False)
     retry_count: Mapped[int] = mapped_column(Integer, default=0)
     last_attempt: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Mailbox the message belongs to, so the retry worker knows which account to use.
+    account: Mapped[str] = mapped_column(String, nullable=False, default="default", server_default="default")
+    # When the retry worker may pick this message up again (exponential backoff).
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("account", "gmail_id"),
+        # Serves the retry worker's "due, ordered by due time" scan.
+        Index("ix_failed_emails_due", "next_attempt_at", "account", "gmail_id"),
+    )
+
+class SyncCheckpoint(Base):
+    __tablename__ = "sync_checkpoints"
+
+    account: Mapped[str] = mapped_column(String, primary_key=True)
+    history_id: Mapped[str] = mapped_column(String, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class BackfillPartition(Base):
+    """
+    Progress of one after:/before: slice of a backfill, so an interrupted
+    backfill resumes where it stopped.
+    """
+    __tablename__ = "backfill_partitions"
+
+    account: Mapped[str] = mapped_column(String, primary_key=True)
+    start_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    end_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    # "pending" or "done"
+    status: Mapped[str] = mapped_column(String, nullable=False, default="pending")
+    processed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    failed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class WorkQueueItem(Base):
+    """
+    A listed message on its way to storage. Workers claim pending entries in
+    batches under a lease; entries whose lease ran out (the worker died) are
+    claimable again.
+    """
+    __tablename__ = "work_queue"
+
+    account: Mapped[str] = mapped_column(String, primary_key=True)
+    gmail_id: Mapped[str] = mapped_column(String, primary_key=True)
+    # "pending", "downloading", "uploaded" or "committed"
+    state: Mapped[str] = mapped_column(String, nullable=False, default="pending")
+    # Set once uploaded, so a commit that did not happen can be redone without re-uploading.
+    storage_key: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    content_hash: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    lease_owner: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    claims: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    enqueued_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Serves claiming (oldest first per account and state) and depth counts.
+        Index("ix_work_queue_claim", "account", "state", "enqueued_at"),
+    )
@@ -1,40 +1,150 @@
-from datetime import datetime
-from sqlalchemy import create_engine
+import logging
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, update, func, tuple_, or_, bindparam, literal_column, table, column, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import IntegrityError
-from typing import Optional, List
+from typing import Optional, List, Tuple, Iterator, Dict
 
 from config.settings import settings
-from config.logging_config import setup_logging
-from persistence.models import Base, ProcessedEmail, FailedEmail
+from config.mailboxes import DEFAULT_MAILBOX
+from config.metrics import timed
+from persistence.engine import create_sqlite_engine
+from persistence.id_cache import ProcessedIdCache
+from persistence.migrations import upgrade_schema, create_search_index
+from persistence.models import (
+    Base, ProcessedEmail, FailedEmail, SyncCheckpoint, BackfillPartition, WorkQueueItem, StoredCopy,
+    Segment, SegmentIndex, EmailMetadata,
+)
+
+logger = logging.getLogger(__name__)
+
+# Keeps IN (...) lists well below SQLite's bound-parameter limit.
+MAX_IN_CLAUSE = 500
+
+# Work queue entries that still need a worker.
+OPEN_WORK_STATES = ("pending", "downloading", "uploaded")
+
+# Field prefixes accepted by search_emails, mapped to email_search columns.
+SEARCH_FIELDS = {
+    "from": "sender", "sender": "sender",
+    "to": "recipients", "recipients": "recipients",
+    "subject": "subject",
+    "attachment": "attachments", "attachments": "attachments",
+}
+_email_search = table("email_search", column("rowid"))
+
+
+def _fts_query(query: str) -> str:
+    """
+    Turn a search like `from:alice invoice` into an FTS5 query: every term is
+    quoted (so addresses and punctuation need no escaping), terms must all
+    match, and a known `field:` prefix limits a term to that column.
+    """
+    terms = []
+    for term in query.split():
+        field, separator, value = term.partition(":")
+        column_name = SEARCH_FIELDS.get(field.lower()) if separator else None
+        if column_name is None:
+            value = term
+        if not value:
+            continue
+        quoted = '"' + value.replace('"', '""') + '"'
+        terms.append(f"{column_name}:{quoted}" if column_name else quoted)
+    return " ".join(terms)
+
+
+def _cache_key(account: str, gmail_id: str) -> str:
+    # Gmail ids never contain ":", so each (account, gmail_id) maps to one key.
+    return f"{account}:{gmail_id}"
+
+
+def _chunks(items: List, size: int) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def next_attempt_at(retry_count: int, now: datetime) -> datetime:
+    """
+    When a message that has failed `retry_count` times may be retried:
+    RETRY_BASE_DELAY_SECONDS doubled per earlier failure, capped at
+    RETRY_MAX_DELAY_SECONDS.
+    """
+    delay = min(settings.RETRY_MAX_DELAY_SECONDS,
+                settings.RETRY_BASE_DELAY_SECONDS * 2 ** max(retry_count - 1, 0))
+    return now + timedelta(seconds=delay)
 
-logger = setup_logging()
 
 class Repository:
-    def __init__(self, db_path: str = settings.DB_PATH):
-        self.engine = create_engine(f"sqlite:///{db_path}")
+    def __init__(self, db_path: str = settings.DB_PATH, profile: str = settings.SQLITE_PROFILE):
+        self.engine = create_sqlite_engine(db_path, profile)
         Base.metadata.create_all(self.engine)
+        upgrade_schema(self.engine)
+        self.search_enabled = create_search_index(self.engine)
         self.Session = sessionmaker(bind=self.engine)
+        self.id_cache: Optional[ProcessedIdCache] = None
+        if settings.PROCESSED_ID_CACHE_ENABLED:
+            self.id_cache = ProcessedIdCache(
+                self._iter_cache_keys,
+                capacity=settings.PROCESSED_ID_CACHE_CAPACITY,
+                error_rate=settings.PROCESSED_ID_CACHE_ERROR_RATE,
+                refresh_interval=settings.PROCESSED_ID_CACHE_REFRESH_SECONDS,
+            )
 
-    def is_processed(self, gmail_id: str) -> bool:
+    def iter_processed_rows(self, after_rowid: int = 0,
+                            page_size: int = 50000) -> Iterator[Tuple[int, str, str]]:
+        """
+        Stream (rowid, account, gmail_id) for every processed email inserted after
+        `after_rowid`, paging through the rowid so no single query holds the
+        whole table. Rowids grow with every insert, so the last one seen is
+        a cheap watermark for picking up newer rows later.
+        """
+        rowid = literal_column("processed_emails.rowid")
+        last_rowid = after_rowid
+        while True:
+            session = self.Session()
+            try:
+                page = session.execute(
+                    select(rowid, ProcessedEmail.account, ProcessedEmail.gmail_id)
+                    .where(rowid > last_rowid)
+                    .order_by(rowid)
+                    .limit(page_size)
+                ).all()
+            finally:
+                session.close()
+            if not page:
+                return
+            yield from page
+            last_rowid = page[-1][0]
+
+    def _iter_cache_keys(self, after_rowid: int = 0) -> Iterator[Tuple[int, str]]:
+        for rowid, account, gmail_id in self.iter_processed_rows(after_rowid):
+            yield rowid, _cache_key(account, gmail_id)
+
+    def is_processed(self, gmail_id: str, account: str = DEFAULT_MAILBOX) -> bool:
+        if self.id_cache is not None and not self.id_cache.might_contain(_cache_key(account, gmail_id)):
+            return False
         session = self.Session()
         try:
-            exists = session.query(ProcessedEmail).filter_by(gmail_id=gmail_id).first()
+            exists = session.get(ProcessedEmail, (account, gmail_id))
             return exists is not None
         finally:
             session.close()
 
-    def mark_processed(self, gmail_id: str, storage_key: str):
+    def mark_processed(self, gmail_id: str, storage_key: str, account: str = DEFAULT_MAILBOX):
         session = self.Session()
         try:
-            processed = ProcessedEmail(gmail_id=gmail_id, storage_key=storage_key)
+            processed = ProcessedEmail(account=account, gmail_id=gmail_id, storage_key=storage_key)
             session.add(processed)
             # If it was in failed table, remove it
-            failed = session.query(FailedEmail).filter_by(gmail_id=gmail_id).first()
+            failed = session.get(FailedEmail, (account, gmail_id))
             if failed:
                 session.delete(failed)
             session.commit()
-            logger.info(f"Marked email {gmail_id} as processed.")
+            if self.id_cache is not None:
+                self.id_cache.add_many([_cache_key(account, gmail_id)])
+            logger.info("Marked email %s as processed.", gmail_id)
         except IntegrityError:
             session.rollback()
             logger.warning(f"Email {gmail_id} already processed.")
@@ -45,21 +155,277 @@ class Repository:
         finally:
             session.close()
 
-    def log_failure(self, gmail_id: str, error_message: str):
+    def filter_unprocessed(self, gmail_ids: List[str], account: str = DEFAULT_MAILBOX) -> List[str]:
+        """
+        Return the ids in `gmail_ids` that `account` has not processed yet,
+        preserving their order. Uses one IN query per MAX_IN_CLAUSE ids.
+        """
+        if not gmail_ids:
+            return []
+        candidates = set(gmail_ids)
+        if self.id_cache is not None:
+            # Only ids the cache cannot rule out need confirming against SQLite.
+            candidates = {gmail_id for gmail_id in candidates
+                          if self.id_cache.might_contain(_cache_key(account, gmail_id))}
+            if not candidates:
+                return list(gmail_ids)
+        session = self.Session()
+        try:
+            processed = set()
+            for chunk in _chunks(list(candidates), MAX_IN_CLAUSE):
+                processed.update(session.scalars(
+                    select(ProcessedEmail.gmail_id)
+                    .where(ProcessedEmail.account == account)
+                    .where(ProcessedEmail.gmail_id.in_(chunk))
+                ))
+            return [gmail_id for gmail_id in gmail_ids if gmail_id not in processed]
+        finally:
+            session.close()
+
+    def mark_processed_many(self, entries: List[Tuple[str, str]],
+                            content_hashes: Optional[Dict[str, str]] = None,
+                            account: str = DEFAULT_MAILBOX):
+        """
+        Mark a batch of (gmail_id, storage_key) pairs of `account` as processed, clear them
+        from the failed table and mark their work queue entries committed, in
+        a single transaction. Ids that are
+        already processed are left untouched. `content_hashes` optionally maps
+        gmail_id to the hash of its content, for deduplication.
+        """
+        if not entries:
+            return
+        content_hashes = content_hashes or {}
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            gmail_ids = [gmail_id for gmail_id, _ in entries]
+            with timed("commit", "sqlite"):
+                session.execute(
+                    sqlite_insert(ProcessedEmail).on_conflict_do_nothing(index_elements=["account", "gmail_id"]),
+                    [{"account": account, "gmail_id": gmail_id, "storage_key": storage_key, "processed_at": now,
+                      "content_hash": content_hashes.get(gmail_id)}
+                     for gmail_id, storage_key in entries],
+                )
+                for chunk in _chunks(gmail_ids, MAX_IN_CLAUSE):
+                    session.execute(
+                        delete(FailedEmail)
+                        .where(FailedEmail.account == account)
+                        .where(FailedEmail.gmail_id.in_(chunk))
+                    )
+                    if settings.WORK_QUEUE_ENABLED:
+                        session.execute(
+                            update(WorkQueueItem)
+                            .where(WorkQueueItem.account == account)
+                            .where(WorkQueueItem.gmail_id.in_(chunk))
+                            .values(state="committed", lease_owner=None, lease_expires_at=None, updated_at=now)
+                        )
+                session.commit()
+            if self.id_cache is not None:
+                self.id_cache.add_many(_cache_key(account, gmail_id) for gmail_id in gmail_ids)
+            logger.info(f"Marked {len(entries)} emails as processed.")
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error marking {len(entries)} emails as processed: {e}")
+            raise
+        finally:
+            session.close()
+
+    def find_storage_key_by_hash(self, content_hash: str) -> Optional[str]:
+        """
+        Return the storage key of an already uploaded email with this content
+        hash, if any.
+        """
         session = self.Session()
         try:
-            failed = session.query(FailedEmail).filter_by(gmail_id=gmail_id).first()
+            return session.scalars(
+                select(ProcessedEmail.storage_key).where(ProcessedEmail.content_hash == content_hash).limit(1)
+            ).first()
+        finally:
+            session.close()
+
+    def save_metadata_many(self, account: str, entries: Dict[str, Dict]):
+        """
+        Store the extracted metadata of a batch of emails ({gmail_id: fields},
+        see processor.metadata.extract_metadata) in one transaction; the FTS
+        index is updated by triggers. Emails already recorded are left as is.
+        """
+        if not entries:
+            return
+        session = self.Session()
+        try:
+            with timed("commit", "sqlite"):
+                session.execute(
+                    sqlite_insert(EmailMetadata).on_conflict_do_nothing(index_elements=["account", "gmail_id"]),
+                    [dict(fields, gmail_id=gmail_id, account=account) for gmail_id, fields in entries.items()],
+                )
+                session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error saving metadata of {len(entries)} emails: {e}")
+            raise
+        finally:
+            session.close()
+
+    def search_emails(self, query: str = "", account: Optional[str] = None,
+                      since: Optional[datetime] = None, until: Optional[datetime] = None,
+                      limit: int = 50) -> List[EmailMetadata]:
+        """
+        Find processed emails by their metadata without touching storage.
+        `query` is matched against sender, recipients, subject and attachment
+        names (see _fts_query for the syntax), best matches first; without
+        one, the newest emails in the date range are returned.
+        """
+        statement = select(EmailMetadata)
+        match = _fts_query(query)
+        if match:
+            if not self.search_enabled:
+                raise RuntimeError("Full-text search needs a SQLite build with FTS5.")
+            statement = (
+                statement.join(_email_search, _email_search.c.rowid == EmailMetadata.id)
+                .where(text("email_search MATCH :match").bindparams(match=match))
+                .order_by(text("bm25(email_search)"))
+            )
+        else:
+            statement = statement.order_by(EmailMetadata.sent_at.desc())
+        if account is not None:
+            statement = statement.where(EmailMetadata.account == account)
+        if since is not None:
+            statement = statement.where(EmailMetadata.sent_at >= since)
+        if until is not None:
+            statement = statement.where(EmailMetadata.sent_at < until)
+        session = self.Session()
+        try:
+            return list(session.scalars(statement.limit(limit)))
+        finally:
+            session.close()
+
+    def record_copies(self, entries: List[Tuple[str, str, str]], account: str = DEFAULT_MAILBOX):
+        """
+        Record (gmail_id, destination, storage_key) copies of `account`'s
+        emails made by a multi-destination upload. Re-recording a copy
+        updates its key.
+        """
+        if not entries:
+            return
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            stmt = sqlite_insert(StoredCopy)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["account", "gmail_id", "destination"],
+                set_={"storage_key": stmt.excluded.storage_key, "stored_at": stmt.excluded.stored_at},
+            )
+            with timed("commit", "sqlite"):
+                session.execute(stmt, [
+                    {"account": account, "gmail_id": gmail_id, "destination": destination,
+                     "storage_key": storage_key, "stored_at": now}
+                    for gmail_id, destination, storage_key in entries
+                ])
+                session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error recording {len(entries)} stored copies: {e}")
+            raise
+        finally:
+            session.close()
+
+    def get_copies(self, gmail_ids: List[str], account: str = DEFAULT_MAILBOX) -> Dict[str, Dict[str, str]]:
+        """
+        Destinations already holding each of `account`'s `gmail_ids`, as
+        {gmail_id: {destination: storage_key}}; ids without copies are absent.
+        """
+        copies: Dict[str, Dict[str, str]] = {}
+        if not gmail_ids:
+            return copies
+        session = self.Session()
+        try:
+            for chunk in _chunks(list(gmail_ids), MAX_IN_CLAUSE):
+                for gmail_id, destination, storage_key in session.execute(
+                    select(StoredCopy.gmail_id, StoredCopy.destination, StoredCopy.storage_key)
+                    .where(StoredCopy.account == account)
+                    .where(StoredCopy.gmail_id.in_(chunk))
+                ):
+                    copies.setdefault(gmail_id, {})[destination] = storage_key
+            return copies
+        finally:
+            session.close()
+
+    def record_segments(self, segments: List[Tuple[str, str, int, int]],
+                        index: List[Tuple[str, str, int, int]], account: str = DEFAULT_MAILBOX):
+        """
+        Record sealed segments as (name, storage_key, size, message_count) and
+        where `account`'s emails live in them as (gmail_id, segment name,
+        offset, length), in a single transaction.
+        """
+        if not segments and not index:
+            return
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            with timed("commit", "sqlite"):
+                if segments:
+                    session.execute(
+                        sqlite_insert(Segment).on_conflict_do_nothing(index_elements=["name"]),
+                        [{"name": name, "storage_key": storage_key, "size": size,
+                          "message_count": message_count, "created_at": now}
+                         for name, storage_key, size, message_count in segments],
+                    )
+                if index:
+                    stmt = sqlite_insert(SegmentIndex)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["account", "gmail_id"],
+                        set_={"segment": stmt.excluded.segment, "offset": stmt.excluded.offset,
+                              "length": stmt.excluded.length},
+                    )
+                    session.execute(stmt, [
+                        {"account": account, "gmail_id": gmail_id, "segment": segment,
+                         "offset": offset, "length": length}
+                        for gmail_id, segment, offset, length in index
+                    ])
+                session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error recording {len(segments)} segments: {e}")
+            raise
+        finally:
+            session.close()
+
+    def get_segment_location(self, gmail_id: str,
+                             account: str = DEFAULT_MAILBOX) -> Optional[Tuple[str, int, int]]:
+        """
+        (segment storage key, offset, length) of an email stored in a
+        segment, for a ranged read; None if it is not in one.
+        """
+        session = self.Session()
+        try:
+            row = session.execute(
+                select(Segment.storage_key, SegmentIndex.offset, SegmentIndex.length)
+                .join(Segment, Segment.name == SegmentIndex.segment)
+                .where(SegmentIndex.account == account)
+                .where(SegmentIndex.gmail_id == gmail_id)
+            ).first()
+            return tuple(row) if row else None
+        finally:
+            session.close()
+
+    def log_failure(self, gmail_id: str, error_message: str, account: str = DEFAULT_MAILBOX):
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            failed = session.get(FailedEmail, (account, gmail_id))
             if failed:
                 failed.retry_count += 1
-                failed.last_attempt = datetime.utcnow()
+                failed.last_attempt = now
                 failed.error_message = error_message
             else:
                 failed = FailedEmail(
                     gmail_id=gmail_id,
                     error_message=error_message,
-                    retry_count=1
+                    retry_count=1,
+                    account=account,
                 )
                 session.add(failed)
+            failed.next_attempt_at = next_attempt_at(failed.retry_count, now)
             session.commit()
             logger.error(f"Logged failure for {gmail_id}: {error_message}")
         except Exception as e:
@@ -69,9 +435,560 @@ class Repository:
         finally:
             session.close()
 
+    def log_failures_many(self, entries: List[Tuple[str, str]], account: str = DEFAULT_MAILBOX):
+        """
+        Record a batch of (gmail_id, error_message) failures in a single
+        transaction, bumping retry_count for ids that already failed before
+        and scheduling each id's next retry according to its new count. The
+        ids leave the work queue.
+        """
+        if not entries:
+            return
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            gmail_ids = [gmail_id for gmail_id, _ in entries]
+            retry_counts: Dict[str, int] = {}
+            for chunk in _chunks(gmail_ids, MAX_IN_CLAUSE):
+                retry_counts.update(session.execute(
+                    select(FailedEmail.gmail_id, FailedEmail.retry_count)
+                    .where(FailedEmail.account == account)
+                    .where(FailedEmail.gmail_id.in_(chunk))
+                ).all())
+
+            rows = []
+            for gmail_id, error_message in entries:
+                retry_count = (retry_counts.get(gmail_id) or 0) + 1
+                rows.append({"gmail_id": gmail_id, "error_message": error_message, "retry_count": retry_count,
+                             "last_attempt": now, "created_at": now, "account": account,
+                             "next_attempt_at": next_attempt_at(retry_count, now)})
+
+            stmt = sqlite_insert(FailedEmail)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["account", "gmail_id"],
+                set_={
+                    "retry_count": stmt.excluded.retry_count,
+                    "last_attempt": stmt.excluded.last_attempt,
+                    "error_message": stmt.excluded.error_message,
+                    "next_attempt_at": stmt.excluded.next_attempt_at,
+                },
+            )
+            with timed("commit", "sqlite"):
+                session.execute(stmt, rows)
+                if settings.WORK_QUEUE_ENABLED:
+                    # From here on the failed table owns these messages.
+                    for chunk in _chunks(gmail_ids, MAX_IN_CLAUSE):
+                        session.execute(
+                            delete(WorkQueueItem)
+                            .where(WorkQueueItem.account == account)
+                            .where(WorkQueueItem.gmail_id.in_(chunk))
+                        )
+                session.commit()
+            logger.error(f"Logged {len(entries)} failures.")
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error logging {len(entries)} failures: {e}")
+            raise
+        finally:
+            session.close()
+
     def get_failed_emails(self) -> List[FailedEmail]:
         session = self.Session()
         try:
             return session.query(FailedEmail).all()
         finally:
             session.close()
+
+    def get_due_failures(self, limit: int, now: Optional[datetime] = None,
+                         accounts: Optional[List[str]] = None,
+                         after: Optional[Tuple[datetime, str, str]] = None) -> List[FailedEmail]:
+        """
+        Return up to `limit` failed emails whose backoff has elapsed and that
+        have not used up RETRY_MAX_ATTEMPTS, oldest due first. Pass the
+        (next_attempt_at, account, gmail_id) of the last row as `after` to fetch the
+        next page; the ordering matches the ix_failed_emails_due index.
+        """
+        now = now or datetime.utcnow()
+        query = (
+            select(FailedEmail)
+            .where(FailedEmail.next_attempt_at <= now)
+            .where(FailedEmail.retry_count < settings.RETRY_MAX_ATTEMPTS)
+        )
+        if accounts is not None:
+            query = query.where(FailedEmail.account.in_(accounts))
+        if after is not None:
+            query = query.where(
+                tuple_(FailedEmail.next_attempt_at, FailedEmail.account, FailedEmail.gmail_id) > tuple_(*after)
+            )
+        session = self.Session()
+        try:
+            return list(session.scalars(
+                query.order_by(FailedEmail.next_attempt_at, FailedEmail.account, FailedEmail.gmail_id).limit(limit)
+            ))
+        finally:
+            session.close()
+
+    def count_retryable_failures(self) -> int:
+        """
+        Number of failed emails that have not used up RETRY_MAX_ATTEMPTS.
+        """
+        session = self.Session()
+        try:
+            return session.scalar(
+                select(func.count()).select_from(FailedEmail)
+                .where(FailedEmail.retry_count < settings.RETRY_MAX_ATTEMPTS)
+            )
+        finally:
+            session.close()
+
+    def clear_failures(self, gmail_ids: List[str], account: str = DEFAULT_MAILBOX):
+        """
+        Drop `account`'s failed entries that no longer need retrying, e.g. because the
+        message was processed by a regular run in the meantime.
+        """
+        if not gmail_ids:
+            return
+        session = self.Session()
+        try:
+            for chunk in _chunks(list(gmail_ids), MAX_IN_CLAUSE):
+                session.execute(
+                    delete(FailedEmail)
+                    .where(FailedEmail.account == account)
+                    .where(FailedEmail.gmail_id.in_(chunk))
+                )
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error clearing {len(gmail_ids)} failures: {e}")
+            raise
+        finally:
+            session.close()
+
+    def get_history_checkpoint(self, account: str = DEFAULT_MAILBOX) -> Optional[str]:
+        session = self.Session()
+        try:
+            checkpoint = session.get(SyncCheckpoint, account)
+            return checkpoint.history_id if checkpoint else None
+        finally:
+            session.close()
+
+    def save_history_checkpoint(self, history_id: str, account: str = DEFAULT_MAILBOX):
+        session = self.Session()
+        try:
+            checkpoint = session.get(SyncCheckpoint, account)
+            if checkpoint:
+                checkpoint.history_id = history_id
+                checkpoint.updated_at = datetime.utcnow()
+            else:
+                session.add(SyncCheckpoint(account=account, history_id=history_id))
+            session.commit()
+            logger.info(f"Saved history checkpoint {history_id} for {account}.")
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error saving history checkpoint for {account}: {e}")
+            raise
+        finally:
+            session.close()
+
+    def get_backfill_partitions(self, account: str,
+                                partitions: List[Tuple[datetime, datetime]]) -> Dict[Tuple[datetime, datetime], str]:
+        """
+        Register the (start_at, end_at) partitions of a backfill for `account`
+        and return the status of each, creating missing ones as pending.
+        Pending ones are stamped with the current time, which tells retention
+        the backfill is running again.
+        """
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            stmt = sqlite_insert(BackfillPartition)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["account", "start_at", "end_at"],
+                set_={"updated_at": stmt.excluded.updated_at},
+                where=BackfillPartition.status == "pending",
+            )
+            for chunk in _chunks(partitions, MAX_IN_CLAUSE):
+                session.execute(
+                    stmt,
+                    [{"account": account, "start_at": start_at, "end_at": end_at, "status": "pending",
+                      "processed": 0, "failed": 0, "updated_at": now}
+                     for start_at, end_at in chunk],
+                )
+            session.commit()
+            rows = session.execute(
+                select(BackfillPartition.start_at, BackfillPartition.end_at, BackfillPartition.status)
+                .where(BackfillPartition.account == account)
+            ).all()
+            wanted = set(partitions)
+            return {(start_at, end_at): status for start_at, end_at, status in rows
+                    if (start_at, end_at) in wanted}
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error registering backfill partitions for {account}: {e}")
+            raise
+        finally:
+            session.close()
+
+    def complete_backfill_partition(self, account: str, start_at: datetime, end_at: datetime,
+                                    processed: int, failed: int):
+        session = self.Session()
+        try:
+            partition = session.get(BackfillPartition, (account, start_at, end_at))
+            if partition is None:
+                partition = BackfillPartition(account=account, start_at=start_at, end_at=end_at)
+                session.add(partition)
+            partition.status = "done"
+            partition.processed = processed
+            partition.failed = failed
+            partition.updated_at = datetime.utcnow()
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error saving backfill partition {start_at} - {end_at} for {account}: {e}")
+            raise
+        finally:
+            session.close()
+
+    def enqueue_work(self, account: str, gmail_ids: List[str]):
+        """
+        Record listed messages in the work queue as pending. Ids already
+        queued (by an earlier run or another process) keep their state.
+        """
+        if not gmail_ids:
+            return
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            for chunk in _chunks(gmail_ids, MAX_IN_CLAUSE):
+                session.execute(
+                    sqlite_insert(WorkQueueItem).on_conflict_do_nothing(index_elements=["account", "gmail_id"]),
+                    [{"gmail_id": gmail_id, "account": account, "state": "pending", "claims": 0,
+                      "enqueued_at": now, "updated_at": now}
+                     for gmail_id in chunk],
+                )
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error enqueueing {len(gmail_ids)} emails for {account}: {e}")
+            raise
+        finally:
+            session.close()
+
+    def claim_work(self, account: str, owner: str, limit: int,
+                   now: Optional[datetime] = None) -> Tuple[List[WorkQueueItem], List[str]]:
+        """
+        Lease up to `limit` open work queue entries of `account` to `owner`
+        for WORK_QUEUE_LEASE_SECONDS, oldest first. Open entries are pending
+        ones plus any whose lease has run out. Pending and downloading entries
+        move to downloading; uploaded ones stay uploaded so only their commit
+        is redone.
+
+        The select and update run under BEGIN IMMEDIATE, which takes SQLite's
+        write lock up front, so concurrent workers (threads or processes)
+        never claim the same entry. Returns the claimed entries (detached)
+        and the ids of entries that were already claimed WORK_QUEUE_MAX_CLAIMS
+        times; those are not leased and should be given up on.
+        """
+        now = now or datetime.utcnow()
+        session = self.Session(expire_on_commit=False)
+        try:
+            session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+            entries = list(session.scalars(
+                select(WorkQueueItem)
+                .where(WorkQueueItem.account == account)
+                .where(WorkQueueItem.state.in_(OPEN_WORK_STATES))
+                .where(or_(WorkQueueItem.lease_expires_at.is_(None), WorkQueueItem.lease_expires_at <= now))
+                .order_by(WorkQueueItem.enqueued_at, WorkQueueItem.gmail_id)
+                .limit(min(limit, MAX_IN_CLAUSE))
+            ))
+            claimed = [entry for entry in entries if entry.claims < settings.WORK_QUEUE_MAX_CLAIMS]
+            exhausted = [entry.gmail_id for entry in entries if entry.claims >= settings.WORK_QUEUE_MAX_CLAIMS]
+            lease_expires_at = now + timedelta(seconds=settings.WORK_QUEUE_LEASE_SECONDS)
+            for entry in claimed:
+                if entry.state != "uploaded":
+                    entry.state = "downloading"
+                entry.lease_owner = owner
+                entry.lease_expires_at = lease_expires_at
+                entry.claims += 1
+                entry.updated_at = now
+            session.commit()
+            return claimed, exhausted
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error claiming work for {account}: {e}")
+            raise
+        finally:
+            session.close()
+
+    def mark_work_uploaded(self, entries: List[Tuple[str, str]],
+                           content_hashes: Optional[Dict[str, str]] = None,
+                           account: str = DEFAULT_MAILBOX):
+        """
+        Record the storage key of each (gmail_id, storage_key) of `account` in
+        the work queue once the upload is durable, ahead of the processed-email
+        commit.
+        """
+        if not entries:
+            return
+        content_hashes = content_hashes or {}
+        table = WorkQueueItem.__table__
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            session.connection().execute(
+                update(table).where(table.c.account == account).where(table.c.gmail_id == bindparam("queued_id"))
+                .values(state="uploaded", storage_key=bindparam("queued_key"),
+                        content_hash=bindparam("queued_hash"), updated_at=now),
+                [{"queued_id": gmail_id, "queued_key": storage_key, "queued_hash": content_hashes.get(gmail_id)}
+                 for gmail_id, storage_key in entries],
+            )
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error marking {len(entries)} queued emails as uploaded: {e}")
+            raise
+        finally:
+            session.close()
+
+    def remove_work(self, gmail_ids: List[str], account: str = DEFAULT_MAILBOX):
+        """
+        Drop `account`'s work queue entries that need no further work, e.g. empty messages.
+        """
+        if not gmail_ids:
+            return
+        session = self.Session()
+        try:
+            for chunk in _chunks(list(gmail_ids), MAX_IN_CLAUSE):
+                session.execute(
+                    delete(WorkQueueItem)
+                    .where(WorkQueueItem.account == account)
+                    .where(WorkQueueItem.gmail_id.in_(chunk))
+                )
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error removing {len(gmail_ids)} queued emails: {e}")
+            raise
+        finally:
+            session.close()
+
+    def release_work(self, owner: str):
+        """
+        Hand back whatever `owner` still holds, so other workers can claim it
+        right away instead of waiting for the lease to run out.
+        """
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            for state, new_state in (("downloading", "pending"), ("uploaded", "uploaded")):
+                session.execute(
+                    update(WorkQueueItem)
+                    .where(WorkQueueItem.lease_owner == owner)
+                    .where(WorkQueueItem.state == state)
+                    .values(state=new_state, lease_owner=None, lease_expires_at=None, updated_at=now)
+                )
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error releasing work held by {owner}: {e}")
+            raise
+        finally:
+            session.close()
+
+    def purge_committed_work(self, account: str, before: datetime) -> int:
+        """
+        Delete committed work queue entries of `account` last updated before
+        `before`. Returns the number of entries deleted.
+        """
+        session = self.Session()
+        try:
+            deleted = session.execute(
+                delete(WorkQueueItem)
+                .where(WorkQueueItem.account == account)
+                .where(WorkQueueItem.state == "committed")
+                .where(WorkQueueItem.updated_at < before)
+            ).rowcount
+            session.commit()
+            return deleted
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error purging committed work for {account}: {e}")
+            raise
+        finally:
+            session.close()
+
+    def retention_floor(self) -> Optional[datetime]:
+        """
+        When the least recently advanced history checkpoint was saved: the
+        next sync of that mailbox may list anything that arrived since.
+        """
+        session = self.Session()
+        try:
+            return session.scalar(select(func.min(SyncCheckpoint.updated_at)))
+        finally:
+            session.close()
+
+    def pending_backfills(self) -> Dict[str, datetime]:
+        """
+        Accounts whose backfill has partitions left (those can list messages
+        of any age), with the last time any of their partitions was
+        registered or finished.
+        """
+        pending = select(BackfillPartition.account).where(BackfillPartition.status == "pending")
+        session = self.Session()
+        try:
+            return dict(session.execute(
+                select(BackfillPartition.account, func.max(BackfillPartition.updated_at))
+                .where(BackfillPartition.account.in_(pending))
+                .group_by(BackfillPartition.account)
+            ).all())
+        finally:
+            session.close()
+
+    def cancel_backfill(self, account: str) -> int:
+        """
+        Drop the pending partitions of `account`, e.g. of an abandoned
+        backfill. Returns the number dropped.
+        """
+        session = self.Session()
+        try:
+            dropped = session.execute(
+                delete(BackfillPartition)
+                .where(BackfillPartition.account == account)
+                .where(BackfillPartition.status == "pending")
+            ).rowcount
+            session.commit()
+            return dropped
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error cancelling the backfill of {account}: {e}")
+            raise
+        finally:
+            session.close()
+
+    def _delete_batch(self, table: str, statement) -> int:
+        session = self.Session()
+        try:
+            with timed("prune", "sqlite"):
+                deleted = session.execute(statement.execution_options(synchronize_session=False)).rowcount
+                session.commit()
+            return deleted
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error pruning {table}: {e}")
+            raise
+        finally:
+            session.close()
+
+    def prune_processed(self, before: datetime, limit: int) -> int:
+        """
+        Delete up to `limit` processed emails recorded before `before`, one
+        transaction per call. Returns the number deleted.
+        """
+        rowid = literal_column("processed_emails.rowid")
+        batch = (
+            select(rowid).where(ProcessedEmail.processed_at < before)
+            # The newest row always stays: with the table emptied SQLite would
+            # hand out rowids again from 1, below the watermark id caches
+            # (this process's and others') refresh from.
+            .where(rowid < select(func.max(rowid)).select_from(ProcessedEmail).scalar_subquery())
+            .limit(limit)
+        )
+        return self._delete_batch("processed_emails", delete(ProcessedEmail).where(rowid.in_(batch)))
+
+    def prune_copies(self, before: datetime, limit: int) -> int:
+        """
+        Delete up to `limit` stored copies recorded before `before`, except
+        those of emails still waiting for a retry.
+        """
+        rowid = literal_column("stored_copies.rowid")
+        batch = (
+            select(rowid).where(StoredCopy.stored_at < before)
+            .where(tuple_(StoredCopy.account, StoredCopy.gmail_id).not_in(
+                select(FailedEmail.account, FailedEmail.gmail_id)
+            ))
+            .limit(limit)
+        )
+        return self._delete_batch("stored_copies", delete(StoredCopy).where(rowid.in_(batch)))
+
+    def prune_failures(self, before: datetime, limit: int) -> int:
+        """
+        Delete up to `limit` failed emails that used up RETRY_MAX_ATTEMPTS and
+        were last attempted before `before`.
+        """
+        rowid = literal_column("failed_emails.rowid")
+        batch = (
+            select(rowid).where(FailedEmail.retry_count >= settings.RETRY_MAX_ATTEMPTS)
+            .where(FailedEmail.last_attempt < before)
+            .limit(limit)
+        )
+        return self._delete_batch("failed_emails", delete(FailedEmail).where(rowid.in_(batch)))
+
+    def database_pages(self) -> Dict[str, int]:
+        """
+        page_size, page_count, freelist_count and auto_vacuum (0 none, 1 full,
+        2 incremental) of the metadata database.
+        """
+        with self.engine.connect() as connection:
+            return {
+                name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+                for name in ("page_size", "page_count", "freelist_count", "auto_vacuum")
+            }
+
+    def incremental_vacuum(self, max_seconds: float) -> int:
+        """
+        Return free pages to the filesystem in one write transaction that
+        lasts about `max_seconds` at most (auto_vacuum=INCREMENTAL only).
+        Returns the free pages left.
+        """
+        with self.engine.begin() as connection:
+            free = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+            deadline = time.monotonic() + max_seconds
+            # The pragma frees one page per step and the sqlite3 module steps
+            # a statement without result columns only once.
+            cursor = connection.connection.cursor()
+            try:
+                while free and time.monotonic() < deadline:
+                    for _ in range(min(free, 16)):
+                        cursor.execute("PRAGMA incremental_vacuum(1)")
+                    free -= min(free, 16)
+            finally:
+                cursor.close()
+            return connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+    def checkpoint_wal(self) -> bool:
+        """
+        Copy the write-ahead log into the database and truncate it, so space
+        freed by pruning leaves the WAL file too. Returns False when readers
+        or writers kept it from completing; the next checkpoint catches up.
+        """
+        with self.engine.connect() as connection:
+            busy, _, _ = connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").one()
+            return not busy
+
+    def vacuum(self):
+        """
+        Rebuild the whole database, switching it to SQLITE_AUTO_VACUUM. Takes
+        an exclusive lock for its whole duration.
+        """
+        with self.engine.connect() as connection:
+            connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+            connection.exec_driver_sql(f"PRAGMA auto_vacuum={settings.SQLITE_AUTO_VACUUM}")
+            connection.exec_driver_sql("VACUUM")
+            connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def work_queue_depth(self, account: Optional[str] = None) -> Dict[Tuple[str, str], int]:
+        """
+        Number of work queue entries per (account, state), for every account
+        or only `account`.
+        """
+        query = select(WorkQueueItem.account, WorkQueueItem.state, func.count()).group_by(
+            WorkQueueItem.account, WorkQueueItem.state
+        )
+        if account is not None:
+            query = query.where(WorkQueueItem.account == account)
+        session = self.Session()
+        try:
+            return {(row_account, state): count for row_account, state, count in session.execute(query)}
+        finally:
+            session.close()
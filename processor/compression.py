@@ -0,0 +1,40 @@
+import zlib
+from typing import Iterator, Optional
+
+CODECS = ("none", "gzip", "zstd")
+
+# Appended to the object name so compressed emails are recognisable in the bucket.
+EXTENSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _compressor(codec: str, level: Optional[int]):
+    if codec == "gzip":
+        # wbits=31 selects the gzip container rather than a raw zlib stream.
+        return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level, zlib.DEFLATED, 31)
+    if codec == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise RuntimeError("STORAGE_COMPRESSION=zstd requires the 'zstandard' package") from e
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compressobj()
+    raise ValueError(f"Unknown compression codec: {codec}. Valid options are {', '.join(CODECS)}.")
+
+
+def compress_stream(data: bytes, codec: str, level: Optional[int] = None,
+                    chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Compress `data` incrementally, yielding compressed chunks as they are
+    produced so the full compressed copy never has to exist in memory.
+    """
+    if codec == "none":
+        yield data
+        return
+    compressor = _compressor(codec, level)
+    view = memoryview(data)
+    for offset in range(0, len(view), chunk_size):
+        chunk = compressor.compress(view[offset:offset + chunk_size])
+        if chunk:
+            yield chunk
+    yield compressor.flush()
@@ -1,69 +1,629 @@
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from botocore.exceptions import ClientError
-from typing import Optional
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Iterable, Iterator, Dict, Any, List, Tuple, Callable
 
 from config.settings import settings
-from config.logging_config import setup_logging
-from email_service.gmail import GmailService
+from config.mailboxes import Mailbox, DEFAULT_MAILBOX
+from config.metrics import BACKLOG, LAST_SUCCESS, MESSAGES, WORK_QUEUE
+from email_service.gmail import MAX_BATCH_SIZE, GmailService, HistoryExpiredError
+from storage.base import BaseStorage, is_retryable_upload_error
+from storage.composite import CompositeStorage, PartialUploadError
+from storage.segments import SegmentStorage, parse_segment_key
 from storage.factory import StorageFactory
+from storage.async_base import AsyncBaseStorage, EventLoopThread
 from persistence.repository import Repository
+from processor.compression import EXTENSIONS, compress_stream
+from processor.metadata import extract_metadata
+from processor.pipeline import Pipeline, Stage, WorkItem
+
+logger = logging.getLogger(__name__)
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[List]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _OutcomeBatch:
+    """
+    Buffers per-message outcomes and writes them to SQLite in one transaction
+    per COMMIT_BATCH_SIZE messages (or every COMMIT_INTERVAL_SECONDS). Only used
+    from the thread consuming pipeline results, so SQLite sees a single writer.
+    When retrying, skipped (empty) messages count as failures so they use up
+    their attempts instead of being retried forever. Committed outcomes are
+    tallied in `counts` as they are written. When the items came from the
+    work queue (`queued`), uploads are recorded there before the commit and
+    skipped messages leave it. Copies made by a multi-destination storage
+    are recorded whatever the outcome, so retries skip those destinations.
+    With segment storage, batches are written when the open segment is due
+    to be sealed instead, together with the segment index. Metadata of
+    processed messages is saved after their commit; failing to save it
+    never fails the messages.
+    """
+
+    def __init__(self, repository: Repository, storage: BaseStorage,
+                 account: str = DEFAULT_MAILBOX, retrying: bool = False,
+                 counts: Optional[Dict[str, int]] = None, queued: bool = False):
+        self.repository = repository
+        self.storage = storage
+        self.account = account
+        self.retrying = retrying
+        self.queued = queued
+        self.counts = counts if counts is not None else {}
+        self.counts.setdefault("processed", 0)
+        self.counts.setdefault("failed", 0)
+        self.processed: List[Tuple[str, str]] = []
+        self.content_hashes: Dict[str, str] = {}
+        self.failed: List[Tuple[str, str]] = []
+        self.dropped: List[str] = []
+        self.copies: List[Tuple[str, str, str]] = []
+        self.spooled: List[str] = []
+        self.metadata: Dict[str, Dict[str, Any]] = {}
+        self.last_flush = time.monotonic()
+
+    def add(self, item: WorkItem):
+        BACKLOG.labels(self.account).dec()
+        self.copies.extend(
+            (item.gmail_id, destination, storage_key) for destination, storage_key in item.copies.items()
+        )
+        if item.skipped:
+            if self.retrying:
+                self.failed.append((item.gmail_id, "Empty content"))
+            elif self.queued:
+                self.dropped.append(item.gmail_id)
+            return
+        if item.error is None:
+            self.processed.append((item.gmail_id, item.storage_key))
+            if item.content_hash:
+                self.content_hashes[item.gmail_id] = item.content_hash
+            if item.spooled:
+                self.spooled.append(item.gmail_id)
+            if item.metadata is not None:
+                self.metadata[item.gmail_id] = item.metadata
+        else:
+            logger.error(f"Failed to process {item.gmail_id}: {item.error}")
+            self.failed.append((item.gmail_id, item.error))
+
+        due = self.storage.flush_due() if isinstance(self.storage, SegmentStorage) else None
+        if due is None:
+            pending = len(self.processed) + len(self.failed)
+            due = (pending >= settings.COMMIT_BATCH_SIZE
+                   or time.monotonic() - self.last_flush >= settings.COMMIT_INTERVAL_SECONDS)
+        if due:
+            self.flush()
+
+    def flush(self):
+        processed, self.processed = self.processed, []
+        content_hashes, self.content_hashes = self.content_hashes, {}
+        failed, self.failed = self.failed, []
+        dropped, self.dropped = self.dropped, []
+        copies, self.copies = self.copies, []
+        spooled, self.spooled = self.spooled, []
+        metadata, self.metadata = self.metadata, {}
+        self.last_flush = time.monotonic()
+
+        if copies:
+            try:
+                self.storage.flush()
+                self.repository.record_copies(copies, self.account)
+            except Exception as e:
+                # Only costs a retry some uploads it could have skipped.
+                logger.error(f"Could not record {len(copies)} stored copies: {e}")
+        if processed:
+            try:
+                # Uploads must be durable before they are recorded as done.
+                self.storage.flush()
+                if isinstance(self.storage, SegmentStorage):
+                    self._record_segments(processed)
+                if self.queued:
+                    # Should the commit below not happen, the next claim
+                    # commits these without uploading them again.
+                    self.repository.mark_work_uploaded(processed, content_hashes, self.account)
+                # Mark as processed
+                self.repository.mark_processed_many(processed, content_hashes, self.account)
+                self.counts["processed"] += len(processed)
+                MESSAGES.labels(self.account, "processed").inc(len(processed))
+                logger.info(f"Successfully processed {len(processed)} emails.")
+                if spooled:
+                    self.storage.discard_spooled(self.account, spooled)
+            except Exception as e:
+                failed.extend((gmail_id, str(e)) for gmail_id, _ in processed)
+            else:
+                self._save_metadata(metadata)
+        if failed:
+            self.repository.log_failures_many(failed, self.account)
+            self.counts["failed"] += len(failed)
+            MESSAGES.labels(self.account, "failed").inc(len(failed))
+        if dropped:
+            self.repository.remove_work(dropped, self.account)
+
+    def _save_metadata(self, metadata: Dict[str, Dict[str, Any]]):
+        if not metadata:
+            return
+        try:
+            self.repository.save_metadata_many(self.account, metadata)
+        except Exception as e:
+            # The emails are stored; they are only missing from search.
+            logger.error(f"Could not save metadata of {len(metadata)} emails: {e}")
+
+    def _record_segments(self, processed: List[Tuple[str, str]]):
+        index = []
+        for gmail_id, storage_key in processed:
+            location = parse_segment_key(storage_key)
+            if location is not None:
+                index.append((gmail_id, *location))
+        # Sealed by whichever batch flushed first; the storage may be shared.
+        self.repository.record_segments(
+            [tuple(segment) for segment in self.storage.take_sealed()], index, self.account
+        )
 
-logger = setup_logging()
 
 class EmailProcessor:
-    def __init__(self):
-        self.gmail_service = GmailService()
-        self.storage_service = StorageFactory.get_storage()
-        self.repository = Repository()
+    def __init__(self, gmail_service: Optional[GmailService] = None,
+                 storage_service: Optional[BaseStorage] = None,
+                 repository: Optional[Repository] = None,
+                 mailbox: Optional[Mailbox] = None):
+        self.mailbox = mailbox or Mailbox(name=DEFAULT_MAILBOX)
+        self.gmail_service = gmail_service or GmailService(self.mailbox)
+        self.storage_service = storage_service or StorageFactory.get_storage()
+        self.repository = repository or Repository()
+        if self.repository.id_cache is not None:
+            self.repository.id_cache.start_warming()
+
+        self._uploaded_hashes: Dict[str, str] = {}
+        self._uploaded_hashes_lock = threading.Lock()
+        # Set when a run stops listing early because of max_messages_per_run.
+        self._budget_exhausted = False
+        self._run_lock = threading.Lock()
+
+        self.async_storage: Optional[AsyncBaseStorage] = None
+        if settings.STORAGE_ASYNC_ENABLED:
+            self.async_storage = StorageFactory.get_async_storage()
+            self._event_loop = EventLoopThread()
 
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10),
-        retry=retry_if_exception_type((ClientError, IOError)),
+        retry=retry_if_exception(is_retryable_upload_error),
         reraise=True
     )
     def _upload_with_retry(self, content: bytes, filename: str) -> str:
         return self.storage_service.upload_email(content, filename)
 
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception(is_retryable_upload_error),
+        reraise=True
+    )
+    def _upload_stream_with_retry(self, make_stream: Callable[[], Iterator[bytes]], filename: str) -> str:
+        # Each attempt needs a fresh stream, hence the factory.
+        return self.storage_service.upload_stream(make_stream(), filename)
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception(is_retryable_upload_error),
+        reraise=True
+    )
+    async def _upload_async_with_retry(self, content: bytes, filename: str) -> str:
+        return await self.async_storage.upload_email(content, filename)
+
+    def _build_pipeline(self, download_concurrency: Optional[int] = None,
+                        upload_concurrency: Optional[int] = None) -> Pipeline:
+        # Read at call time, so settings changed at runtime take effect.
+        if download_concurrency is None:
+            download_concurrency = settings.DOWNLOAD_CONCURRENCY
+        if upload_concurrency is None:
+            upload_concurrency = settings.UPLOAD_CONCURRENCY
+        batch_size = settings.GMAIL_BATCH_SIZE
+        if batch_size > MAX_BATCH_SIZE:
+            # Larger batches are rejected by download_emails_batch.
+            logger.warning(f"GMAIL_BATCH_SIZE={batch_size} is over Gmail's limit; using {MAX_BATCH_SIZE}.")
+            batch_size = MAX_BATCH_SIZE
+        if self.async_storage is not None:
+            # Each worker hands a whole batch to the event loop; the async
+            # backend caps how many of those uploads are in flight overall.
+            upload = Stage("upload", self._upload_async, upload_concurrency,
+                           batch_size=settings.STORAGE_ASYNC_CONCURRENCY)
+        else:
+            upload = Stage("upload", self._upload, upload_concurrency)
+
+        stages = [
+            Stage("download", self._download, download_concurrency,
+                  batch_size=batch_size,
+                  batch_wait=settings.GMAIL_BATCH_WAIT_SECONDS),
+        ]
+        if settings.METADATA_ENABLED:
+            # Parsed before upload, which releases the message body.
+            stages.append(Stage("metadata", self._extract_metadata, settings.METADATA_WORKERS))
+        stages.append(upload)
+        return Pipeline(
+            stages=stages,
+            queue_size=settings.PIPELINE_QUEUE_SIZE,
+        )
+
+    def _unprocessed(self, page: List[Dict[str, Any]]) -> List[str]:
+        listed = [msg['id'] for msg in page]
+
+        # Idempotency check
+        pending = self.repository.filter_unprocessed(listed, self.mailbox.name)
+        skipped = len(listed) - len(pending)
+        MESSAGES.labels(self.mailbox.name, "listed").inc(len(listed))
+        if skipped:
+            MESSAGES.labels(self.mailbox.name, "skipped").inc(skipped)
+            logger.info(f"Skipping {skipped} already processed emails.")
+        return pending
+
+    def _pending(self, messages: Iterable[Dict[str, Any]], budgeted: bool = True) -> Iterator[WorkItem]:
+        """
+        Fetch stage: yields a work item for every listed message not yet processed.
+        Listed ids are checked against SQLite a page at a time, and unless
+        `budgeted` is False no more than the mailbox's max_messages_per_run
+        are yielded.
+        """
+        budget = self.mailbox.max_messages_per_run if budgeted else None
+        for page in _chunks(messages, settings.GMAIL_PAGE_SIZE):
+            for gmail_id in self._unprocessed(page):
+                if budget is not None:
+                    if budget <= 0:
+                        self._budget_exhausted = True
+                        logger.info(f"Mailbox {self.mailbox.name} reached its per-run budget, deferring the rest.")
+                        return
+                    budget -= 1
+                logger.info("Processing email %s...", gmail_id)
+                yield WorkItem(gmail_id)
+
+    def _claimed(self, messages: Iterable[Dict[str, Any]], owner: str,
+                 budgeted: bool = True) -> Iterator[WorkItem]:
+        """
+        Fetch stage backed by the work queue: each page of listed, unprocessed
+        messages is enqueued, and work items come from claims on the queue
+        leased to `owner`. Claims are not limited to what this run listed, so
+        entries left behind by a run that died, or enqueued by another
+        process, are picked up too. The budget caps claims only: the whole
+        listing is still enqueued, and what the budget defers waits in the
+        queue for the next run.
+        """
+        budget = self.mailbox.max_messages_per_run if budgeted else None
+        for page in _chunks(messages, settings.GMAIL_PAGE_SIZE):
+            pending = self._unprocessed(page)
+            self.repository.enqueue_work(self.mailbox.name, pending)
+            # Claim about as much as was just enqueued, so downloads start
+            # while the listing goes on.
+            budget = yield from self._claim(owner, len(pending), budget)
+        # Then whatever else the queue holds for this mailbox.
+        budget = yield from self._claim(owner, None, budget)
+        if budget is not None and budget <= 0:
+            logger.info(f"Mailbox {self.mailbox.name} reached its per-run budget, deferring the rest.")
+
+    def _claim(self, owner: str, wanted: Optional[int], budget: Optional[int]):
+        # Yields work items for up to `wanted` claimed entries (all there are
+        # when None) within `budget`, and returns the budget left.
+        while wanted is None or wanted > 0:
+            limit = settings.WORK_QUEUE_CLAIM_SIZE
+            if wanted is not None:
+                limit = min(limit, wanted)
+            if budget is not None:
+                if budget <= 0:
+                    break
+                limit = min(limit, budget)
+
+            claimed, exhausted = self.repository.claim_work(self.mailbox.name, owner, limit)
+            if exhausted:
+                logger.warning(f"Giving up on {len(exhausted)} queued emails claimed too often without finishing.")
+                self.repository.log_failures_many(
+                    [(gmail_id, "Work queue claims exhausted") for gmail_id in exhausted], self.mailbox.name
+                )
+            for entry in claimed:
+                item = WorkItem(entry.gmail_id)
+                if entry.state == "uploaded":
+                    # Uploaded by a worker that died before committing.
+                    item.storage_key = entry.storage_key
+                    item.content_hash = entry.content_hash
+                else:
+                    logger.info("Processing email %s...", entry.gmail_id)
+                yield item
+
+            if budget is not None:
+                budget -= len(claimed)
+            if wanted is not None:
+                wanted -= len(claimed) + len(exhausted)
+            if len(claimed) + len(exhausted) < limit:
+                break
+        return budget
+
+    def _admit(self, items: Iterable[WorkItem]) -> Iterator[WorkItem]:
+        # Counted out again by _OutcomeBatch.add once the item leaves the pipeline.
+        backlog = BACKLOG.labels(self.mailbox.name)
+        for item in items:
+            backlog.inc()
+            yield item
+
+    def _restore_copies(self, items: List[WorkItem]) -> List[WorkItem]:
+        """
+        Multi-destination storage only: attach the copies each message already
+        has and its spooled content, if any. Returns the items that still need
+        downloading from Gmail.
+        """
+        copies = self.repository.get_copies([item.gmail_id for item in items], self.mailbox.name)
+        to_download = []
+        for item in items:
+            item.copies = copies.get(item.gmail_id, {})
+            if set(item.copies) >= set(self.storage_service.destinations):
+                # Stored everywhere already; only the commit is missing.
+                item.storage_key = item.copies[self.storage_service.primary]
+                continue
+            content = self.storage_service.read_spooled(self.mailbox.name, item.gmail_id) if item.copies else None
+            if content:
+                item.content = content
+                item.spooled = True
+                continue
+            to_download.append(item)
+        return to_download
+
+    def _download(self, items: List[WorkItem]):
+        if isinstance(self.storage_service, CompositeStorage):
+            items = self._restore_copies(items)
+            if not items:
+                return
+        contents, errors = self.gmail_service.download_emails_batch([item.gmail_id for item in items])
+        for item in items:
+            if item.gmail_id in errors:
+                item.error = errors[item.gmail_id]
+                continue
+            content = contents.get(item.gmail_id)
+            if not content:
+                logger.warning("Empty content for %s, skipping.", item.gmail_id)
+                MESSAGES.labels(self.mailbox.name, "skipped").inc()
+                item.skipped = True
+                continue
+            item.content = content
+            MESSAGES.labels(self.mailbox.name, "downloaded").inc()
+
+    def _extract_metadata(self, item: WorkItem):
+        try:
+            item.metadata = extract_metadata(item.content)
+        except Exception as e:
+            # A malformed message is still archived, just not searchable.
+            logger.warning("Could not extract metadata of %s: %s", item.gmail_id, e)
+
+    def _filename(self, item: WorkItem) -> str:
+        # Construct filename/key. Deduplicated content is named by its hash
+        # so every message with the same body shares one object, across
+        # mailboxes too; otherwise non-default mailboxes get their own prefix.
+        extension = EXTENSIONS[settings.STORAGE_COMPRESSION]
+        if item.content_hash:
+            return f"{item.content_hash}.eml{extension}"
+        if self.mailbox.name != DEFAULT_MAILBOX:
+            return f"{self.mailbox.name}/{item.gmail_id}.eml{extension}"
+        return f"{item.gmail_id}.eml{extension}"
+
+    def _deduplicate(self, item: WorkItem) -> bool:
+        """
+        Hash the message and reuse an existing upload of identical content.
+        Returns True when the item needs no upload of its own.
+        """
+        if not settings.STORAGE_DEDUPE_ENABLED:
+            return False
+        item.content_hash = hashlib.sha256(item.content).hexdigest()
+        with self._uploaded_hashes_lock:
+            storage_key = self._uploaded_hashes.get(item.content_hash)
+        if storage_key is None:
+            storage_key = self.repository.find_storage_key_by_hash(item.content_hash)
+        if storage_key is None:
+            return False
+        logger.info("Content of %s already stored at %s, skipping upload.", item.gmail_id, storage_key)
+        MESSAGES.labels(self.mailbox.name, "deduplicated").inc()
+        item.storage_key = storage_key
+        item.content = None
+        return True
+
+    def _stored(self, item: WorkItem, storage_key: str):
+        item.storage_key = storage_key
+        MESSAGES.labels(self.mailbox.name, "uploaded").inc()
+        # Release the message body as soon as it is stored.
+        item.content = None
+        if item.content_hash:
+            with self._uploaded_hashes_lock:
+                self._uploaded_hashes[item.content_hash] = storage_key
+
+    def _upload_fanout(self, item: WorkItem):
+        storage = self.storage_service
+        codec = settings.STORAGE_COMPRESSION
+        data = item.content
+        if codec != "none":
+            data = b"".join(compress_stream(item.content, codec, settings.STORAGE_COMPRESSION_LEVEL))
+        missing = [name for name in storage.destinations if name not in item.copies]
+        try:
+            item.copies.update(storage.upload_email_to(data, self._filename(item), missing))
+        except PartialUploadError as e:
+            item.copies.update(e.stored)
+            if e.stored and not item.spooled:
+                # The retry uploads to the missing destinations from here.
+                storage.spool(self.mailbox.name, item.gmail_id, item.content)
+                item.spooled = True
+            raise
+        self._stored(item, item.copies[storage.primary])
+
+    def _upload(self, item: WorkItem):
+        if self._deduplicate(item):
+            return
+        if isinstance(self.storage_service, CompositeStorage):
+            self._upload_fanout(item)
+            return
+
+        # Upload to storage (with retry)
+        codec = settings.STORAGE_COMPRESSION
+        if codec == "none":
+            storage_key = self._upload_with_retry(item.content, self._filename(item))
+        else:
+            content = item.content
+            storage_key = self._upload_stream_with_retry(
+                lambda: compress_stream(content, codec, settings.STORAGE_COMPRESSION_LEVEL),
+                self._filename(item),
+            )
+        self._stored(item, storage_key)
+
+    def _upload_async(self, items: List[WorkItem]):
+        codec = settings.STORAGE_COMPRESSION
+        uploads = [item for item in items if not self._deduplicate(item)]
+
+        async def upload_batch():
+            return await asyncio.gather(
+                *(self._upload_async_with_retry(
+                    b"".join(compress_stream(item.content, codec, settings.STORAGE_COMPRESSION_LEVEL)),
+                    self._filename(item),
+                ) for item in uploads),
+                return_exceptions=True,
+            )
+
+        for item, result in zip(uploads, self._event_loop.run(upload_batch())):
+            if isinstance(result, BaseException):
+                item.error = str(result)
+            else:
+                self._stored(item, result)
+
+    def _run(self, messages: Iterable[Dict[str, Any]], budgeted: bool = True,
+             counts: Optional[Dict[str, int]] = None, queued: bool = False):
+        # Content uploaded during this run but not yet committed to SQLite.
+        self._uploaded_hashes.clear()
+        outcomes = _OutcomeBatch(self.repository, self.storage_service, self.mailbox.name,
+                                 counts=counts, queued=queued)
+        if queued:
+            owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+            source = self._claimed(messages, owner, budgeted)
+        else:
+            source = self._pending(messages, budgeted)
+        try:
+            for item in self._build_pipeline().run(self._admit(source)):
+                outcomes.add(item)
+        finally:
+            # Whatever finished before a listing failure is still recorded.
+            outcomes.flush()
+            if queued:
+                self._settle_queue(owner)
+
+    def _settle_queue(self, owner: str):
+        try:
+            self.repository.release_work(owner)
+            self.repository.purge_committed_work(
+                self.mailbox.name,
+                datetime.utcnow() - timedelta(minutes=settings.WORK_QUEUE_RETENTION_MINUTES),
+            )
+            for state in ("pending", "downloading", "uploaded", "committed"):
+                WORK_QUEUE.labels(self.mailbox.name, state).set(0)
+            for (_, state), count in self.repository.work_queue_depth(self.mailbox.name).items():
+                WORK_QUEUE.labels(self.mailbox.name, state).set(count)
+        except Exception as e:
+            # Unreleased leases simply run out.
+            logger.error(f"Could not settle the work queue of {self.mailbox.name}: {e}")
+
+    def drain_queue(self) -> Dict[str, int]:
+        """
+        Process whatever the work queue holds for this mailbox without listing
+        anything, e.g. from an extra worker process. Returns the
+        processed/failed counts.
+        """
+        counts: Dict[str, int] = {}
+        with self._run_lock:
+            self._run([], budgeted=False, counts=counts, queued=True)
+        return counts
+
+    def process_range(self, start: datetime, end: datetime,
+                      counts: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """
+        Ingest every email received between `start` and `end`, ignoring the
+        per-run budget and leaving the history checkpoint alone, so it can
+        run alongside the scheduled jobs. Returns the processed/failed
+        counts, which are also kept up to date in `counts` while it runs.
+        """
+        counts = counts if counts is not None else {}
+        self._run(self.gmail_service.fetch_range(start, end), budgeted=False, counts=counts)
+        return counts
+
+    def retry_failed(self, gmail_ids: List[str]):
+        """
+        Re-run the pipeline over failed emails of this mailbox, on the smaller
+        RETRY_* worker pools so retries never starve regular ingestion.
+        Outcomes are recorded as usual: successes leave the failed table,
+        failures get their next attempt pushed back.
+        """
+        pending = self.repository.filter_unprocessed(gmail_ids, self.mailbox.name)
+        # Already handled by a regular run since they failed.
+        self.repository.clear_failures(list(set(gmail_ids) - set(pending)), self.mailbox.name)
+        if not pending:
+            return
+
+        logger.info(f"Retrying {len(pending)} failed emails for {self.mailbox.name}...")
+        outcomes = _OutcomeBatch(self.repository, self.storage_service, self.mailbox.name, retrying=True)
+        pipeline = self._build_pipeline(settings.RETRY_DOWNLOAD_CONCURRENCY, settings.RETRY_UPLOAD_CONCURRENCY)
+        try:
+            for item in pipeline.run(self._admit(WorkItem(gmail_id) for gmail_id in pending)):
+                outcomes.add(item)
+        finally:
+            outcomes.flush()
+
+    def _sync_history(self) -> bool:
+        """
+        Process only the messages added since the last successful sync.
+        Returns False when there is no usable checkpoint and a full window
+        scan is needed instead.
+        """
+        start_history_id = self.repository.get_history_checkpoint(self.mailbox.name)
+        if not start_history_id:
+            logger.info("No history checkpoint found, falling back to window scan.")
+            return False
+
+        try:
+            self._run(self.gmail_service.fetch_history(start_history_id), queued=settings.WORK_QUEUE_ENABLED)
+        except HistoryExpiredError as e:
+            logger.warning(f"{e}, falling back to window scan.")
+            return False
+        return True
+
     def process_emails(self):
-        logger.info("Starting email processing job...")
-        
+        # Push-triggered and interval runs of a mailbox take turns.
+        with self._run_lock:
+            self._process_emails()
+
+    def _process_emails(self):
+        logger.info(f"Starting email processing job for {self.mailbox.name}...")
+
         try:
-            # Fetch emails from the last X minutes
-            messages = self.gmail_service.fetch_emails(minutes=settings.SCHEDULE_INTERVAL_MINUTES)
-            
-            for msg in messages:
-                gmail_id = msg['id']
-                
-                # Idempotency check
-                if self.repository.is_processed(gmail_id):
-                    logger.info(f"Skipping {gmail_id} - already processed.")
-                    continue
-
-                logger.info(f"Processing email {gmail_id}...")
-                
-                try:
-                    # Download content
-                    content = self.gmail_service.download_email_content(gmail_id)
-                    if not content:
-                        logger.warning(f"Empty content for {gmail_id}, skipping.")
-                        continue
-
-                    # Construct filename/key
-                    filename = f"{gmail_id}.eml"
-                    
-                    # Upload to storage (with retry)
-                    storage_key = self._upload_with_retry(content, filename)
-                    
-                    # Mark as processed
-                    self.repository.mark_processed(gmail_id, storage_key)
-                    logger.info(f"Successfully processed {gmail_id}")
-                    
-                except Exception as e:
-                    logger.error(f"Failed to process {gmail_id}: {e}")
-                    self.repository.log_failure(gmail_id, str(e))
-        
+            self._budget_exhausted = False
+            next_checkpoint = None
+            if settings.SYNC_MODE == "history":
+                # Captured before listing, so anything arriving mid-run is
+                # picked up (and deduplicated) by the next run.
+                next_checkpoint = self.gmail_service.get_history_id()
+
+            if next_checkpoint is None or not self._sync_history():
+                # Fetch emails from the last X minutes
+                self._run(self.gmail_service.fetch_emails(minutes=settings.SCHEDULE_INTERVAL_MINUTES),
+                          queued=settings.WORK_QUEUE_ENABLED)
+
+            # Only advance once the whole delta has been handled (or queued);
+            # a run cut short by its budget re-lists the same delta next time.
+            if next_checkpoint is not None and not self._budget_exhausted:
+                self.repository.save_history_checkpoint(next_checkpoint, self.mailbox.name)
+            LAST_SUCCESS.labels("ingest", self.mailbox.name).set_to_current_time()
+
         except Exception as e:
-            logger.critical(f"Critical failure in process_emails: {e}")
-        
-        logger.info("Email processing job finished.")
+            logger.critical(f"Critical failure in process_emails for {self.mailbox.name}: {e}")
+
+        logger.info(f"Email processing job for {self.mailbox.name} finished.")
@@ -0,0 +1,212 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's input. Each worker consumes exactly one.
+_DONE = object()
+
+# How often blocked workers wake up to check whether the run was cancelled.
+_POLL_SECONDS = 0.1
+
+
+class WorkItem:
+    """State carried through the pipeline for a single Gmail message."""
+
+    __slots__ = ("gmail_id", "content", "content_hash", "storage_key", "error", "skipped", "timings",
+                 "copies", "spooled", "metadata")
+
+    def __init__(self, gmail_id: str):
+        self.gmail_id = gmail_id
+        self.content: Optional[bytes] = None
+        self.content_hash: Optional[str] = None
+        self.storage_key: Optional[str] = None
+        self.error: Optional[str] = None
+        self.skipped = False
+        # Seconds spent in each stage, keyed by stage name ("source" for the feed).
+        self.timings: Dict[str, float] = {}
+        # With several storage destinations: storage key per destination
+        # holding the message, and whether its content came from the spool.
+        self.copies: Dict[str, str] = {}
+        self.spooled = False
+        # Searchable header fields, when METADATA_ENABLED.
+        self.metadata: Optional[Dict[str, Any]] = None
+
+    @property
+    def done(self) -> bool:
+        """
+        True once the item failed, was skipped or is already stored; later
+        stages pass it through.
+        """
+        return self.error is not None or self.skipped or self.storage_key is not None
+
+
+class Stage:
+    """
+    A pipeline step run by `workers` threads.
+
+    With the default `batch_size` of 1, `func` receives one WorkItem at a time.
+    With a larger `batch_size`, `func` receives a list of up to that many items:
+    a worker blocks for the first item and then waits at most `batch_wait`
+    seconds for the batch to fill, so a trickle of work is never held back for
+    long.
+    """
+
+    def __init__(self, name: str, func: Callable[[Any], None], workers: int,
+                 batch_size: int = 1, batch_wait: float = 0.0):
+        if workers < 1:
+            raise ValueError(f"Stage {name} needs at least one worker, got {workers}")
+        if batch_size < 1:
+            raise ValueError(f"Stage {name} needs a batch size of at least one, got {batch_size}")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+
+
+class Pipeline:
+    """
+    Runs work items through a chain of stages, each backed by its own pool of
+    worker threads. Stages are connected by bounded queues so a slow stage
+    applies backpressure all the way back to the source.
+
+    An exception raised by a stage function is recorded on the item (``error``)
+    rather than aborting the run, so failures stay scoped to a single message.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 100):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = queue_size
+
+    def run(self, source: Iterable[WorkItem]) -> Iterator[WorkItem]:
+        """
+        Feed `source` through every stage and yield items as they complete.
+
+        The source is consumed on a background thread, so it may itself block
+        (e.g. while listing messages) without stalling downstream stages.
+        Completion order is not guaranteed to match source order.
+        """
+        stop = threading.Event()
+        inboxes = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        outbox: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        remaining = [stage.workers for stage in self.stages]
+        remaining_lock = threading.Lock()
+        source_error: List[BaseException] = []
+
+        def put(q: queue.Queue, item) -> bool:
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=_POLL_SECONDS)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(q: queue.Queue):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    continue
+            return _DONE
+
+        def close_stage(index: int):
+            # The last worker out signals every worker of the next stage.
+            with remaining_lock:
+                remaining[index] -= 1
+                last = remaining[index] == 0
+            if not last:
+                return
+            if index + 1 < len(self.stages):
+                for _ in range(self.stages[index + 1].workers):
+                    put(inboxes[index + 1], _DONE)
+            else:
+                put(outbox, _DONE)
+
+        def feed():
+            try:
+                started = time.perf_counter()
+                for item in source:
+                    item.timings["source"] = time.perf_counter() - started
+                    if not put(inboxes[0], item):
+                        return
+                    started = time.perf_counter()
+            except BaseException as e:
+                source_error.append(e)
+            finally:
+                for _ in range(self.stages[0].workers):
+                    put(inboxes[0], _DONE)
+
+        def take(q: queue.Queue, limit: int, wait: float):
+            # Blocks for the first item, then collects up to `limit` items for at
+            # most `wait` seconds. Returns the batch and whether the end-of-input
+            # marker was reached.
+            first = get(q)
+            if first is _DONE:
+                return [], True
+            batch = [first]
+            deadline = time.monotonic() + wait
+            while len(batch) < limit:
+                try:
+                    item = q.get(timeout=max(deadline - time.monotonic(), 0)) if wait else q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    return batch, True
+                batch.append(item)
+            return batch, False
+
+        def work(index: int):
+            stage = self.stages[index]
+            target = inboxes[index + 1] if index + 1 < len(self.stages) else outbox
+            finished = False
+            while not finished:
+                batch, finished = take(inboxes[index], stage.batch_size, stage.batch_wait)
+                pending = [item for item in batch if not item.done]
+                if pending:
+                    started = time.perf_counter()
+                    try:
+                        stage.func(pending if stage.batch_size > 1 else pending[0])
+                    except Exception as e:
+                        for item in pending:
+                            if not item.done:
+                                item.error = str(e)
+                    # A batch's duration counts against every item in it.
+                    elapsed = time.perf_counter() - started
+                    for item in pending:
+                        item.timings[stage.name] = elapsed
+                for item in batch:
+                    if not put(target, item):
+                        finished = True
+                        break
+            close_stage(index)
+
+        threads = [threading.Thread(target=feed, name="pipeline-source", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=work, args=(index,), name=f"pipeline-{stage.name}-{n}", daemon=True
+                ))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = get(outbox)
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            # Unblocks every worker if the caller stopped consuming early.
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        if source_error:
+            raise source_error[0]
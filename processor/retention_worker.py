@@ -0,0 +1,145 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from config.settings import settings
+from config.metrics import DATABASE_BYTES, LAST_SUCCESS, PRUNED
+from persistence.repository import Repository
+
+logger = logging.getLogger(__name__)
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class RetentionWorker:
+    """
+    Keeps the metadata database from growing without bound. Each run deletes
+    processed ids that no fetch can list again (see `cutoff`), the stored
+    copies recorded with them and failed emails that used up their retries
+    more than RETENTION_FAILED_DAYS ago. Rows go RETENTION_BATCH_SIZE per
+    transaction with a pause in between, so ingestion commits are never held
+    up for long; the freed pages are then returned to the filesystem the
+    same way with incremental vacuum.
+
+    Archive indexes (email_metadata, segments, segment_index) are kept: they
+    locate and describe stored emails rather than guard against duplicates.
+    """
+
+    def __init__(self, repository: Repository):
+        self.repository = repository
+        self._warned_vacuum = False
+
+    @staticmethod
+    def margin() -> timedelta:
+        return timedelta(minutes=settings.SCHEDULE_INTERVAL_MINUTES) * settings.RETENTION_MIN_INTERVALS
+
+    def horizon(self) -> timedelta:
+        """
+        How long processed ids are kept: RETENTION_DAYS, and never less than
+        RETENTION_MIN_INTERVALS schedule intervals.
+        """
+        return max(timedelta(days=settings.RETENTION_DAYS), self.margin())
+
+    def cutoff(self, now: datetime) -> datetime:
+        """
+        Processed ids recorded before this can go. A window scan only lists
+        the last SCHEDULE_INTERVAL_MINUTES and a history sync what arrived
+        since its checkpoint was saved, so the cutoff stays the interval
+        margin behind the oldest checkpoint of any mailbox.
+        """
+        cutoff = now - self.horizon()
+        floor = self.repository.retention_floor()
+        if floor is not None:
+            cutoff = min(cutoff, floor - self.margin())
+        return cutoff
+
+    def _running_backfills(self, now: datetime) -> List[str]:
+        """
+        Mailboxes whose backfill registered or finished a partition within
+        the interval margin. Pending partitions older than that belong to a
+        backfill that crashed or was abandoned, and do not hold up pruning.
+        """
+        running = []
+        for account, updated_at in self.repository.pending_backfills().items():
+            if updated_at >= now - self.margin():
+                running.append(account)
+            else:
+                logger.warning(
+                    f"The backfill of {account} has pending partitions but no progress since "
+                    f"{updated_at:%Y-%m-%d %H:%M} UTC; pruning processed ids regardless. Re-run backfill.py "
+                    f"with the same range to finish it, or `python backfill.py --cancel --mailbox {account}` "
+                    f"to drop it."
+                )
+        return running
+
+    def _prune(self, table: str, delete_batch: Callable[[datetime, int], int], before: datetime) -> int:
+        total = 0
+        while True:
+            deleted = delete_batch(before, settings.RETENTION_BATCH_SIZE)
+            total += deleted
+            PRUNED.labels(table).inc(deleted)
+            if deleted < settings.RETENTION_BATCH_SIZE:
+                return total
+            time.sleep(settings.RETENTION_BATCH_PAUSE_SECONDS)
+
+    def _vacuum(self) -> Optional[int]:
+        """
+        Return free pages to the filesystem in small steps. Returns the number
+        of pages freed, None when the database is not in incremental mode.
+        """
+        pages = self.repository.database_pages()
+        if pages["auto_vacuum"] != AUTO_VACUUM_INCREMENTAL:
+            if not self._warned_vacuum and pages["freelist_count"]:
+                self._warned_vacuum = True
+                logger.warning(
+                    f"{pages['freelist_count']} free pages stay in the database file: it predates "
+                    f"incremental auto-vacuum. Run `python retention.py --vacuum` once, with ingestion stopped."
+                )
+            return None
+        free = start = pages["freelist_count"]
+        while free:
+            free = self.repository.incremental_vacuum(settings.RETENTION_VACUUM_STEP_SECONDS)
+            if free:
+                time.sleep(settings.RETENTION_BATCH_PAUSE_SECONDS)
+        return start
+
+    def _report_size(self):
+        pages = self.repository.database_pages()
+        DATABASE_BYTES.labels("used").set((pages["page_count"] - pages["freelist_count"]) * pages["page_size"])
+        DATABASE_BYTES.labels("free").set(pages["freelist_count"] * pages["page_size"])
+
+    def run(self) -> Dict[str, int]:
+        logger.info("Starting retention job...")
+        pruned: Dict[str, int] = {}
+        try:
+            now = datetime.utcnow()
+            cutoff = self.cutoff(now)
+            running = self._running_backfills(now)
+            if running:
+                logger.info(f"A backfill of {', '.join(running)} is in progress; processed ids are kept "
+                            f"until it completes.")
+            else:
+                pruned["processed_emails"] = self._prune(
+                    "processed_emails", self.repository.prune_processed, cutoff
+                )
+                if pruned["processed_emails"] and self.repository.id_cache is not None:
+                    self.repository.id_cache.rebuild()
+            pruned["stored_copies"] = self._prune("stored_copies", self.repository.prune_copies, cutoff)
+            pruned["failed_emails"] = self._prune(
+                "failed_emails", self.repository.prune_failures,
+                now - timedelta(days=settings.RETENTION_FAILED_DAYS),
+            )
+            vacuumed = self._vacuum()
+            if vacuumed:
+                logger.info(f"Returned {vacuumed} free pages to the filesystem.")
+            if any(pruned.values()) and settings.SQLITE_JOURNAL_MODE.upper() == "WAL":
+                self.repository.checkpoint_wal()
+            self._report_size()
+            LAST_SUCCESS.labels("retention", "all").set_to_current_time()
+        except Exception as e:
+            logger.critical(f"Critical failure in retention job: {e}")
+
+        summary = ", ".join(f"{count} from {table}" for table, count in pruned.items())
+        logger.info(f"Retention job finished, pruned {summary or 'nothing'}.")
+        return pruned
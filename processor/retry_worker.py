@@ -0,0 +1,59 @@
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import List, Dict
+
+from config.settings import settings
+from config.metrics import LAST_SUCCESS, RETRY_BACKLOG
+from persistence.repository import Repository
+from processor.email_processor import EmailProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class RetryWorker:
+    """
+    Drains the failed_emails dead-letter table. Each run pages through the
+    emails whose backoff has elapsed, RETRY_BATCH_SIZE at a time and at most
+    RETRY_MAX_PER_RUN in total, and hands them to the processor of the
+    mailbox they came from.
+    """
+
+    def __init__(self, processors: List[EmailProcessor], repository: Repository):
+        self.processors: Dict[str, EmailProcessor] = {
+            processor.mailbox.name: processor for processor in processors
+        }
+        self.repository = repository
+
+    def run(self):
+        logger.info("Starting dead-letter retry job...")
+        retried = 0
+        try:
+            # Fixed for the whole run, so failures rescheduled by this run
+            # are not picked up again until a later one.
+            now = datetime.utcnow()
+            after = None
+            while retried < settings.RETRY_MAX_PER_RUN:
+                due = self.repository.get_due_failures(
+                    min(settings.RETRY_BATCH_SIZE, settings.RETRY_MAX_PER_RUN - retried),
+                    now=now,
+                    accounts=list(self.processors),
+                    after=after,
+                )
+                if not due:
+                    break
+                after = (due[-1].next_attempt_at, due[-1].account, due[-1].gmail_id)
+
+                by_account: Dict[str, List[str]] = defaultdict(list)
+                for failed in due:
+                    by_account[failed.account].append(failed.gmail_id)
+                for account, gmail_ids in by_account.items():
+                    self.processors[account].retry_failed(gmail_ids)
+                retried += len(due)
+
+            RETRY_BACKLOG.set(self.repository.count_retryable_failures())
+            LAST_SUCCESS.labels("retry", "all").set_to_current_time()
+        except Exception as e:
+            logger.critical(f"Critical failure in dead-letter retry job: {e}")
+
+        logger.info(f"Dead-letter retry job finished, {retried} emails retried.")
@@ -0,0 +1,89 @@
+"""
+Extra worker process for the SQLite work queue.
+
+The scheduler enqueues every listed message before processing it (see
+WORK_QUEUE_ENABLED); this drains the same queue from another process, so
+mailboxes with a large backlog can be worked on by several processes sharing
+one metadata database. Claims are leased, so a worker that dies only delays
+its entries by WORK_QUEUE_LEASE_SECONDS.
+
+Usage (from the repository root):
+    python queue_worker.py [--mailbox NAME] [--interval 30] [--once]
+    python queue_worker.py --status
+"""
+import argparse
+import logging
+import time
+
+from config.settings import settings
+from config.logging_config import setup_logging
+from config.mailboxes import load_mailboxes, assigned_mailboxes
+from config.metrics import start_metrics_server
+from persistence.repository import Repository
+from processor.email_processor import EmailProcessor
+from storage.factory import StorageFactory
+
+logger = logging.getLogger(__name__)
+
+STATES = ("pending", "downloading", "uploaded", "committed")
+
+
+def print_status(repository: Repository):
+    depth = repository.work_queue_depth()
+    accounts = sorted({account for account, _ in depth})
+    print(f"{'mailbox':<24}" + "".join(f"{state:>12}" for state in STATES))
+    for account in accounts:
+        print(f"{account:<24}" + "".join(f"{depth.get((account, state), 0):>12}" for state in STATES))
+
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Drain the SQLite work queue.")
+    parser.add_argument("--mailbox", action="append", default=None,
+                        help="Mailbox to work on (repeatable; default: every mailbox of this shard)")
+    parser.add_argument("--interval", type=float, default=30.0,
+                        help="Seconds to wait after a pass that found nothing to do")
+    parser.add_argument("--once", action="store_true", help="Drain once and exit")
+    parser.add_argument("--status", action="store_true", help="Print the queue depth per state and exit")
+    parser.add_argument("--metrics-port", type=int, default=settings.METRICS_PORT + 2,
+                        help="Metrics port (default: METRICS_PORT + 2, next to main.py and backfill.py)")
+    args = parser.parse_args()
+
+    repository = Repository()
+    if args.status:
+        print_status(repository)
+        return
+
+    mailboxes = assigned_mailboxes(load_mailboxes())
+    if args.mailbox:
+        unknown = set(args.mailbox) - {mailbox.name for mailbox in mailboxes}
+        if unknown:
+            parser.error(f"Unknown mailbox(es) for this shard: {', '.join(sorted(unknown))}")
+        mailboxes = [mailbox for mailbox in mailboxes if mailbox.name in args.mailbox]
+
+    start_metrics_server(args.metrics_port)
+    storage_service = StorageFactory.get_storage()
+    processors = [
+        EmailProcessor(storage_service=storage_service, repository=repository, mailbox=mailbox)
+        for mailbox in mailboxes
+    ]
+    try:
+        while True:
+            handled = 0
+            for processor in processors:
+                try:
+                    counts = processor.drain_queue()
+                except Exception as e:
+                    logger.error(f"Draining the queue of {processor.mailbox.name} failed: {e}")
+                    continue
+                handled += counts["processed"] + counts["failed"]
+            if args.once:
+                return
+            if not handled:
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        logger.info("Queue worker stopped.")
+
+
+if __name__ == "__main__":
+    main()
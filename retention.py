@@ -0,0 +1,54 @@
+"""
+Run the retention job by hand, or convert an existing metadata database to
+incremental auto-vacuum.
+
+The scheduler prunes on its own every RETENTION_INTERVAL_MINUTES when
+RETENTION_ENABLED is set. Databases created before SQLITE_AUTO_VACUUM keep
+the pages freed by pruning inside the file until converted once with
+--vacuum, a full rebuild that locks the database: stop ingestion first.
+
+Usage (from the repository root):
+    python retention.py [--dry-run]
+    python retention.py --vacuum
+"""
+import argparse
+from datetime import datetime
+
+from config.logging_config import setup_logging
+from persistence.repository import Repository
+from processor.retention_worker import RetentionWorker
+
+
+def print_pages(repository: Repository):
+    pages = repository.database_pages()
+    mode = {0: "none", 1: "full", 2: "incremental"}.get(pages["auto_vacuum"], pages["auto_vacuum"])
+    print(f"database: {pages['page_count'] * pages['page_size'] / 1024 ** 2:.1f} MiB, "
+          f"{pages['freelist_count'] * pages['page_size'] / 1024 ** 2:.1f} MiB free, auto_vacuum={mode}")
+
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Prune expired processed ids from the metadata database.")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the cutoff and database size")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="Rebuild the database with incremental auto-vacuum (stop ingestion first)")
+    args = parser.parse_args()
+
+    repository = Repository()
+    if args.vacuum:
+        print_pages(repository)
+        repository.vacuum()
+        print_pages(repository)
+        return
+
+    worker = RetentionWorker(repository)
+    cutoff = worker.cutoff(datetime.utcnow())
+    print(f"horizon: {worker.horizon()}, pruning processed ids recorded before {cutoff:%Y-%m-%d %H:%M} UTC")
+    if not args.dry_run:
+        for table, count in worker.run().items():
+            print(f"{table}: {count} rows pruned")
+    print_pages(repository)
+
+
+if __name__ == "__main__":
+    main()
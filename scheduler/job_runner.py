@@ -1,40 +1,125 @@
+from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from datetime import datetime, timedelta
+from typing import List, Optional
+import logging
 
 from config.settings import settings
-from config.logging_config import setup_logging
+from config.mailboxes import Mailbox, load_mailboxes, assigned_mailboxes
+from persistence.repository import Repository
 from processor.email_processor import EmailProcessor
+from processor.retention_worker import RetentionWorker
+from processor.retry_worker import RetryWorker
+from scheduler.push import PushCoordinator
+from storage.factory import StorageFactory
 
-logger = setup_logging()
+logger = logging.getLogger(__name__)
 
 class JobRunner:
     def __init__(self):
-        self.scheduler = BlockingScheduler()
-        self.processor = EmailProcessor()
+        # Mailbox jobs run side by side on a shared pool of MAILBOX_WORKERS threads;
+        # the dead-letter retry and retention jobs have their own threads so
+        # they never delay them.
+        self.scheduler = BlockingScheduler(
+            executors={
+                'default': ThreadPoolExecutor(max_workers=settings.MAILBOX_WORKERS),
+                'retry': ThreadPoolExecutor(max_workers=1),
+                'retention': ThreadPoolExecutor(max_workers=1),
+            }
+        )
+        self.mailboxes: List[Mailbox] = assigned_mailboxes(load_mailboxes())
+
+        # One storage client and one database (with its id cache) serve every mailbox.
+        storage_service = StorageFactory.get_storage()
+        repository = Repository()
+        self.processors = [
+            EmailProcessor(storage_service=storage_service, repository=repository, mailbox=mailbox)
+            for mailbox in self.mailboxes
+        ]
+        self.retry_worker = RetryWorker(self.processors, repository)
+        self.retention_worker = RetentionWorker(repository)
+        self.push: Optional[PushCoordinator] = None
+        if settings.PUSH_ENABLED:
+            self.push = PushCoordinator(self.scheduler, self.processors)
 
     def start(self):
         logger.info("Initializing APScheduler...")
-        
-        # Schedule the job
-        self.scheduler.add_job(
-            func=self.processor.process_emails,
-            trigger=IntervalTrigger(minutes=settings.SCHEDULE_INTERVAL_MINUTES),
-            id='email_processing_job',
-            name='Process new emails from Gmail',
-            replace_existing=True,
-            coalesce=True,
-            max_instances=1
+
+        if not self.processors:
+            logger.warning(
+                f"Shard {settings.SHARD_INDEX}/{settings.SHARD_COUNT} owns no mailboxes; nothing to schedule."
+            )
+
+        # Stagger mailboxes evenly across the interval instead of firing them
+        # all at once; a single mailbox still first runs one interval from now.
+        now = datetime.now()
+        stagger = timedelta(minutes=settings.SCHEDULE_INTERVAL_MINUTES) / max(len(self.processors), 1)
+        for position, processor in enumerate(self.processors):
+            # Schedule the job
+            self.scheduler.add_job(
+                # In push mode the interval run is only a fallback.
+                func=self.push.poll if self.push else processor.process_emails,
+                args=[processor] if self.push else None,
+                trigger=IntervalTrigger(
+                    minutes=settings.SCHEDULE_INTERVAL_MINUTES,
+                    start_date=now + stagger * (position + 1),
+                ),
+                id=f'email_processing_job:{processor.mailbox.name}',
+                name=f'Process new emails from Gmail ({processor.mailbox.name})',
+                replace_existing=True,
+                coalesce=True,
+                max_instances=1
+            )
+
+        logger.info(
+            f"{len(self.processors)} mailbox job(s) scheduled to run every "
+            f"{settings.SCHEDULE_INTERVAL_MINUTES} minutes on {settings.MAILBOX_WORKERS} workers."
         )
-        
-        logger.info(f"Job scheduled to run every {settings.SCHEDULE_INTERVAL_MINUTES} minutes.")
-        
+
+        if settings.RETRY_ENABLED and self.processors:
+            self.scheduler.add_job(
+                func=self.retry_worker.run,
+                trigger=IntervalTrigger(minutes=settings.RETRY_INTERVAL_MINUTES),
+                id='dead_letter_retry_job',
+                name='Retry failed emails',
+                executor='retry',
+                replace_existing=True,
+                coalesce=True,
+                max_instances=1
+            )
+            logger.info(f"Dead-letter retry job scheduled to run every {settings.RETRY_INTERVAL_MINUTES} minutes.")
+
+        if settings.RETENTION_ENABLED:
+            self.scheduler.add_job(
+                func=self.retention_worker.run,
+                trigger=IntervalTrigger(minutes=settings.RETENTION_INTERVAL_MINUTES),
+                id='retention_job',
+                name='Prune expired processed ids',
+                executor='retention',
+                replace_existing=True,
+                coalesce=True,
+                max_instances=1
+            )
+            logger.info(
+                f"Retention job scheduled to run every {settings.RETENTION_INTERVAL_MINUTES} minutes, "
+                f"keeping processed ids for {self.retention_worker.horizon()}."
+            )
+
         try:
-            # Run the processor once immediately on startup? 
+            # Run the processor once immediately on startup?
             # The user didn't explicitly ask for immediate run but it's good practice for testing.
             # However, APScheduler interval trigger waits for first interval by default.
             # We will stick to the schedule.
-            
+
+            if self.push:
+                self.push.start()
+                logger.info(f"Push mode enabled ({settings.PUSH_SOURCE}); polling only as a fallback.")
+
             logger.info("Starting scheduler...")
             self.scheduler.start()
         except (KeyboardInterrupt, SystemExit):
             logger.info("Scheduler stopped.")
+        finally:
+            if self.push:
+                self.push.stop()
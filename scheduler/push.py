@@ -0,0 +1,161 @@
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from apscheduler.schedulers.base import BaseScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+
+from config.settings import settings
+from email_service.notifications import (
+    LocalNotificationSource, NotificationSource, get_notification_source,
+)
+from processor.email_processor import EmailProcessor
+
+logger = logging.getLogger(__name__)
+
+# Long-poll timeout of each pull from the notification source.
+PULL_TIMEOUT_SECONDS = 30.0
+# Without a successful pull for this long the subscription counts as down
+# and mailboxes go back to interval polling.
+PULL_HEALTH_SECONDS = 3 * PULL_TIMEOUT_SECONDS
+# A watch this close to expiring no longer counts as active.
+WATCH_EXPIRY_MARGIN_SECONDS = 300
+MAX_PULL_BACKOFF_SECONDS = 60.0
+
+
+class PushCoordinator:
+    """
+    Push mode: keeps a Gmail watch on every mailbox and syncs a mailbox as
+    soon as a notification for it arrives, instead of waiting for the next
+    interval.
+
+    Notifications are coalesced per mailbox: however many arrive while a
+    sync is scheduled (PUSH_DEBOUNCE_SECONDS out), they trigger that one
+    sync; one arriving during a sync schedules exactly one more. The interval
+    jobs go through `poll`, which only syncs while a mailbox's watch or the
+    subscription is down, plus once every PUSH_SAFETY_POLL_MINUTES.
+    """
+
+    def __init__(self, scheduler: BaseScheduler, processors: List[EmailProcessor],
+                 source: Optional[NotificationSource] = None):
+        self.scheduler = scheduler
+        self.processors = processors
+        self.source = source or get_notification_source()
+        self._by_address: Dict[str, EmailProcessor] = {}
+        self._addresses: Dict[str, str] = {}
+        # Mailbox name -> watch expiration (epoch seconds).
+        self._expirations: Dict[str, float] = {}
+        self._last_synced: Dict[str, float] = {}
+        self._scheduled: Set[str] = set()
+        self._lock = threading.Lock()
+        self._last_pull = 0.0
+        self._stop = threading.Event()
+
+    def start(self):
+        self.renew_watches()
+        threading.Thread(target=self._consume, name="push-notifications", daemon=True).start()
+        self.scheduler.add_job(
+            func=self.renew_watches,
+            trigger=IntervalTrigger(hours=settings.PUSH_WATCH_RENEW_HOURS),
+            id='gmail_watch_renewal',
+            name='Renew Gmail push watches',
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+
+    def stop(self):
+        self._stop.set()
+        self.source.close()
+
+    def renew_watches(self):
+        """
+        (Re-)register the Gmail watch of every mailbox. A mailbox whose watch
+        cannot be registered is polled on the interval until the next renewal.
+        """
+        for processor in self.processors:
+            name = processor.mailbox.name
+            try:
+                if name not in self._addresses:
+                    # Notifications identify the mailbox by address only.
+                    address = processor.gmail_service.get_email_address().lower()
+                    self._addresses[name] = address
+                    self._by_address[address] = processor
+                if isinstance(self.source, LocalNotificationSource):
+                    # The stand-in needs no Gmail watch; it never expires.
+                    self._expirations[name] = math.inf
+                    continue
+                if not settings.PUSH_TOPIC:
+                    raise ValueError("PUSH_TOPIC must be set to register Gmail watches.")
+                response = processor.gmail_service.watch(settings.PUSH_TOPIC)
+                self._expirations[name] = int(response['expiration']) / 1000
+            except Exception as e:
+                self._expirations.pop(name, None)
+                logger.warning(f"Could not watch {name}, falling back to polling: {e}")
+
+    def is_active(self, name: str) -> bool:
+        """True while notifications for this mailbox can be relied on."""
+        return (self._expirations.get(name, 0) > time.time() + WATCH_EXPIRY_MARGIN_SECONDS
+                and time.monotonic() - self._last_pull < PULL_HEALTH_SECONDS)
+
+    def _consume(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                notifications = self.source.pull(PULL_TIMEOUT_SECONDS)
+            except Exception as e:
+                logger.error(f"Pulling Gmail notifications failed, retrying in {backoff:.0f}s: {e}")
+                self._stop.wait(backoff)
+                backoff = min(MAX_PULL_BACKOFF_SECONDS, backoff * 2)
+                continue
+            backoff = 1.0
+            self._last_pull = time.monotonic()
+            for notification in notifications:
+                processor = self._by_address.get(notification.email_address.lower())
+                if processor is None:
+                    logger.debug("Ignoring notification for unknown mailbox %s", notification.email_address)
+                    continue
+                self.trigger(processor)
+
+    def trigger(self, processor: EmailProcessor):
+        """
+        Sync `processor`'s mailbox shortly, unless a sync is already scheduled.
+        """
+        name = processor.mailbox.name
+        with self._lock:
+            if name in self._scheduled:
+                return
+            self._scheduled.add(name)
+        self.scheduler.add_job(
+            func=self._sync,
+            args=[processor],
+            trigger='date',
+            run_date=datetime.now() + timedelta(seconds=settings.PUSH_DEBOUNCE_SECONDS),
+            # No fixed id: APScheduler caps running instances per job id, and
+            # the follow-up sync is scheduled while the previous one still runs.
+            name=f'Sync {name} after a push notification',
+            misfire_grace_time=None
+        )
+
+    def _sync(self, processor: EmailProcessor):
+        with self._lock:
+            # Notifications from here on need a sync of their own.
+            self._scheduled.discard(processor.mailbox.name)
+        self._last_synced[processor.mailbox.name] = time.monotonic()
+        processor.process_emails()
+
+    def poll(self, processor: EmailProcessor):
+        """
+        Interval job body in push mode.
+        """
+        name = processor.mailbox.name
+        last = self._last_synced.get(name)
+        if (self.is_active(name) and last is not None
+                and time.monotonic() - last < settings.PUSH_SAFETY_POLL_MINUTES * 60):
+            logger.debug("Skipping poll of %s, push notifications are active.", name)
+            return
+        self._last_synced[name] = time.monotonic()
+        processor.process_emails()
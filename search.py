@@ -0,0 +1,50 @@
+"""
+Search processed emails by their headers and attachment names, from the
+SQLite index filled when METADATA_ENABLED is set; nothing is downloaded.
+
+Usage (from the repository root):
+    python search.py [QUERY...] [--mailbox NAME] [--since 2024-01-01]
+        [--until 2024-02-01] [--limit 50]
+
+Every term must match. A term prefixed with from:, to:, subject: or
+attachment: only matches that field, e.g.
+    python search.py from:alice@example.com invoice attachment:pdf
+"""
+import argparse
+from datetime import datetime, timezone
+
+from persistence.repository import Repository
+
+
+def _parse_date(value: str) -> datetime:
+    # Naive UTC, like sent_at.
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the metadata of processed emails.")
+    parser.add_argument("query", nargs="*", help="Search terms (default: newest emails)")
+    parser.add_argument("--mailbox", default=None, help="Only emails of this mailbox")
+    parser.add_argument("--since", type=_parse_date, default=None, help="Sent on or after (ISO date, UTC)")
+    parser.add_argument("--until", type=_parse_date, default=None, help="Sent before (ISO date, UTC)")
+    parser.add_argument("--limit", type=int, default=50, help="Maximum number of results")
+    args = parser.parse_args()
+
+    repository = Repository()
+    try:
+        results = repository.search_emails(" ".join(args.query), account=args.mailbox,
+                                           since=args.since, until=args.until, limit=args.limit)
+    except RuntimeError as e:
+        parser.error(str(e))
+    for email in results:
+        sent_at = f"{email.sent_at:%Y-%m-%d %H:%M}" if email.sent_at else "-"
+        print(f"{sent_at:<17} {email.account:<16} {email.gmail_id:<18} "
+              f"{(email.sender or '-')[:40]:<40} {email.subject or ''}")
+    print(f"{len(results)} result(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+from typing import Optional
+
+import aiohttp
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.storage.blob.aio import BlobServiceClient
+
+from config.metrics import instrument_async_upload
+from config.settings import settings
+from storage.async_base import AsyncBaseStorage
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+class AsyncAzureStorage(AsyncBaseStorage):
+    provider = "azure"
+
+    def __init__(self):
+        super().__init__()
+        self.container_name = settings.AZURE_CONTAINER_NAME
+        self.connection_string = settings.AZURE_STORAGE_CONNECTION_STRING
+        if not self.connection_string:
+            raise ValueError("AZURE_STORAGE_CONNECTION_STRING is not set")
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._service_client: Optional[BlobServiceClient] = None
+        self._container_client = None
+        self._client_lock: Optional[asyncio.Lock] = None
+
+    async def _get_container_client(self):
+        # aiohttp sessions must be created inside the loop that uses them.
+        if self._container_client is not None:
+            return self._container_client
+        if self._client_lock is None:
+            self._client_lock = asyncio.Lock()
+        async with self._client_lock:
+            if self._container_client is None:
+                self._session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=settings.STORAGE_MAX_POOL_CONNECTIONS)
+                )
+                self._service_client = BlobServiceClient.from_connection_string(
+                    self.connection_string,
+                    transport=AioHttpTransport(session=self._session, session_owner=False),
+                    max_single_put_size=settings.UPLOAD_MULTIPART_THRESHOLD_MB * MB,
+                    max_block_size=settings.UPLOAD_CHUNK_SIZE_MB * MB,
+                )
+                container_client = self._service_client.get_container_client(self.container_name)
+                # Always at first use here: the client only exists inside the loop.
+                if settings.STORAGE_CONTAINER_CHECK != "off" and not await container_client.exists():
+                    await container_client.create_container()
+                    logger.info(f"Created Azure container: {self.container_name}")
+                self._container_client = container_client
+        return self._container_client
+
+    @instrument_async_upload
+    async def _upload(self, data: bytes, filename: str) -> str:
+        container_client = await self._get_container_client()
+        try:
+            blob_client = container_client.get_blob_client(filename)
+            await blob_client.upload_blob(data, overwrite=True, max_concurrency=settings.UPLOAD_MAX_CONCURRENCY)
+            storage_key = f"azure://{self.container_name}/{filename}"
+            logger.info("Uploaded email to %s", storage_key)
+            return storage_key
+        except Exception as e:
+            logger.error(f"Azure upload failed: {e}")
+            raise
+
+    async def close(self):
+        if self._service_client is not None:
+            await self._service_client.close()
+            self._service_client = None
+            self._container_client = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Iterable, List, Optional, Tuple, Union
+
+from config.settings import settings
+
+
+class AsyncBaseStorage(ABC):
+    """
+    Asyncio counterpart of BaseStorage.
+
+    Every backend caps in-flight uploads at `concurrency`
+    (STORAGE_ASYNC_CONCURRENCY by default), shared by all callers of the instance.
+    """
+
+    def __init__(self, concurrency: Optional[int] = None):
+        self.concurrency = concurrency or settings.STORAGE_ASYNC_CONCURRENCY
+        # Created lazily so they bind to the loop that actually uses them.
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _limit(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def upload_email(self, data: bytes, filename: str) -> str:
+        """
+        Uploads an email to storage.
+
+        Args:
+            data: The raw bytes of the email.
+            filename: The target filename (key).
+
+        Returns:
+            The storage key/path of the uploaded file.
+        """
+        async with self._limit():
+            return await self._upload(data, filename)
+
+    async def upload_many(self, items: Iterable[Tuple[bytes, str]]) -> List[Union[str, BaseException]]:
+        """
+        Uploads several emails concurrently.
+
+        Args:
+            items: (data, filename) pairs.
+
+        Returns:
+            One entry per item, in order: the storage key on success, or the
+            exception that upload raised.
+        """
+        return await asyncio.gather(
+            *(self.upload_email(data, filename) for data, filename in items),
+            return_exceptions=True,
+        )
+
+    @abstractmethod
+    async def _upload(self, data: bytes, filename: str) -> str:
+        pass
+
+    async def close(self):
+        """
+        Releases pooled connections.
+        """
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class EventLoopThread:
+    """
+    Runs an asyncio event loop on a daemon thread, so synchronous code (such as
+    pipeline worker threads) can drive async storage backends.
+    """
+
+    def __init__(self, name: str = "storage-event-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """
+        Run `coro` on the loop and block the calling thread until it completes.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
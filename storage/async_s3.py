@@ -0,0 +1,62 @@
+import asyncio
+import contextlib
+import logging
+from typing import Optional
+
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+from botocore.exceptions import ClientError
+
+from config.metrics import instrument_async_upload
+from config.settings import settings
+from storage.async_base import AsyncBaseStorage
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncS3Storage(AsyncBaseStorage):
+    provider = "aws"
+
+    def __init__(self):
+        super().__init__()
+        self.bucket = settings.S3_BUCKET_NAME
+        self._client = None
+        self._client_lock: Optional[asyncio.Lock] = None
+        self._exit_stack: Optional[contextlib.AsyncExitStack] = None
+
+    async def _get_client(self):
+        # The aiobotocore client must be created inside the loop that uses it.
+        if self._client is not None:
+            return self._client
+        if self._client_lock is None:
+            self._client_lock = asyncio.Lock()
+        async with self._client_lock:
+            if self._client is None:
+                exit_stack = contextlib.AsyncExitStack()
+                self._client = await exit_stack.enter_async_context(get_session().create_client(
+                    "s3",
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_REGION,
+                    config=AioConfig(max_pool_connections=settings.STORAGE_MAX_POOL_CONNECTIONS),
+                ))
+                self._exit_stack = exit_stack
+        return self._client
+
+    @instrument_async_upload
+    async def _upload(self, data: bytes, filename: str) -> str:
+        client = await self._get_client()
+        try:
+            await client.put_object(Bucket=self.bucket, Key=filename, Body=data)
+            storage_key = f"s3://{self.bucket}/{filename}"
+            logger.info("Uploaded email to %s", storage_key)
+            return storage_key
+        except ClientError as e:
+            logger.error(f"S3 upload failed: {e}")
+            raise
+
+    async def close(self):
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+            self._client = None
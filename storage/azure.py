@@ -3,12 +3,17 @@ from typing import Optional
 import io
 import logging
 
+from config.metrics import instrument_upload, timed
 from config.settings import settings
-from storage.base import BaseStorage
+from storage.base import BaseStorage, EmailStream, as_file, split_storage_key
 
 logger = logging.getLogger(__name__)
 
+MB = 1024 * 1024
+
 class AzureStorage(BaseStorage):
+    provider = "azure"
+
     def __init__(self):
         self.container_name = settings.AZURE_CONTAINER_NAME
         self.connection_string = settings.AZURE_STORAGE_CONNECTION_STRING
@@ -16,22 +21,43 @@ class AzureStorage(BaseStorage):
             raise ValueError("AZURE_STORAGE_CONNECTION_STRING is not set")
             
         try:
-            self.blob_service_client = BlobServiceClient.from_connection_string(self.connection_string)
+            # Blobs above max_single_put_size are staged as blocks of max_block_size.
+            self.blob_service_client = BlobServiceClient.from_connection_string(
+                self.connection_string,
+                max_single_put_size=settings.UPLOAD_MULTIPART_THRESHOLD_MB * MB,
+                max_block_size=settings.UPLOAD_CHUNK_SIZE_MB * MB,
+            )
             self.container_client = self.blob_service_client.get_container_client(self.container_name)
-            if not self.container_client.exists():
-                 self.container_client.create_container()
-                 logger.info(f"Created Azure container: {self.container_name}")
         except Exception as e:
             logger.error(f"Failed to initialize Azure Storage: {e}")
             raise
+        self._init_container_check()
 
-    def upload_email(self, data: bytes, filename: str) -> str:
+    def _check_container(self):
+        try:
+            if not self.container_client.exists():
+                self.container_client.create_container()
+                logger.info(f"Created Azure container: {self.container_name}")
+        except Exception as e:
+            logger.error(f"Failed to check Azure container {self.container_name}: {e}")
+            raise
+
+    @instrument_upload
+    def upload_stream(self, stream: EmailStream, filename: str) -> str:
+        self._ensure_container()
         try:
             blob_client = self.container_client.get_blob_client(filename)
-            blob_client.upload_blob(io.BytesIO(data), overwrite=True)
+            blob_client.upload_blob(
+                as_file(stream), overwrite=True, max_concurrency=settings.UPLOAD_MAX_CONCURRENCY
+            )
             storage_key = f"azure://{self.container_name}/{filename}"
-            logger.info(f"Uploaded email to {storage_key}")
+            logger.info("Uploaded email to %s", storage_key)
             return storage_key
         except Exception as e:
             logger.error(f"Azure upload failed: {e}")
             raise
+
+    def download_range(self, storage_key: str, offset: int, length: int) -> bytes:
+        _, name = split_storage_key(storage_key, "azure")
+        with timed("download", self.provider):
+            return self.container_client.get_blob_client(name).download_blob(offset=offset, length=length).readall()
@@ -1,17 +1,144 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, BinaryIO, Iterable, Iterator, Tuple, Union
+import io
+import sys
+import threading
+
+from config.metrics import instrument_upload
+from config.settings import settings
+
+# A file-like object opened for binary reading, or an iterator of byte chunks.
+EmailStream = Union[BinaryIO, Iterable[bytes]]
+
+
+class ChunkReader(io.RawIOBase):
+    """
+    Read-only, non-seekable file object over an iterator of byte chunks.
+    Holds at most one chunk in memory at a time.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks: Iterator[bytes] = iter(chunks)
+        self._current = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._current:
+            try:
+                self._current = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+
+def as_file(stream: EmailStream) -> BinaryIO:
+    """
+    Return `stream` as a readable binary file object, wrapping chunk iterators.
+    """
+    if hasattr(stream, "read"):
+        return stream
+    return io.BufferedReader(ChunkReader(stream))
+
+
+def is_retryable_upload_error(error: BaseException) -> bool:
+    """
+    True for upload errors worth another attempt: I/O errors and S3 client errors.
+    """
+    if isinstance(error, IOError):
+        return True
+    # botocore is only loaded when an S3 backend is in use, and only then can
+    # its ClientError be raised; checking here avoids importing it otherwise.
+    botocore_exceptions = sys.modules.get("botocore.exceptions")
+    return botocore_exceptions is not None and isinstance(error, botocore_exceptions.ClientError)
+
+
+def split_storage_key(storage_key: str, scheme: str) -> Tuple[str, str]:
+    """
+    Split "<scheme>://<bucket>/<name>" into bucket and object name.
+    """
+    prefix = f"{scheme}://"
+    if not storage_key.startswith(prefix):
+        raise ValueError(f"Not a {scheme}:// storage key: {storage_key}")
+    bucket, _, name = storage_key[len(prefix):].partition("/")
+    return bucket, name
+
+
+_container_lock = threading.Lock()
+
 
 class BaseStorage(ABC):
-    @abstractmethod
+    # Label under which uploads are reported in the storage metrics.
+    provider = "unknown"
+    _container_ready = False
+
+    def _check_container(self):
+        """
+        Creates the bucket/container if it does not exist. Backends that
+        need one override this; it runs once, as set by STORAGE_CONTAINER_CHECK.
+        """
+
+    def _init_container_check(self):
+        # Called at the end of a backend's __init__.
+        mode = settings.STORAGE_CONTAINER_CHECK
+        if mode == "startup":
+            self._ensure_container()
+        elif mode == "off":
+            self._container_ready = True
+
+    def _ensure_container(self):
+        # Called before every upload; only the first one pays for the check.
+        if self._container_ready:
+            return
+        with _container_lock:
+            if not self._container_ready:
+                self._check_container()
+                self._container_ready = True
+
+    @instrument_upload
     def upload_email(self, data: bytes, filename: str) -> str:
         """
         Uploads an email to storage.
-        
+
         Args:
             data: The raw bytes of the email.
             filename: The target filename (key).
-            
+
+        Returns:
+            The storage key/path of the uploaded file.
+        """
+        return self.upload_stream(io.BytesIO(data), filename)
+
+    @abstractmethod
+    def upload_stream(self, stream: EmailStream, filename: str) -> str:
+        """
+        Uploads an email to storage without holding it in memory as a whole.
+        Large emails are sent in UPLOAD_CHUNK_SIZE_MB parts (multipart, staged
+        blocks or resumable chunks, depending on the backend).
+
+        Args:
+            stream: A binary file-like object or an iterator of byte chunks.
+            filename: The target filename (key).
+
         Returns:
             The storage key/path of the uploaded file.
         """
         pass
+
+    def download_range(self, storage_key: str, offset: int, length: int) -> bytes:
+        """
+        Reads `length` bytes starting at `offset` of an object this backend
+        stored under `storage_key`, with a single ranged request.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support ranged reads")
+
+    def flush(self):
+        """
+        Makes every email uploaded so far durable. Called before uploads are
+        recorded as processed. Backends whose uploads are durable on return
+        need not override this.
+        """
@@ -0,0 +1,141 @@
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_exponential
+
+from config.settings import settings
+from storage.base import BaseStorage, EmailStream, as_file, is_retryable_upload_error
+
+logger = logging.getLogger(__name__)
+
+
+class PartialUploadError(Exception):
+    """
+    Raised when an email reached some destinations but not all of them.
+    `stored` maps each destination that has the email to its storage key.
+    """
+
+    def __init__(self, stored: Dict[str, str], errors: Dict[str, str]):
+        self.stored = stored
+        self.errors = errors
+        super().__init__(
+            "Upload failed for " + ", ".join(f"{name}: {error}" for name, error in errors.items())
+        )
+
+
+class CompositeStorage(BaseStorage):
+    """
+    Fans each upload out to several backends at once (STORAGE_PROVIDER set to
+    a comma-separated list, e.g. "aws,gcp"), so an email downloaded once is
+    archived everywhere. The first destination is the primary: its storage
+    key is the one returned and recorded in processed_emails.
+
+    Each destination is retried on its own; when some still fail, the bytes
+    are kept in the spool (STORAGE_SPOOL_PATH) and PartialUploadError says
+    which destinations have the email, so a retry only uploads to the rest
+    and does not download it again.
+    """
+
+    provider = "composite"
+
+    def __init__(self, destinations: Dict[str, BaseStorage], spool_path: Optional[str] = None):
+        if len(destinations) < 2:
+            raise ValueError("CompositeStorage needs at least two destinations")
+        self.destinations = destinations
+        self.primary = next(iter(destinations))
+        spool_path = settings.STORAGE_SPOOL_PATH if spool_path is None else spool_path
+        self.spool_dir = os.path.abspath(spool_path) if spool_path else None
+        if self.spool_dir:
+            os.makedirs(self.spool_dir, exist_ok=True)
+        # Every upload worker can have one upload in flight per destination.
+        self._pool = ThreadPoolExecutor(
+            max_workers=len(destinations) * settings.UPLOAD_CONCURRENCY, thread_name_prefix="fanout"
+        )
+
+    def _upload_one(self, name: str, data: bytes, filename: str) -> str:
+        for attempt in Retrying(
+            stop=stop_after_attempt(3),
+            wait=wait_exponential(multiplier=1, min=2, max=10),
+            retry=retry_if_exception(is_retryable_upload_error),
+            reraise=True,
+        ):
+            with attempt:
+                return self.destinations[name].upload_email(data, filename)
+
+    def upload_email_to(self, data: bytes, filename: str, names: Iterable[str]) -> Dict[str, str]:
+        """
+        Upload to the destinations in `names` concurrently and return their
+        storage keys by destination. Raises PartialUploadError, listing the
+        destinations that succeeded, if any of them failed.
+        """
+        futures = {name: self._pool.submit(self._upload_one, name, data, filename) for name in names}
+        stored: Dict[str, str] = {}
+        errors: Dict[str, str] = {}
+        for name, future in futures.items():
+            try:
+                stored[name] = future.result()
+            except Exception as e:
+                logger.error(f"Upload of {filename} to {name} failed: {e}")
+                errors[name] = str(e)
+        if errors:
+            raise PartialUploadError(stored, errors)
+        return stored
+
+    def upload_email(self, data: bytes, filename: str) -> str:
+        return self.upload_email_to(data, filename, self.destinations)[self.primary]
+
+    def upload_stream(self, stream: EmailStream, filename: str) -> str:
+        # Every destination reads the same bytes, so the stream is read once up front.
+        return self.upload_email(as_file(stream).read(), filename)
+
+    def download_range(self, storage_key: str, offset: int, length: int) -> bytes:
+        # Keys handed out are the primary's.
+        return self.destinations[self.primary].download_range(storage_key, offset, length)
+
+    def flush(self):
+        for destination in self.destinations.values():
+            destination.flush()
+
+    def _spool_file(self, account: str, gmail_id: str) -> str:
+        # Gmail ids are only unique within a mailbox.
+        return os.path.join(self.spool_dir, account, f"{gmail_id}.eml")
+
+    def spool(self, account: str, gmail_id: str, data: bytes):
+        """
+        Keep the raw email until every destination has it. No-op without a spool.
+        """
+        if not self.spool_dir:
+            return
+        path = self._spool_file(account, gmail_id)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not spool {gmail_id}, a retry will download it again: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def read_spooled(self, account: str, gmail_id: str) -> Optional[bytes]:
+        if not self.spool_dir:
+            return None
+        try:
+            with open(self._spool_file(account, gmail_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def discard_spooled(self, account: str, gmail_ids: List[str]):
+        if not self.spool_dir:
+            return
+        for gmail_id in gmail_ids:
+            try:
+                os.unlink(self._spool_file(account, gmail_id))
+            except FileNotFoundError:
+                pass
@@ -1,25 +1,122 @@
+import importlib
 import logging
+from importlib.metadata import entry_points
+from typing import Dict, List, Type
 
 from config.settings import settings
 from storage.base import BaseStorage
-from storage.s3 import S3Storage
-from storage.azure import AzureStorage
-from storage.gcp import GCPStorage
+from storage.async_base import AsyncBaseStorage
 
 logger = logging.getLogger(__name__)
 
+# Built-in backends as "module:Class", imported only when selected so that
+# startup loads one cloud SDK at most.
+BACKENDS: Dict[str, str] = {
+    "aws": "storage.s3:S3Storage",
+    "azure": "storage.azure:AzureStorage",
+    "gcp": "storage.gcp:GCPStorage",
+    "local": "storage.local:LocalStorage",
+    "memory": "storage.memory:MemoryStorage",
+}
+ASYNC_BACKENDS: Dict[str, str] = {
+    "aws": "storage.async_s3:AsyncS3Storage",
+    "azure": "storage.async_azure:AsyncAzureStorage",
+    "gcp": "storage.async_gcp:AsyncGCPStorage",
+}
+
+# Installed packages can add providers by declaring entry points in these groups,
+# e.g. `minio = "my_package.storage:MinioStorage"`.
+ENTRY_POINT_GROUP = "email_ingestion.storage"
+ASYNC_ENTRY_POINT_GROUP = "email_ingestion.async_storage"
+
+
+def _entry_points(group: str) -> Dict[str, str]:
+    found = entry_points()
+    # Python 3.9 returns a dict of groups; 3.10+ has select().
+    group_points = found.select(group=group) if hasattr(found, "select") else found.get(group, [])
+    return {point.name: point.value for point in group_points}
+
+
+def _load(spec: str) -> type:
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def _resolve(provider: str, builtins: Dict[str, str], group: str) -> type:
+    spec = builtins.get(provider)
+    if spec is None:
+        # Only scanned for providers that are not built in.
+        spec = _entry_points(group).get(provider)
+    if spec is None:
+        valid = sorted(set(builtins) | set(_entry_points(group)))
+        raise ValueError(
+            f"Unknown storage provider: {provider}. "
+            f"Valid options are {', '.join(repr(name) for name in valid)}."
+        )
+    return _load(spec)
+
+
 class StorageFactory:
+    @staticmethod
+    def register(provider: str, spec: str, async_spec: str = None):
+        """
+        Register a backend as "module:Class" (and optionally its async
+        counterpart) under `provider`, without importing it.
+        """
+        BACKENDS[provider] = spec
+        if async_spec:
+            ASYNC_BACKENDS[provider] = async_spec
+
+    @staticmethod
+    def backend_class(provider: str) -> Type[BaseStorage]:
+        return _resolve(provider.lower(), BACKENDS, ENTRY_POINT_GROUP)
+
+    @staticmethod
+    def providers() -> List[str]:
+        """
+        The configured providers: STORAGE_PROVIDER split on commas, in order.
+        """
+        providers = []
+        for provider in settings.STORAGE_PROVIDER.lower().split(","):
+            provider = provider.strip()
+            if provider and provider not in providers:
+                providers.append(provider)
+        if not providers:
+            raise ValueError("STORAGE_PROVIDER must name at least one storage provider.")
+        return providers
+
     @staticmethod
     def get_storage() -> BaseStorage:
-        provider = settings.STORAGE_PROVIDER.lower()
-        
-        logger.info(f"Initializing storage provider: {provider}")
-
-        if provider == "aws":
-            return S3Storage()
-        elif provider == "azure":
-            return AzureStorage()
-        elif provider == "gcp":
-             return GCPStorage()
+        providers = StorageFactory.providers()
+        if len(providers) > 1:
+            if settings.STORAGE_SEGMENTS_ENABLED:
+                # Segments are flushed as a whole, so copies could not be
+                # tracked or retried per destination.
+                raise ValueError("STORAGE_SEGMENTS_ENABLED supports a single STORAGE_PROVIDER only.")
+            from storage.composite import CompositeStorage
+
+            logger.info(f"Initializing storage providers: {', '.join(providers)}")
+            storage = CompositeStorage({
+                provider: StorageFactory.backend_class(provider)() for provider in providers
+            })
         else:
-             raise ValueError(f"Unknown storage provider: {provider}. Valid options are 'aws', 'azure', 'gcp'.")
+            logger.info(f"Initializing storage provider: {providers[0]}")
+            storage = StorageFactory.backend_class(providers[0])()
+
+        if settings.STORAGE_SEGMENTS_ENABLED:
+            from storage.segments import SegmentStorage
+
+            return SegmentStorage(storage)
+        return storage
+
+    @staticmethod
+    def get_async_storage() -> AsyncBaseStorage:
+        providers = StorageFactory.providers()
+        if len(providers) > 1:
+            raise ValueError("STORAGE_ASYNC_ENABLED supports a single STORAGE_PROVIDER only.")
+        if settings.STORAGE_SEGMENTS_ENABLED:
+            raise ValueError("STORAGE_ASYNC_ENABLED cannot be combined with STORAGE_SEGMENTS_ENABLED.")
+        provider = providers[0]
+
+        logger.info(f"Initializing async storage provider: {provider}")
+        return _resolve(provider, ASYNC_BACKENDS, ASYNC_ENTRY_POINT_GROUP)()
@@ -0,0 +1,100 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from typing import List, Tuple
+
+from config.metrics import instrument_upload
+from config.settings import settings
+from storage.base import BaseStorage, EmailStream, as_file
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class LocalStorage(BaseStorage):
+    """
+    Content-addressed storage on the local filesystem, mainly for development,
+    benchmarking and load tests without cloud credentials.
+
+    Each email is written to `<root>/objects/<aa>/<sha256><ext>`. Uploads land
+    in a temporary file first; `flush()` fsyncs a whole batch of them, renames
+    each into place atomically and fsyncs the affected directories, so the
+    cost of fsync is shared across LOCAL_STORAGE_FSYNC_BATCH emails.
+    """
+
+    provider = "local"
+
+    def __init__(self, root: str = None, fsync_batch: int = None):
+        self.root = os.path.abspath(root or settings.LOCAL_STORAGE_PATH)
+        self.fsync_batch = fsync_batch or settings.LOCAL_STORAGE_FSYNC_BATCH
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._pending: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    @instrument_upload
+    def upload_stream(self, stream: EmailStream, filename: str) -> str:
+        source = as_file(stream)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                while True:
+                    chunk = source.read(READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    tmp.write(chunk)
+        except Exception as e:
+            os.unlink(tmp_path)
+            logger.error(f"Local upload failed: {e}")
+            raise
+
+        content_hash = digest.hexdigest()
+        extension = os.path.splitext(filename)[1]
+        final_path = os.path.join(self.objects_dir, content_hash[:2], content_hash + extension)
+
+        with self._lock:
+            self._pending.append((tmp_path, final_path))
+            should_flush = len(self._pending) >= self.fsync_batch
+        if should_flush:
+            self.flush()
+
+        storage_key = f"file://{final_path}"
+        logger.info("Uploaded email to %s", storage_key)
+        return storage_key
+
+    def download_range(self, storage_key: str, offset: int, length: int) -> bytes:
+        with open(storage_key[len("file://"):], "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+
+            directories = set()
+            for tmp_path, final_path in pending:
+                with open(tmp_path, "rb") as tmp:
+                    os.fsync(tmp.fileno())
+                directory = os.path.dirname(final_path)
+                os.makedirs(directory, exist_ok=True)
+                # Identical content may already be in place; replacing it is harmless.
+                os.replace(tmp_path, final_path)
+                directories.add(directory)
+
+            directories.add(self.objects_dir)
+            for directory in directories:
+                dir_fd = os.open(directory, os.O_RDONLY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+            logger.info(f"Flushed {len(pending)} emails to {self.root}")
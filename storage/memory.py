@@ -0,0 +1,38 @@
+import logging
+import threading
+from typing import Dict
+
+from config.metrics import instrument_upload
+from storage.base import BaseStorage, EmailStream, as_file
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStorage(BaseStorage):
+    """
+    Keeps uploaded emails in a dict. Nothing survives the process; intended
+    for tests and benchmarks that should measure the pipeline, not storage.
+    """
+
+    provider = "memory"
+
+    def __init__(self):
+        self.objects: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    @instrument_upload
+    def upload_email(self, data: bytes, filename: str) -> str:
+        with self._lock:
+            self.objects[filename] = data
+        storage_key = f"memory://{filename}"
+        logger.info("Uploaded email to %s", storage_key)
+        return storage_key
+
+    @instrument_upload
+    def upload_stream(self, stream: EmailStream, filename: str) -> str:
+        return self.upload_email(as_file(stream).read(), filename)
+
+    def download_range(self, storage_key: str, offset: int, length: int) -> bytes:
+        with self._lock:
+            data = self.objects[storage_key[len("memory://"):]]
+        return data[offset:offset + length]
@@ -1,30 +1,52 @@
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from typing import Optional
 import io
+import logging
 
 from config.settings import settings
-from config.logging_config import setup_logging
-from storage.base import BaseStorage
+from config.metrics import instrument_upload, timed
+from storage.base import BaseStorage, EmailStream, as_file, split_storage_key
 
-logger = setup_logging()
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
 
 class S3Storage(BaseStorage):
+    provider = "aws"
+
     def __init__(self):
         self.bucket = settings.S3_BUCKET_NAME
         self.s3 = boto3.client(
             "s3",
             aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
             aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION
+            region_name=settings.AWS_REGION,
+            # Default pool is 10 connections; pipeline upload threads need more.
+            config=Config(max_pool_connections=settings.STORAGE_MAX_POOL_CONNECTIONS),
+        )
+        # Messages above the threshold go up as multipart uploads, one chunk per part.
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.UPLOAD_MULTIPART_THRESHOLD_MB * MB,
+            multipart_chunksize=settings.UPLOAD_CHUNK_SIZE_MB * MB,
+            max_concurrency=settings.UPLOAD_MAX_CONCURRENCY,
         )
 
-    def upload_email(self, data: bytes, filename: str) -> str:
+    @instrument_upload
+    def upload_stream(self, stream: EmailStream, filename: str) -> str:
         try:
-            self.s3.upload_fileobj(io.BytesIO(data), self.bucket, filename)
+            self.s3.upload_fileobj(as_file(stream), self.bucket, filename, Config=self.transfer_config)
             storage_key = f"s3://{self.bucket}/{filename}"
-            logger.info(f"Uploaded email to {storage_key}")
+            logger.info("Uploaded email to %s", storage_key)
             return storage_key
         except ClientError as e:
             logger.error(f"S3 upload failed: {e}")
             raise
+
+    def download_range(self, storage_key: str, offset: int, length: int) -> bytes:
+        bucket, key = split_storage_key(storage_key, "s3")
+        with timed("download", self.provider):
+            response = self.s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={offset}-{offset + length - 1}")
+            return response["Body"].read()
@@ -0,0 +1,183 @@
+import logging
+import re
+import struct
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Tuple
+
+from config.settings import settings
+from storage.base import BaseStorage, EmailStream, as_file
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+KB = 1024
+
+# Segment layout: MAGIC, then one record per email:
+#   uint16 name length | name (UTF-8) | uint32 payload length | payload
+# all big-endian. The payload is the email exactly as it would have been
+# uploaded on its own (compressed if STORAGE_COMPRESSION is set), so a ranged
+# read of [offset, offset + length) returns a self-contained object.
+MAGIC = b"EMLSEG1\n"
+_NAME_LENGTH = struct.Struct(">H")
+_PAYLOAD_LENGTH = struct.Struct(">I")
+
+_SEGMENT_KEY = re.compile(r"^segment:(?P<name>.+)#(?P<offset>\d+)\+(?P<length>\d+)$")
+
+
+class SealedSegment(NamedTuple):
+    name: str
+    storage_key: str
+    size: int
+    message_count: int
+
+
+def segment_key(name: str, offset: int, length: int) -> str:
+    return f"segment:{name}#{offset}+{length}"
+
+
+def parse_segment_key(storage_key: str) -> Optional[Tuple[str, int, int]]:
+    """
+    (segment name, offset, length) for a key handed out by SegmentStorage,
+    None for any other storage key.
+    """
+    match = _SEGMENT_KEY.match(storage_key or "")
+    if match is None:
+        return None
+    return match.group("name"), int(match.group("offset")), int(match.group("length"))
+
+
+def iter_segment(data: bytes):
+    """
+    Yield (name, payload) for every record of a whole segment.
+    """
+    if not data.startswith(MAGIC):
+        raise ValueError("Not an email segment")
+    position = len(MAGIC)
+    while position < len(data):
+        (name_length,) = _NAME_LENGTH.unpack_from(data, position)
+        position += _NAME_LENGTH.size
+        name = data[position:position + name_length].decode("utf-8")
+        position += name_length
+        (payload_length,) = _PAYLOAD_LENGTH.unpack_from(data, position)
+        position += _PAYLOAD_LENGTH.size
+        yield name, data[position:position + payload_length]
+        position += payload_length
+
+
+class SegmentStorage(BaseStorage):
+    """
+    Bundles small emails into segment objects instead of uploading each one
+    (STORAGE_SEGMENTS_ENABLED), turning thousands of PUTs into one.
+
+    Uploads append to an open in-memory segment and return a key of the form
+    "segment:<name>#<offset>+<length>". `flush()` seals the open segment and
+    uploads it through the wrapped backend, so emails only count as durable
+    (and get recorded as processed) once their segment is stored. Callers ask
+    `flush_due()` whether the open segment has reached STORAGE_SEGMENT_MAX_MB
+    or STORAGE_SEGMENT_MAX_SECONDS. Emails above STORAGE_SEGMENT_MAX_EMAIL_KB
+    are uploaded on their own as before.
+
+    Sealed segments are collected until `take_sealed()`, for recording in the
+    segment index. One email is read back with `download_range` on its
+    segment's storage key (see Repository.get_segment_location).
+    """
+
+    def __init__(self, inner: BaseStorage):
+        self.inner = inner
+        self.provider = inner.provider
+        self.max_bytes = settings.STORAGE_SEGMENT_MAX_MB * MB
+        self.max_seconds = settings.STORAGE_SEGMENT_MAX_SECONDS
+        self.max_email_bytes = settings.STORAGE_SEGMENT_MAX_EMAIL_KB * KB
+        self._lock = threading.Lock()
+        # Held while sealing, so a flush also waits for a concurrent one to finish.
+        self._seal_lock = threading.Lock()
+        self._name: Optional[str] = None
+        self._buffer = bytearray()
+        self._count = 0
+        self._opened = 0.0
+        # Sealed segments not uploaded yet: (name, data, email count).
+        self._unsent: List[Tuple[str, bytes, int]] = []
+        self._sealed: List[SealedSegment] = []
+
+    @staticmethod
+    def _new_name() -> str:
+        return f"segments/{datetime.utcnow():%Y/%m/%d}/{uuid.uuid4().hex}.seg"
+
+    def _append(self, data: bytes, filename: str) -> str:
+        name = filename.encode("utf-8")
+        with self._lock:
+            if self._name is None:
+                self._name = self._new_name()
+                self._buffer = bytearray(MAGIC)
+                self._count = 0
+                self._opened = time.monotonic()
+            self._buffer += _NAME_LENGTH.pack(len(name)) + name + _PAYLOAD_LENGTH.pack(len(data))
+            offset = len(self._buffer)
+            self._buffer += data
+            self._count += 1
+            return segment_key(self._name, offset, len(data))
+
+    def upload_email(self, data: bytes, filename: str) -> str:
+        if len(data) > self.max_email_bytes:
+            return self.inner.upload_email(data, filename)
+        return self._append(data, filename)
+
+    def upload_stream(self, stream: EmailStream, filename: str) -> str:
+        source = as_file(stream)
+        head = source.read(self.max_email_bytes + 1)
+        if len(head) > self.max_email_bytes:
+            # Too big to bundle: send the rest of the stream on after what was read.
+            rest = iter(lambda: source.read(MB), b"")
+            return self.inner.upload_stream(_chain(head, rest), filename)
+        return self._append(head, filename)
+
+    def flush_due(self) -> Optional[bool]:
+        """
+        Whether the open segment should be sealed now; None when no segment is open.
+        """
+        with self._lock:
+            if self._name is None:
+                return None
+            return (len(self._buffer) >= self.max_bytes
+                    or time.monotonic() - self._opened >= self.max_seconds)
+
+    def flush(self):
+        with self._seal_lock:
+            with self._lock:
+                if self._name is not None:
+                    self._unsent.append((self._name, bytes(self._buffer), self._count))
+                    self._name, self._buffer, self._count = None, bytearray(), 0
+            # A segment that failed to upload is retried by every later flush,
+            # which keeps failing until it is stored: no flush returns while
+            # an email appended before it is not durable.
+            while self._unsent:
+                name, data, count = self._unsent[0]
+                try:
+                    storage_key = self.inner.upload_email(data, name)
+                except Exception as e:
+                    logger.error(f"Upload of segment {name} ({count} emails) failed: {e}")
+                    raise
+                self._unsent.pop(0)
+                logger.info(f"Uploaded segment of {count} emails ({len(data)} bytes) to {storage_key}")
+                with self._lock:
+                    self._sealed.append(SealedSegment(name, storage_key, len(data), count))
+            self.inner.flush()
+
+    def take_sealed(self) -> List[SealedSegment]:
+        """
+        Segments sealed since the last call.
+        """
+        with self._lock:
+            sealed, self._sealed = self._sealed, []
+        return sealed
+
+    def download_range(self, storage_key: str, offset: int, length: int) -> bytes:
+        return self.inner.download_range(storage_key, offset, length)
+
+
+def _chain(head: bytes, rest):
+    yield head
+    yield from rest
@@ -17,6 +17,8 @@ try:
     from storage.s3 import S3Storage
     from storage.azure import AzureStorage
     from storage.gcp import GCPStorage
+    from storage.local import LocalStorage
+    from storage.memory import MemoryStorage
     from storage.factory import StorageFactory
     print("Imports successful.")
 
@@ -37,7 +39,9 @@ try:
         expected_map = {
             "gcp": "GCPStorage",
             "aws": "S3Storage",
-            "azure": "AzureStorage"
+            "azure": "AzureStorage",
+            "local": "LocalStorage",
+            "memory": "MemoryStorage"
         }
         
         expected_type = expected_map.get(settings.STORAGE_PROVIDER.lower())
@@ -47,6 +51,13 @@ try:
              print(f"ERROR: Unknown provider {settings.STORAGE_PROVIDER}")
         else:
             print("Storage provider matches configuration.")
+
+        # Compressed emails are uploaded from a chunk iterator, which backends
+        # must accept without seeking.
+        print("Verifying streamed upload...")
+        storage_key = storage.upload_stream(iter([b"Subject: verify_setup\r\n\r\n", b"ok\r\n"]),
+                                            "verify_setup/stream-check.eml")
+        print(f"Streamed upload stored at {storage_key}")
             
     except Exception as e:
         print(f"Storage factory warning: {e}")